@@ -0,0 +1,275 @@
+"""
+Пакетный расчёт без графического интерфейса
+
+Сценарии читаются из файла JSON (список объектов или {"scenarios": [...]})
+или CSV (строка заголовка - имена полей). Поля сценария:
+    name                 - имя (по умолчанию номер сценария)
+    calc                 - 'stationary', 'unsteady' или 'both' (по умолчанию)
+    lambda_method        - метод расчёта λ
+    поля PipelineConfig  - p_initial_mpa, tc, external_diameter_mm, ...
+    num_steps, store_every, boundary_condition, bc_change_time,
+    bc_change_value (Па), steady_tol - параметры нестационарного расчёта
+    lambda_table_tol     - погрешность табличного λ(Re); без поля - точный
+                           расчёт λ
+
+Сценарии считаются в пуле процессов; результаты записываются в базу
+данных (--db) и/или в каталог (--out): по файлу .npz на сценарий
+и сводная таблица summary.csv. Используются только numpy и стандартная
+библиотека, поэтому запуск возможен на сервере без дисплея:
+
+    python batch.py scenarios.json --processes 8 --db results.db --out results
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import json
+import multiprocessing as mp
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from calc import PipelineFlow
+from config import PipelineConfig
+import db_manager as db
+
+CALC_TYPES = ('stationary', 'unsteady', 'both')
+UNSTEADY_KEYS = ('num_steps', 'store_every', 'boundary_condition', 'bc_change_time',
+                 'bc_change_value', 'steady_tol', 'lambda_table_tol')
+INT_KEYS = ('num_steps', 'store_every')
+TEXT_KEYS = ('name', 'calc', 'lambda_method', 'boundary_condition')
+
+# Сценариев в работе на один процесс пула: результаты (с полной историей
+# при записи в БД) обрабатываются и освобождаются по мере готовности
+IN_FLIGHT_PER_PROCESS = 2
+
+SUMMARY_FIELDS = ('name', 'status', 'v', 'Re', 'lambda', 'iterations', 'converged',
+                  'p_max_mpa', 'p_min_mpa', 'converged_step', 'elapsed_s', 'error')
+
+
+def _parse_value(key, value):
+    """Значение поля сценария из текста CSV"""
+    if key in TEXT_KEYS:
+        return value
+    if key in INT_KEYS:
+        return int(float(value))
+    return float(value)
+
+
+def safe_filename(name):
+    """Имя файла из имени сценария: без каталогов и служебных символов"""
+    name = re.sub(r'[^\w.\-]+', '_', os.path.basename(str(name).replace('\\', '/')))
+    name = name.strip('.')
+    return name or 'scenario'
+
+
+def check_output_names(scenarios):
+    """Проверка, что файлы .npz сценариев не совпадают (иначе ValueError)"""
+    names = {}
+    for k, scenario in enumerate(scenarios, 1):
+        filename = f"{safe_filename(scenario['name'])}.npz"
+        if filename in names:
+            raise ValueError(f"Сценарии {names[filename]} и {k}: совпадает файл результатов "
+                             f"{filename} (имена {scenarios[names[filename] - 1]['name']!r} "
+                             f"и {scenario['name']!r})")
+        names[filename] = k
+
+
+def load_scenarios(path):
+    """Список сценариев (словарей) из файла JSON или CSV"""
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            scenarios = [{key.strip(): _parse_value(key.strip(), value.strip())
+                          for key, value in row.items() if value is not None and value.strip()}
+                         for row in csv.DictReader(f)]
+    else:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        scenarios = data['scenarios'] if isinstance(data, dict) else data
+
+    config_keys = set(PipelineConfig().as_dict())
+    allowed = config_keys | set(UNSTEADY_KEYS) | {'name', 'calc', 'lambda_method'}
+    for k, scenario in enumerate(scenarios, 1):
+        unknown = set(scenario) - allowed
+        if unknown:
+            raise ValueError(f"Сценарий {k}: неизвестные поля {', '.join(sorted(unknown))}")
+        if scenario.get('calc', 'both') not in CALC_TYPES:
+            raise ValueError(f"Сценарий {k}: неизвестный вид расчёта {scenario['calc']}")
+        scenario.setdefault('name', str(k))
+
+    return scenarios
+
+
+def run_scenario(scenario, out_dir=None, keep_arrays=False):
+    """
+    Расчёт одного сценария (выполняется в процессе пула)
+
+    Возвращает словарь: 'summary' - строка сводной таблицы,
+    'arrays' - массивы результатов при keep_arrays
+    """
+    start = time.perf_counter()
+    summary = {'name': scenario['name'], 'status': 'ok'}
+    arrays = {}
+
+    try:
+        config_keys = PipelineConfig().as_dict()
+        config = PipelineConfig.from_constants().replace(
+            **{key: value for key, value in scenario.items() if key in config_keys})
+        calc_type = scenario.get('calc', 'both')
+        lambda_method = scenario.get('lambda_method', 'auto')
+
+        flow = PipelineFlow(config)
+        flow.calculate_stationary(lambda_method=lambda_method, verbose=False)
+        summary.update(v=flow.v, Re=flow.Re, iterations=flow.iterations, converged=flow.converged)
+        summary['lambda'] = flow.lambda_
+        arrays.update(x_km=flow.x_km, x_m=flow.x_m, P=flow.P.copy(), v_arr=flow.v_arr.copy())
+
+        if calc_type in ('unsteady', 'both'):
+            params = {key: scenario[key] for key in UNSTEADY_KEYS if key in scenario}
+            flow.calculate_unsteady_with_callback(lambda_method=lambda_method, verbose=False,
+                                                  use_parallel=False, check_results=False, **params)
+            summary.update(p_max_mpa=float(np.max(flow.p_history)) / 1e6,
+                           p_min_mpa=float(np.min(flow.p_history)) / 1e6,
+                           converged_step=flow.converged_step)
+            arrays.update(t_history=flow.t_history, p_history=flow.p_history,
+                          v_history=flow.v_history)
+        else:
+            summary.update(p_max_mpa=float(np.max(flow.P)) / 1e6,
+                           p_min_mpa=float(np.min(flow.P)) / 1e6)
+
+        if out_dir is not None:
+            np.savez(os.path.join(out_dir, f"{safe_filename(scenario['name'])}.npz"), **arrays)
+
+    except Exception as e:
+        summary = {'name': scenario['name'], 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+        arrays = {}
+
+    summary['elapsed_s'] = time.perf_counter() - start
+    return {'summary': summary, 'arrays': arrays if keep_arrays else {}}
+
+
+def save_to_database(db_manager, summary, arrays):
+    """Запись результатов сценария в базу данных; номера расчётов"""
+    flow = PipelineFlow()
+    flow.x_km = arrays['x_km']
+    flow.x_m = arrays['x_m']
+    flow.P = arrays['P']
+    flow.v_arr = arrays['v_arr']
+    flow.v = summary['v']
+    flow.stationary_calculated = True
+
+    calc_ids = [db_manager.save_stationary_calculation(flow)]
+    if 't_history' in arrays:
+        flow.t_history = arrays['t_history']
+        flow.p_history = arrays['p_history']
+        flow.v_history = arrays['v_history']
+        calc_ids.append(db_manager.save_unsteady_calculation(flow))
+    return calc_ids
+
+
+def write_summary(path, summaries):
+    """Сводная таблица сценариев в CSV"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for summary in summaries:
+            writer.writerow(summary)
+
+
+def run_batch(scenarios, num_processes=None, db_name=None, out_dir=None, log=print):
+    """
+    Расчёт всех сценариев; возвращает строки сводной таблицы в порядке сценариев
+
+    num_processes : int
+        Число процессов; None - по числу ядер, 1 - в текущем процессе
+    """
+    if out_dir is not None:
+        check_output_names(scenarios)
+        os.makedirs(out_dir, exist_ok=True)
+    db_manager = db.DatabaseManager(db_name) if db_name is not None else None
+    keep_arrays = db_manager is not None
+
+    num_processes = num_processes or os.cpu_count() or 1
+    total = len(scenarios)
+    summaries = [None] * total
+    done = 0
+
+    def finish(index, result):
+        nonlocal done
+        done += 1
+        summary = result['summary']
+        if db_manager is not None and summary['status'] == 'ok':
+            summary['calc_ids'] = save_to_database(db_manager, summary, result['arrays'])
+        summaries[index] = summary
+
+        if summary['status'] == 'ok':
+            log(f"[{done}/{total}] {summary['name']}: v = {summary['v']:.4f} м/с, "
+                f"P: [{summary['p_min_mpa']:.3f}, {summary['p_max_mpa']:.3f}] МПа "
+                f"({summary['elapsed_s']:.2f} с)")
+        else:
+            log(f"[{done}/{total}] {summary['name']}: ОШИБКА {summary['error']}")
+
+    if num_processes <= 1 or total <= 1:
+        for index, scenario in enumerate(scenarios):
+            finish(index, run_scenario(scenario, out_dir, keep_arrays))
+    else:
+        workers = min(num_processes, total)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                    mp_context=mp.get_context('spawn')) as pool:
+            # Ограниченное окно сценариев в работе; готовый результат
+            # удаляется из futures сразу после обработки
+            pending = iter(enumerate(scenarios))
+            futures = {}
+
+            def submit(count):
+                for index, scenario in pending:
+                    futures[pool.submit(run_scenario, scenario, out_dir, keep_arrays)] = index
+                    count -= 1
+                    if count == 0:
+                        break
+
+            submit(workers * IN_FLIGHT_PER_PROCESS)
+            while futures:
+                done_futures, _ = concurrent.futures.wait(
+                    futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done_futures:
+                    index = futures.pop(future)
+                    finish(index, future.result())
+                submit(len(done_futures))
+
+    if out_dir is not None:
+        write_summary(os.path.join(out_dir, 'summary.csv'), summaries)
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный расчёт сценариев трубопровода")
+    parser.add_argument('scenarios', help="файл сценариев .json или .csv")
+    parser.add_argument('--processes', type=int, default=None,
+                        help="число процессов (по умолчанию - число ядер)")
+    parser.add_argument('--db', default=None, help="база данных SQLite для результатов")
+    parser.add_argument('--out', default=None,
+                        help="каталог для файлов .npz и summary.csv")
+    args = parser.parse_args(argv)
+
+    out_dir = args.out
+    if args.db is None and out_dir is None:
+        out_dir = 'batch_results'
+
+    scenarios = load_scenarios(args.scenarios)
+    print(f"Сценариев: {len(scenarios)}", flush=True)
+
+    start = time.perf_counter()
+    summaries = run_batch(scenarios, args.processes, args.db, out_dir,
+                          log=lambda message: print(message, flush=True))
+
+    failed = sum(summary['status'] != 'ok' for summary in summaries)
+    print(f"Готово за {time.perf_counter() - start:.1f} с, ошибок: {failed}", flush=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
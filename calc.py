@@ -1,11 +1,29 @@
 import numpy as np
-import constants as c
-import concurrent.futures
 import db_manager as db
+import domain
+import ensemble
+import moc
+from history import HistoryBuffer, MemmapHistory, num_history_layers
+from parallel import ChunkedExecutor
+from streaming import Frame
+from convergence import SteadyStateMonitor
+from lambda_table import LambdaTable, LambdaTableCache
+from config import PipelineConfig
+from velocity import solve_velocity
+
+# Общий для всех расчётов кэш таблиц λ(Re): переключение метода
+# не приводит к повторному построению уже использованных таблиц
+LAMBDA_TABLES = LambdaTableCache(maxsize=8)
 
 
 class PipelineFlow:
-    def __init__(self):
+    # Законы, для которых табличная интерполяция λ(Re) быстрее точного расчёта
+    TABULATED_METHODS = ('colebrook', 'ginzburg')
+
+    def __init__(self, config=None):
+        # Исходные данные расчёта; по умолчанию - из модуля constants
+        self.config = config if config is not None else PipelineConfig.from_constants()
+
         # Параметры нефти
         self.rho = None
         self.nu = None
@@ -15,6 +33,8 @@ class PipelineFlow:
         self.v = None
         self.lambda_ = None
         self.Re = None
+        self.iterations = None
+        self.converged = None
 
         # Сетка
         self.x_km = None
@@ -24,14 +44,16 @@ class PipelineFlow:
         self.v_arr = None
 
         # Нестационарный расчёт
-        self.C = c.SPEED_OF_SOUND  # м/с
+        self.C = self.config.speed_of_sound  # м/с
         self.dt = None
         self.B = None  # B = ρ * c
+        self.converged_step = None  # шаг выхода на установившийся режим
+        self.streamed_calc_id = None  # номер расчёта, записанного в БД во время счёта
 
-        # История для визуализации
-        self.p_history = []
-        self.v_history = []
-        self.t_history = []
+        # История для визуализации: массивы (слои × узлы)
+        self.p_history = np.empty((0, 0))
+        self.v_history = np.empty((0, 0))
+        self.t_history = np.empty(0)
 
         # Флаг выполнения стационарного расчёта
         self.stationary_calculated = False
@@ -139,6 +161,173 @@ class PipelineFlow:
         else:
             return self.lambda_shifrinson(epsilon)
 
+    def lambda_table(self, method='auto', tol=1e-6) -> LambdaTable:
+        """
+        Таблица λ(Re) для текущей шероховатости из общего кэша LAMBDA_TABLES
+        """
+        epsilon = self.epsilon
+        key = (method, epsilon, tol)
+
+        def build():
+            def fallback(Re):
+                return self.get_lambda_array(Re, epsilon, method=method)
+
+            if method == 'colebrook':
+                # Таблица строится по полностью сошедшемуся решению, поэтому
+                # её погрешность (LAMBDA_TABLES.stats) отсчитывается от него,
+                # а не от точного расчёта с max_iter=10, tol=1e-6
+                def law(Re):
+                    return self.lambda_colebrook_white_array(Re, epsilon, max_iter=100, tol=1e-14)
+            else:
+                law = fallback
+
+            breakpoints = [2320, 1e4, 1e5 / epsilon, 500 / epsilon] if method == 'auto' else []
+            return LambdaTable(law, breakpoints=breakpoints, tol=tol, fallback=fallback)
+
+        return LAMBDA_TABLES.get(key, build)
+
+    def friction_factor_array(self, v, lambda_method='auto', lambda_table_tol=None, out=None):
+        """
+        Коэффициент λ в каждом узле сетки по текущему распределению скорости.
+        При |v| < 1e-10 используется λ стационарного режима.
+        lambda_table_tol - погрешность табличного λ(Re) для законов из
+        TABULATED_METHODS; None - точный расчёт.
+        out - необязательный массив для результата
+        """
+        if out is None:
+            lambda_arr = np.full(np.shape(v), self.lambda_, dtype=float)
+        else:
+            lambda_arr = out
+            lambda_arr.fill(self.lambda_)
+        moving = np.abs(v) >= 1e-10
+        if np.any(moving):
+            Re = np.abs(v[moving]) * self.config.internal_diameter / self.nu
+            if lambda_table_tol is None or lambda_method not in self.TABULATED_METHODS:
+                lambda_arr[moving] = self.get_lambda_array(Re, self.epsilon, method=lambda_method)
+            else:
+                lambda_arr[moving] = self.lambda_table(lambda_method, lambda_table_tol)(Re)
+        return lambda_arr
+
+    @staticmethod
+    def lambda_stokes_array(Re) -> np.ndarray:
+        Re = np.asarray(Re, dtype=float)
+        small = Re < 1e-6
+        return np.where(small, 64.0, 64 / np.where(small, 1.0, Re))
+
+    @staticmethod
+    def lambda_ginzburg_array(Re) -> np.ndarray:
+        Re = np.asarray(Re, dtype=float)
+        small = Re < 1e-6
+        Re_safe = np.where(small, 1.0, Re)
+        gamma = 1 - np.exp(-0.002 * (Re_safe - 2320))
+        lambda_ = ((64 / Re_safe) * (1 - gamma)) + (0.3164 * gamma / Re_safe**0.25)
+        return np.where(small, 64.0, lambda_)
+
+    @staticmethod
+    def lambda_blasius_array(Re) -> np.ndarray:
+        Re = np.asarray(Re, dtype=float)
+        small = Re < 1e-6
+        return np.where(small, 0.03164, 0.3164 / np.where(small, 1.0, Re)**0.25)
+
+    @staticmethod
+    def lambda_altshul_array(Re, epsilon) -> np.ndarray:
+        Re = np.asarray(Re, dtype=float)
+        small = Re < 1e-6
+        lambda_ = 0.11 * (epsilon + 68 / np.where(small, 1.0, Re))**0.25
+        return np.where(small, 0.11 * epsilon**0.25, lambda_)
+
+    @staticmethod
+    def lambda_shifrinson_array(Re, epsilon) -> np.ndarray:
+        return np.full(np.shape(Re), 0.11 * epsilon**0.25)
+
+    @staticmethod
+    def lambda_colebrook_white_array(Re, epsilon, max_iter=10, tol=1e-6) -> np.ndarray:
+        """
+        Формула Колбрука-Уайта для массива Re.
+        Итерации ведутся только по ещё не сошедшимся элементам
+        """
+        Re = np.asarray(Re, dtype=float)
+        shape = Re.shape
+        Re = Re.ravel()
+
+        # Шероховатость - число или массив той же формы, что Re
+        per_point = np.ndim(epsilon) > 0
+        if per_point:
+            epsilon = np.broadcast_to(epsilon, shape).ravel()
+
+        lambda_ = np.full(Re.shape, 0.03)
+        active = np.flatnonzero(Re >= 1e-6)
+        eps = epsilon[active] if per_point else epsilon
+        lambda_[active] = 0.11 * (eps + 68 / Re[active])**0.25
+
+        for _ in range(max_iter):
+            if active.size == 0:
+                break
+
+            lambda_prev = lambda_[active]
+            lambda_prev[lambda_prev < 1e-10] = 0.03
+            lambda_[active] = lambda_prev
+
+            eps = epsilon[active] if per_point else epsilon
+            term = eps / 3.7 + 2.51 / (Re[active] * np.sqrt(lambda_prev))
+            valid = term > 0
+            active = active[valid]
+            lambda_prev = lambda_prev[valid]
+
+            inv_sqrt_lambda = -2 * np.log10(term[valid])
+            lambda_new = 1 / (inv_sqrt_lambda ** 2)
+
+            not_converged = np.abs(lambda_new - lambda_prev) >= tol
+            active = active[not_converged]
+            lambda_[active] = lambda_new[not_converged]
+
+        return lambda_.reshape(shape)
+
+    def get_lambda_array(self, Re, epsilon, method='auto') -> np.ndarray:
+        """
+        Коэффициент гидравлического сопротивления для массива чисел Рейнольдса.
+        Режимы течения и границы между ними те же, что в get_lambda
+        """
+        Re = np.asarray(Re, dtype=float)
+
+        if method == 'stokes':
+            return self.lambda_stokes_array(Re)
+        elif method == 'ginzburg':
+            return self.lambda_ginzburg_array(Re)
+        elif method == 'blasius':
+            return self.lambda_blasius_array(Re)
+        elif method == 'altshul':
+            return self.lambda_altshul_array(Re, epsilon)
+        elif method == 'shifrinson':
+            return self.lambda_shifrinson_array(Re, epsilon)
+        elif method == 'colebrook':
+            return self.lambda_colebrook_white_array(Re, epsilon)
+
+        # Автоматический выбор: каждый закон считается только на своём участке
+        Re_I = 1e5 / epsilon
+        Re_II = 500 / epsilon
+
+        # Шероховатость - число или массив той же формы, что Re
+        if np.ndim(epsilon) > 0:
+            epsilon = np.broadcast_to(epsilon, Re.shape)
+            eps_at = lambda mask: epsilon[mask]
+        else:
+            eps_at = lambda mask: epsilon
+
+        regimes = [
+            (Re < 2320, lambda Re_part, eps: self.lambda_stokes_array(Re_part)),
+            ((Re >= 2320) & (Re < 1e4), lambda Re_part, eps: self.lambda_ginzburg_array(Re_part)),
+            ((Re >= 1e4) & (Re < Re_I), lambda Re_part, eps: self.lambda_blasius_array(Re_part)),
+            ((Re >= Re_I) & (Re < Re_II), self.lambda_altshul_array),
+        ]
+
+        lambda_ = np.empty(Re.shape)
+        lambda_[...] = 0.11 * epsilon**0.25
+        for mask, law in regimes:
+            if np.any(mask):
+                lambda_[mask] = law(Re[mask], eps_at(mask))
+        return lambda_
+
     def refine_grid(self, X0, XN, dx_initial):
         """Создание равномерной сетки с шагом близким к dx_initial"""
         length = XN - X0
@@ -147,7 +336,7 @@ class PipelineFlow:
         x_km = np.linspace(X0, XN, n_intervals + 1)
         return dx, x_km
 
-    def calculate_stationary(self, lambda_method='auto', verbose=True):
+    def calculate_stationary(self, lambda_method='auto', verbose=True, v0=None):
         if verbose:
             print("=" * 60)
             print("Стационарный расчёт")
@@ -155,47 +344,44 @@ class PipelineFlow:
 
         # Корректировка плотности на температуру
         alpha = 0.0008
-        self.rho = c.RO20 * (1 - alpha * (c.TC - 20))
+        self.rho = self.config.ro20 * (1 - alpha * (self.config.tc - 20))
         if verbose:
-            print(f"Плотность при {c.TC}°C: ρ = {self.rho:.2f} кг/м³")
+            print(f"Плотность при {self.config.tc}°C: ρ = {self.rho:.2f} кг/м³")
 
         # Кинематическая вязкость
-        self.nu = self.get_kinematic_viscosity(c.T, c.VISCOSITY_20, c.VISCOSITY_50)
+        self.nu = self.get_kinematic_viscosity(self.config.temperature, self.config.viscosity_20,
+                                               self.config.viscosity_50)
         if verbose:
             print(f"Кинематическая вязкость: ν = {self.nu*1e6:.2f} сСт")
 
         # Относительная шероховатость
-        self.epsilon = c.ABS_ROUGHTNESS / c.INTERNAL_DIAMETER
+        self.epsilon = self.config.abs_roughness / self.config.internal_diameter
         if verbose:
             print(f"Относительная шероховатость: ε = {self.epsilon:.6f}")
             print(f"Метод расчёта λ: {lambda_method}")
 
-        # Итерационный расчет скорости
-        v = 1.0
-        tol = 1e-6
-        max_iter = 20
+        # Скорость: метод секущих с защитой интервалом (velocity.solve_velocity),
+        # начальное приближение - v0 или предыдущее решение
+        if v0 is None:
+            v0 = self.v if self.v is not None else 1.0
 
-        if verbose:
-            print("\nИтерационный расчёт скорости:")
-
-        for iteration in range(max_iter):
-            Re = self.get_reynolds(v, c.INTERNAL_DIAMETER, self.nu)
-            lambda_ = self.get_lambda(Re, self.epsilon, method=lambda_method)
-            DeltaP = c.P_INITIAL - c.P_END
-            v_new = np.sqrt((2 * DeltaP * c.INTERNAL_DIAMETER) / (self.rho * lambda_ * c.L))
+        v, iterations, converged = solve_velocity(
+            self, self.config.p_initial - self.config.p_end, self.config.internal_diameter,
+            self.config.length, self.rho, self.nu, self.epsilon, lambda_method,
+            v0=v0, tol=1e-6, max_iter=50
+        )
+        self.v = float(v)
+        self.iterations = int(iterations)
+        self.converged = bool(converged)
 
-            if verbose and iteration < 5:
-                print(f"  Итерация {iteration+1}: v = {v_new:.4f} м/с, "
-                      f"Re = {Re:.0f}, λ = {lambda_:.5f}")
-
-            if abs(v_new - v) < tol:
-                if verbose:
-                    print(f"  Сходимость достигнута за {iteration+1} итераций")
-                break
-            v = v_new
+        if verbose:
+            print("\nРасчёт скорости:")
+            if self.converged:
+                print(f"  Сходимость достигнута за {self.iterations} итераций")
+            else:
+                print(f"  ВНИМАНИЕ: сходимость не достигнута за {self.iterations} итераций")
 
-        self.v = v
-        self.Re = self.get_reynolds(v, c.INTERNAL_DIAMETER, self.nu)
+        self.Re = self.get_reynolds(self.v, self.config.internal_diameter, self.nu)
         self.lambda_ = self.get_lambda(self.Re, self.epsilon, method=lambda_method)
 
         if verbose:
@@ -205,7 +391,7 @@ class PipelineFlow:
             print(f"  Коэффициент сопротивления: λ = {self.lambda_:.5f}")
 
         # 5. Создание расчетной сетки
-        self.dx, self.x_km = self.refine_grid(c.X0_KM, c.XN_KM, c.dx_km)
+        self.dx, self.x_km = self.refine_grid(self.config.x0_km, self.config.xn_km, self.config.dx_km)
         self.x_m = self.x_km * 1000
 
         if verbose:
@@ -214,8 +400,9 @@ class PipelineFlow:
             print(f"  Шаг сетки: dx = {self.dx:.3f} км = {self.dx*1000:.1f} м")
 
         # 6. Распределение давления вдоль трубопровода
-        dp_dx = -(self.lambda_ * self.rho * self.v**2) / (2 * c.INTERNAL_DIAMETER)
-        self.P = c.P_INITIAL + dp_dx * self.x_m
+        # (v·|v| - при обратном течении давление растёт по x)
+        dp_dx = -(self.lambda_ * self.rho * self.v * abs(self.v)) / (2 * self.config.internal_diameter)
+        self.P = self.config.p_initial + dp_dx * self.x_m
         self.v_arr = np.full_like(self.x_km, self.v)
 
         if verbose:
@@ -230,7 +417,12 @@ class PipelineFlow:
                                          boundary_condition='valve_closure',
                                          bc_change_time=None, bc_change_value=None,
                                          lambda_method='auto', verbose=True,
-                                         use_parallel=True, progress_callback=None):
+                                         use_parallel=True, progress_callback=None,
+                                         lambda_table_tol=None, num_processes=None,
+                                         history_file=None, steady_tol=None,
+                                         steady_check_every=50, steady_hold_periods=1.0,
+                                         stream_to_db=None, start_step=0, resume_calc_id=None,
+                                         check_results=True):
         """
         Нестационарный расчёт
 
@@ -247,30 +439,59 @@ class PipelineFlow:
         progress_callback :
             Функция callback(step, total_steps, time, p_array, v_array) -> bool
             Возвращает False для остановки расчёта
+        lambda_table_tol : float
+            Допустимая погрешность табличного λ(Re) (см. LAMBDA_TABLES);
+            None (по умолчанию) - точный расчёт λ на каждом шаге
+        num_processes : int
+            Число процессов для декомпозиции сетки на подобласти (domain.py);
+            None или 1 - расчёт в текущем процессе
+        history_file : str
+            Путь к файлу истории на диске (history.MemmapHistory);
+            None - история в памяти
+        steady_tol : float
+            Допуск невязок для остановки по установившемуся режиму
+            (convergence.SteadyStateMonitor); None - расчёт всех num_steps шагов.
+            Шаг остановки записывается в self.converged_step
+        steady_check_every : int
+            Периодичность проверки установившегося режима, шагов
+        steady_hold_periods : float
+            Число периодов 2L/c, в течение которых должен выполняться допуск
+        stream_to_db : db_manager.DatabaseManager
+            Запись слоёв истории в БД по мере расчёта (db_manager.UnsteadyWriter);
+            номер полностью записанного расчёта - self.streamed_calc_id.
+            Остановленный или прерванный расчёт остаётся незавершённым
+        start_step, resume_calc_id :
+            Продолжение расчёта с шага start_step из состояния self.P, self.v_arr
+            с дозаписью в расчёт resume_calc_id (см. resume_unsteady)
+        check_results : bool
+            Вывод проверки результатов (check_unsteady_results) в консоль
         """
         if not self.stationary_calculated:
             raise ValueError("Сначала выполните calculate_stationary()")
 
+        multiprocess = num_processes is not None and num_processes > 1
+        if history_file is not None and multiprocess:
+            raise ValueError("История в файле не поддерживается при расчёте в нескольких процессах")
+        if steady_tol is not None and multiprocess:
+            raise ValueError("Контроль установившегося режима не поддерживается при расчёте в нескольких процессах")
+        if (stream_to_db is not None or start_step) and multiprocess:
+            raise ValueError("Запись в БД во время расчёта и продолжение расчёта "
+                             "не поддерживаются при расчёте в нескольких процессах")
+
+        self.converged_step = None
+        self.streamed_calc_id = None
+
         if verbose:
             print("\n" + "=" * 60)
             print("Нестационарный расчёт с динамической визуализацией")
             print("=" * 60)
 
-        # Сохраняем исходные стационарные данные
-        if not hasattr(self, 'P_original') or self.P_original is None:
-            self.P_original = self.P.copy()
-            self.v_arr_original = self.v_arr.copy()
+        self._prepare_unsteady()
 
         # Параметры сетки
         N = len(self.x_m)
         dx_m = self.x_m[1] - self.x_m[0]
 
-        # Шаг по времени из условия Куранта (CFL = 1)
-        self.dt = dx_m / self.C
-
-        # Коэффициент B = ρ * c
-        self.B = self.rho * self.C
-
         if verbose:
             print(f"Шаг по времени: dt = {self.dt:.4f} с")
             print(f"Число точек сетки: N = {N}")
@@ -292,203 +513,316 @@ class PipelineFlow:
         p = self.P.copy()
         v = self.v_arr.copy()
 
-        # Сохранение начального состояния
-        self.p_history = [p.copy()]
-        self.v_history = [v.copy()]
-        self.t_history = [0.0]
-
-        # Граничные условия по умолчанию
-        p_inlet = c.P_INITIAL
-        p_outlet = c.P_END
-
-        # Вспомогательные функции для параллельных вычислений
-        def compute_I_a_single(i, p_prev, v_prev):
-            """
-            Вычисление одной инварианты I_a[i]
-            Характеристика C+ приходит из точки (i-1, t) в точку (i, t+dt)
-            """
-            if i == 0:
-                return 0.0
-
-            p_a = p_prev[i-1]
-            v_a = v_prev[i-1]
-
-            dx_local = dx_m
-
-            # Расчёт λ для текущей скорости
-            if abs(v_a) < 1e-10:
-                lambda_a = self.lambda_
-            else:
-                Re_a = self.get_reynolds(abs(v_a), c.INTERNAL_DIAMETER, self.nu)
-                lambda_a = self.get_lambda(Re_a, self.epsilon, method=lambda_method)
-
-            # Член трения
-            R_a = lambda_a * dx_local * self.rho * v_a * abs(v_a) / (2 * c.INTERNAL_DIAMETER)
-
-            # Инварианта вдоль C+
-            I_a = p_a + self.B * v_a - R_a
-
-            return I_a
-
-        def compute_I_b_single(i, p_prev, v_prev):
-            """
-            Вычисление одной инварианты I_b[i]
-            Характеристика C- приходит из точки (i+1, t) в точку (i, t+dt)
-            """
-            if i == N - 1:
-                return 0.0
-
-            p_b = p_prev[i+1]
-            v_b = v_prev[i+1]
+        # История выделяется один раз (или пишется в файл); сохранение начального состояния
+        if history_file is not None:
+            history = MemmapHistory(history_file, N)
+        else:
+            history = HistoryBuffer(num_history_layers(num_steps, store_every, start_step), N)
+        history.append(start_step * self.dt, p, v)
+
+        if multiprocess:
+            # Подобласти сетки в отдельных процессах
+            if verbose:
+                print(f"Процессов: {num_processes}")
+
+            (self.t_history, self.p_history, self.v_history,
+             p, v, last_step) = domain.run_domain_decomposed(
+                self, num_steps, store_every, boundary_condition,
+                bc_change_time, bc_change_value, lambda_method,
+                lambda_table_tol, num_processes, progress_callback
+            )
+            if verbose and last_step < num_steps:
+                print(f"\n Расчёт остановлен пользователем на шаге {last_step}")
+        else:
+            if verbose and use_parallel:
+                print(f"Потоков: {ChunkedExecutor.auto_workers(N)}")
+
+            monitor = None
+            if steady_tol is not None:
+                # После закрытия клапана поток должен остановиться, а давление выровняться
+                if boundary_condition == 'valve_closure':
+                    def state_check(p_array, v_array):
+                        return self.check_steady_state(p_array, v_array, steady_tol)
+                else:
+                    state_check = None
+
+                monitor = SteadyStateMonitor(steady_tol, 2 * (self.x_m[-1] - self.x_m[0]) / self.C,
+                                             steady_check_every, steady_hold_periods, state_check)
+
+            # Слои истории дублируются в БД фоновым потоком записи
+            writer = None
+            if stream_to_db is not None:
+                if resume_calc_id is None:
+                    params = {
+                        'config': self.config.as_dict(), 'num_steps': num_steps,
+                        'store_every': store_every, 'boundary_condition': boundary_condition,
+                        'bc_change_time': bc_change_time, 'bc_change_value': bc_change_value,
+                        'lambda_method': lambda_method, 'lambda_table_tol': lambda_table_tol,
+                        'steady_tol': steady_tol, 'steady_check_every': steady_check_every,
+                        'steady_hold_periods': steady_hold_periods,
+                    }
+                    writer = db.UnsteadyWriter(stream_to_db, self.x_km, self.x_m, params)
+                    writer.append(0.0, p, v)
+                else:
+                    writer = db.UnsteadyWriter(stream_to_db, calc_id=resume_calc_id)
+
+            steps = self._unsteady_steps(num_steps, boundary_condition, bc_change_time,
+                                         bc_change_value, lambda_method, use_parallel,
+                                         lambda_table_tol, start_step)
+            stopped = False
+            try:
+                # Главный цикл по времени
+                for step, current_t, p, v in steps:
+                    # Коллбэк
+                    if progress_callback and step % max(store_every, 5) == 0:
+                        # Вызываем коллбэк с текущими данными
+                        should_continue = progress_callback(step, num_steps, current_t, p.copy(), v.copy())
+
+                        # Проверка на запрос остановки
+                        if should_continue is False:
+                            if verbose:
+                                print(f"\n Расчёт остановлен пользователем на шаге {step}")
+                            stopped = True
+                            break
+
+                    # Сохраниение результатов в историю
+                    if step % store_every == 0 or step == num_steps:
+                        history.append(current_t, p, v)
+                        if writer is not None:
+                            writer.append(current_t, p, v)
+
+                        if verbose and step % (store_every * 10) == 0:
+                            max_p = np.max(p) / 1e6
+                            min_p = np.min(p) / 1e6
+                            max_v = np.max(np.abs(v))
+
+                            # Проверка на NaN или Inf
+                            if np.isnan(max_p) or np.isinf(max_p):
+                                print(f"ВНИМАНИЕ: Обнаружены NaN/Inf на шаге {step}!")
+                                print("   Проверьте параметры расчёта")
+                                stopped = True
+                                break
+
+                            print(f"t = {current_t:7.2f} с | "
+                                  f"P: [{min_p:.3f}, {max_p:.3f}] МПа | "
+                                  f"v_max: {max_v:.4f} м/с")
+
+                    # Остановка по установившемуся режиму
+                    if monitor is not None and monitor.update(step, current_t, p, v):
+                        self.converged_step = step
+                        if not (step % store_every == 0 or step == num_steps):
+                            history.append(current_t, p, v)
+                            if writer is not None:
+                                writer.append(current_t, p, v)
+                        if verbose:
+                            print(f"\n Установившийся режим на шаге {step} (t = {current_t:.2f} с)")
+                        break
+            except BaseException:
+                stopped = True
+                raise
+            finally:
+                steps.close()
+                if writer is not None:
+                    writer.close(complete=not stopped)
 
-            dx_local = dx_m
+            if writer is not None and not stopped:
+                self.streamed_calc_id = writer.calc_id
 
-            # Расчёт λ для текущей скорости
-            if abs(v_b) < 1e-10:
-                lambda_b = self.lambda_
-            else:
-                Re_b = self.get_reynolds(abs(v_b), c.INTERNAL_DIAMETER, self.nu)
-                lambda_b = self.get_lambda(Re_b, self.epsilon, method=lambda_method)
+            self.t_history, self.p_history, self.v_history = history.views()
 
-            # Член трения
-            R_b = lambda_b * dx_local * self.rho * v_b * abs(v_b) / (2 * c.INTERNAL_DIAMETER)
+        # Финальное состояние
+        self.P = p
+        self.v_arr = v
 
-            # Инварианта вдоль C-
-            I_b = p_b - self.B * v_b + R_b
+        if verbose:
+            print("=" * 60)
+            print("Нестационарный расчёт завершён")
+            print(f"Сохранено {len(self.t_history)} временных слоёв")
+            print("=" * 60)
+        # Проверка результатов
+        if check_results:
+            self.check_unsteady_results()
 
-            return I_b
+    def _prepare_unsteady(self):
+        """Сохранение стационарного решения, шаг по времени и коэффициент B"""
+        # Сохраняем исходные стационарные данные
+        if not hasattr(self, 'P_original') or self.P_original is None:
+            self.P_original = self.P.copy()
+            self.v_arr_original = self.v_arr.copy()
 
-        # Главный цикл по времени
-        for step in range(1, num_steps + 1):
-            current_t = step * self.dt
+        # Шаг по времени из условия Куранта (CFL = 1)
+        self.dt = (self.x_m[1] - self.x_m[0]) / self.C
 
-            # Изменение граничных условий в заданный момент времени
-            if bc_change_time is not None and current_t >= bc_change_time:
-                if boundary_condition == 'pressure_inlet':
-                    p_inlet = bc_change_value
-                elif boundary_condition == 'pressure_outlet':
-                    p_outlet = bc_change_value
+        # Коэффициент B = ρ * c
+        self.B = self.rho * self.C
 
-            p_new = np.zeros(N)
-            v_new = np.zeros(N)
+    def _unsteady_steps(self, num_steps, boundary_condition, bc_change_time, bc_change_value,
+                        lambda_method, use_parallel, lambda_table_tol, start_step=0):
+        """
+        Ядро нестационарного расчёта: генератор (step, t, p, v) после каждого шага
+        (начиная с шага start_step + 1 из состояния self.P, self.v_arr)
 
-            # ШАГ 1: Инварианты I_a и I_b
-            I_a = np.zeros(N)
-            I_b = np.zeros(N)
+        p и v - рабочие буферы решателя, действительны до следующего шага
+        """
+        N = len(self.x_m)
+        dx_m = self.x_m[1] - self.x_m[0]
 
-            if use_parallel:
-                # Параллельные вычисления инвариант
-                with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-                    future_I_a = {
-                        executor.submit(compute_I_a_single, i, p, v): i
-                        for i in range(1, N)
-                    }
+        # Начальные условия (из стационарного расчёта)
+        p = self.P.copy()
+        v = self.v_arr.copy()
 
-                    future_I_b = {
-                        executor.submit(compute_I_b_single, i, p, v): i
-                        for i in range(N-1)
-                    }
+        # Граничные условия по умолчанию
+        p_inlet = self.config.p_initial
+        p_outlet = self.config.p_end
+
+        # Рабочие массивы шага выделяются один раз; p/v и p_new/v_new
+        # меняются ролями после каждого шага
+        p_new = np.empty(N)
+        v_new = np.empty(N)
+        lambda_arr = np.empty(N)
+        R = np.zeros(N)
+        I_a = np.zeros(N)
+        I_b = np.zeros(N)
+
+        def friction_chunk(lo, hi):
+            """Потери на трение в узлах блока [lo, hi)"""
+            v_chunk = v[lo:hi]
+            lambda_chunk = self.friction_factor_array(v_chunk, lambda_method, lambda_table_tol,
+                                                      out=lambda_arr[lo:hi])
+            moc.friction_loss(v_chunk, lambda_chunk, self.rho, dx_m, self.config.internal_diameter,
+                              out=R[lo:hi])
+
+        def characteristics_chunk(lo, hi):
+            """Инварианты и решение во внутренних узлах блока [lo, hi)"""
+            moc.characteristic_invariants(p, v, R, self.B, I_a, I_b, lo, hi)
+            moc.interior_update(I_a, I_b, self.B, p_new, v_new, lo, hi)
+
+        # Пул потоков живёт весь расчёт; без параллельности - один блок
+        executor = ChunkedExecutor(N, max_workers=None if use_parallel else 1)
+
+        try:
+            for step in range(start_step + 1, num_steps + 1):
+                current_t = step * self.dt
+
+                # Изменение граничных условий в заданный момент времени
+                if bc_change_time is not None and current_t >= bc_change_time:
+                    if boundary_condition == 'pressure_inlet':
+                        p_inlet = bc_change_value
+                    elif boundary_condition == 'pressure_outlet':
+                        p_outlet = bc_change_value
+
+                # ШАГ 1-2: Трение, инварианты I_a, I_b и внутренние точки (i = 1, ..., N-2)
+                executor.run(friction_chunk)
+                executor.run(characteristics_chunk)
+
+                # ШАГ 3: Граничные условия
+                self._apply_boundary_conditions(p_new, v_new, I_a, I_b, boundary_condition,
+                                                p_inlet, p_outlet)
+
+                # ШАГ 4: Обновление решения (обмен буферов без копирования)
+                p, p_new = p_new, p
+                v, v_new = v_new, v
+
+                yield step, current_t, p, v
+        finally:
+            executor.shutdown()
+
+    def resume_unsteady(self, db_manager, calc_id, **kwargs):
+        """
+        Продолжение незавершённого расчёта calc_id, записанного в БД (stream_to_db)
 
-                    for future in concurrent.futures.as_completed(future_I_a):
-                        i = future_I_a[future]
-                        I_a[i] = future.result()
+        Параметры трубопровода и расчёта берутся из БД, расчёт продолжается
+        с последнего записанного слоя и дописывается в тот же calc_id.
+        kwargs - прочие аргументы calculate_unsteady_with_callback (verbose,
+        use_parallel, progress_callback) или заменяемые параметры. Контроль установившегося режима
+        начинается заново. После завершения история - полная, из БД
+        """
+        params = db_manager.get_calculation_params(calc_id)
+        arrays = db_manager.get_unsteady_arrays(calc_id)
+        if params is None or arrays is None or len(arrays[2]) == 0:
+            raise ValueError(f"Расчёт {calc_id} нельзя продолжить: нет параметров или слоёв")
+
+        run = dict(params)
+        self.config = PipelineConfig(**run.pop('config'))
+        self.C = self.config.speed_of_sound
+        self.P_original = None
+        self.calculate_stationary(lambda_method=run['lambda_method'], verbose=False)
+        self._prepare_unsteady()
+
+        _, _, t_history, p_history, v_history = arrays
+        start_step = int(round(t_history[-1] / self.dt))
+        self.P = p_history[-1].copy()
+        self.v_arr = v_history[-1].copy()
+
+        run.update(kwargs)
+        self.calculate_unsteady_with_callback(**run, stream_to_db=db_manager,
+                                              start_step=start_step, resume_calc_id=calc_id)
+
+        if self.streamed_calc_id is not None:
+            _, _, self.t_history, self.p_history, self.v_history = db_manager.get_unsteady_arrays(calc_id)
+
+    def iter_unsteady(self, num_steps=2000, frame_every=10,
+                      boundary_condition='valve_closure',
+                      bc_change_time=None, bc_change_value=None,
+                      lambda_method='auto', use_parallel=True, lambda_table_tol=None):
+        """
+        Нестационарный расчёт в виде генератора кадров streaming.Frame
+
+        Первый кадр - начальное состояние (шаг 0), далее каждые frame_every
+        шагов и последний шаг. Массивы кадра - представления рабочих буферов
+        решателя только для чтения, без копирования; они действительны
+        до запроса следующего кадра (для хранения - frame.copy()).
+        Для медленного потребителя в другом потоке - streaming.FrameStream.
+        По завершении всех шагов финальное состояние записывается в self.P, self.v_arr
+        """
+        if not self.stationary_calculated:
+            raise ValueError("Сначала выполните calculate_stationary()")
+        if frame_every < 1:
+            raise ValueError("Период кадров должен быть не меньше 1")
 
-                    for future in concurrent.futures.as_completed(future_I_b):
-                        i = future_I_b[future]
-                        I_b[i] = future.result()
-            else:
-                # Последовательные вычисления
-                for i in range(1, N):
-                    I_a[i] = compute_I_a_single(i, p, v)
-
-                for i in range(N-1):
-                    I_b[i] = compute_I_b_single(i, p, v)
-
-            # ШАГ 2: Решение для внутренних точек (i = 1, 2, ..., N-2)
-            for i in range(1, N-1):
-                p_new[i] = (I_a[i] + I_b[i]) / 2.0
-                v_new[i] = (I_a[i] - I_b[i]) / (2.0 * self.B)
-
-            # ШАГ 3: Граничные условия
-            # Левая граница (i = 0): задано давление p_inlet
-            p_new[0] = p_inlet
-            v_new[0] = (p_new[0] - I_b[0]) / self.B
-
-            # Правая граница (i = N-1): зависит от типа ГУ
-            if boundary_condition == 'valve_closure':
-                # Закрытие клапана: скорость = 0
-                v_new[N-1] = 0.0
-                # Давление определяется из характеристики C+
-                p_new[N-1] = I_a[N-1] - self.B * v_new[N-1]
-
-            elif boundary_condition == 'pressure_outlet':
-                # Задано давление на выходе
-                p_new[N-1] = p_outlet
-                v_new[N-1] = (I_a[N-1] - p_new[N-1]) / self.B
-
-            elif boundary_condition == 'pressure_inlet':
-                # Изменение давления на входе
-                p_new[0] = p_inlet
-                v_new[0] = (p_new[0] - I_b[0]) / self.B
-                # Правая граница: задано постоянное давление
-                p_new[N-1] = c.P_END
-                v_new[N-1] = (I_a[N-1] - p_new[N-1]) / self.B
+        self._prepare_unsteady()
 
-            else:
-                # По умолчанию: задано давление на выходе
-                p_new[N-1] = c.P_END
-                v_new[N-1] = (I_a[N-1] - p_new[N-1]) / self.B
-
-            # ШАГ 4: Обновление решения
-            p = p_new.copy()
-            v = v_new.copy()
-
-            # ШАГ 5: Коллюэк
-            if progress_callback and step % max(store_every, 5) == 0:
-                # Вызываем коллбэк с текущими данными
-                should_continue = progress_callback(step, num_steps, current_t, p.copy(), v.copy())
-
-                # Проверка на запрос остановки
-                if should_continue is False:
-                    if verbose:
-                        print(f"\n Расчёт остановлен пользователем на шаге {step}")
-                    break
-
-            # ШАГ 6: Сохраниение результатов в историю
-            if step % store_every == 0 or step == num_steps:
-                self.p_history.append(p.copy())
-                self.v_history.append(v.copy())
-                self.t_history.append(current_t)
-
-                if verbose and step % (store_every * 10) == 0:
-                    max_p = np.max(p) / 1e6
-                    min_p = np.min(p) / 1e6
-                    max_v = np.max(np.abs(v))
-
-                    # Проверка на NaN или Inf
-                    if np.isnan(max_p) or np.isinf(max_p):
-                        print(f"ВНИМАНИЕ: Обнаружены NaN/Inf на шаге {step}!")
-                        print("   Проверьте параметры расчёта")
-                        break
+        p = self.P
+        v = self.v_arr
+        yield Frame(0, 0.0, p, v)
 
-                    print(f"t = {current_t:7.2f} с | "
-                          f"P: [{min_p:.3f}, {max_p:.3f}] МПа | "
-                          f"v_max: {max_v:.4f} м/с")
+        steps = self._unsteady_steps(num_steps, boundary_condition, bc_change_time,
+                                     bc_change_value, lambda_method, use_parallel,
+                                     lambda_table_tol)
+        try:
+            for step, current_t, p, v in steps:
+                if step % frame_every == 0 or step == num_steps:
+                    yield Frame(step, current_t, p, v)
+        finally:
+            steps.close()
 
         # Финальное состояние
         self.P = p
         self.v_arr = v
 
-        if verbose:
-            print("=" * 60)
-            print("Нестационарный расчёт завершён")
-            print(f"Сохранено {len(self.t_history)} временных слоёв")
-            print("=" * 60)
-        # Проверка результатов
-        self.check_unsteady_results()
+    def calculate_unsteady_ensemble(self, scenarios, num_steps=2000, store_every=10,
+                                    lambda_method='auto', lambda_table_tol=None,
+                                    progress_callback=None):
+        """
+        Нестационарный расчёт сразу для набора сценариев граничных условий
+
+        scenarios : list of dict
+            Ключи 'boundary_condition', 'bc_change_time', 'bc_change_value'
+        Возвращает ensemble.EnsembleResult с историями формы (сценарии × слои × узлы)
+        """
+        return ensemble.run_ensemble(self, scenarios, num_steps=num_steps,
+                                     store_every=store_every, lambda_method=lambda_method,
+                                     lambda_table_tol=lambda_table_tol,
+                                     progress_callback=progress_callback)
+
+    def _apply_boundary_conditions(self, p_new, v_new, I_a, I_b, boundary_condition,
+                                   p_inlet, p_outlet):
+        """Граничные условия на концах трубопровода"""
+        moc.inlet_boundary(p_new, v_new, I_b, self.B, p_inlet)
+        moc.outlet_boundary(p_new, v_new, I_a, self.B, boundary_condition, p_outlet, self.config.p_end)
 
     def check_unsteady_results(self):
-        if not self.p_history:
+        if len(self.p_history) == 0:
             return
 
         # Последний временной слой
@@ -535,13 +869,23 @@ class PipelineFlow:
             self.v_arr = self.v_arr_original.copy()
 
     def save_to_database(self, db_name='pipeline_results.db'):
+        """Сохранение результатов в БД; статистика записи (rows, seconds, rows_per_s)"""
         db_manager = db.DatabaseManager(db_name)
+        rows, seconds = 0, 0.0
 
         if self.stationary_calculated:
             db_manager.save_stationary_calculation(self)
+            rows += db_manager.last_save_stats['rows']
+            seconds += db_manager.last_save_stats['seconds']
 
-        if self.p_history:
+        # История, записанная в БД во время расчёта, повторно не сохраняется
+        if len(self.p_history) > 0 and self.streamed_calc_id is None:
             db_manager.save_unsteady_calculation(self)
+            rows += db_manager.last_save_stats['rows']
+            seconds += db_manager.last_save_stats['seconds']
+
+        return {'rows': rows, 'seconds': seconds,
+                'rows_per_s': rows / seconds if seconds > 0 else float('inf')}
 
     def print_results_table(self):
         """Вывод таблицы значений"""
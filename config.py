@@ -0,0 +1,114 @@
+"""
+Параметры расчёта трубопровода
+
+PipelineConfig - неизменяемый хешируемый набор исходных данных одного
+расчёта. Передаётся в PipelineFlow явно, поэтому расчёты с разными
+параметрами могут идти одновременно в потоках и процессах, а результаты
+можно кэшировать по параметрам. Значения по умолчанию - из constants.
+"""
+
+import dataclasses
+import hashlib
+
+import constants as c
+
+
+@dataclasses.dataclass(frozen=True)
+class PipelineConfig:
+    """Исходные данные в единицах модуля constants"""
+
+    external_diameter_mm: float = c.EXTERNAL_DIAMETER_MM  # внешний диаметр, мм
+    wall_thickness_mm: float = c.WALL_THICKNESS_MM  # толщина стенки, мм
+    abs_roughness_mm: float = c.ABS_ROUGHTNESS_MM  # абсолютная шероховатость, мм
+    x0_km: float = c.X0_KM  # начальная координата, км
+    xn_km: float = c.XN_KM  # конечная координата, км
+    ro20: float = c.RO20  # плотность при 20C, кг/м3
+    viscosity_20_sst: float = c.VISCOSITY_20_SST  # вязкость при 20C, сСт
+    viscosity_50_sst: float = c.VISCOSITY_50_SST  # вязкость при 50C, сСт
+    p_initial_mpa: float = c.P_INITIAL_MPA  # давление в начале, МПа
+    p_end_mpa: float = c.P_END_MPA  # давление в конце, МПа
+    tc: float = c.TC  # температура, C
+    dx_km: float = c.dx_km  # грубый шаг
+    speed_of_sound: float = c.SPEED_OF_SOUND  # м/с
+
+    def __post_init__(self):
+        if self.internal_diameter <= 0:
+            raise ValueError("Толщина стенки должна быть меньше половины внешнего диаметра")
+        if self.length <= 0:
+            raise ValueError("Конечная координата должна быть больше начальной")
+        if self.dx_km <= 0:
+            raise ValueError("Шаг сетки должен быть положительным")
+        if self.speed_of_sound <= 0:
+            raise ValueError("Скорость звука должна быть положительной")
+
+    @classmethod
+    def from_constants(cls):
+        """Параметры из текущих значений модуля constants"""
+        return cls(
+            external_diameter_mm=c.EXTERNAL_DIAMETER_MM,
+            wall_thickness_mm=c.WALL_THICKNESS_MM,
+            abs_roughness_mm=c.ABS_ROUGHTNESS_MM,
+            x0_km=c.X0_KM,
+            xn_km=c.XN_KM,
+            ro20=c.RO20,
+            viscosity_20_sst=c.VISCOSITY_20_SST,
+            viscosity_50_sst=c.VISCOSITY_50_SST,
+            p_initial_mpa=c.P_INITIAL_MPA,
+            p_end_mpa=c.P_END_MPA,
+            tc=c.TC,
+            dx_km=c.dx_km,
+            speed_of_sound=c.SPEED_OF_SOUND,
+        )
+
+    def replace(self, **changes):
+        """Копия с изменёнными параметрами"""
+        return dataclasses.replace(self, **changes)
+
+    def as_dict(self):
+        return dataclasses.asdict(self)
+
+    def digest(self):
+        """Устойчивый между запусками ключ параметров (sha256)"""
+        text = ";".join(f"{name}={float(value)!r}" for name, value in sorted(self.as_dict().items()))
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    # Преобразование единиц
+    @property
+    def external_diameter(self):
+        return self.external_diameter_mm / 1000  # м
+
+    @property
+    def wall_thickness(self):
+        return self.wall_thickness_mm / 1000  # м
+
+    @property
+    def internal_diameter(self):
+        return self.external_diameter - 2 * self.wall_thickness  # внутренний диаметр, м
+
+    @property
+    def abs_roughness(self):
+        return self.abs_roughness_mm / 1000  # м
+
+    @property
+    def length(self):
+        return (self.xn_km - self.x0_km) * 1000  # длина, м
+
+    @property
+    def p_initial(self):
+        return self.p_initial_mpa * 1e6  # Па
+
+    @property
+    def p_end(self):
+        return self.p_end_mpa * 1e6  # Па
+
+    @property
+    def temperature(self):
+        return self.tc + 273.15  # K
+
+    @property
+    def viscosity_20(self):
+        return self.viscosity_20_sst * 1e-6  # m^2/s
+
+    @property
+    def viscosity_50(self):
+        return self.viscosity_50_sst * 1e-6
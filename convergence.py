@@ -0,0 +1,97 @@
+"""
+Контроль выхода нестационарного расчёта на установившийся режим
+
+Невязки считаются векторно раз в check_every шагов:
+    max_velocity    - max|v|, м/с
+    pressure_spread - (max p - min p) / mean p
+    pressure_change - max|p(n) - p(n-1)| / mean p за один шаг
+    velocity_change - max|v(n) - v(n-1)| за один шаг, м/с
+Режим считается установившимся, если изменения за шаг (и, при заданной
+state_check, само состояние) не превышают допуска непрерывно в течение
+hold_periods периодов отражения волны 2L/c.
+"""
+
+import numpy as np
+
+
+class SteadyStateMonitor:
+    """
+    tolerance : float
+        Допуск невязок (м/с для скорости, доля среднего давления для давления)
+    period : float
+        Период отражения волны 2L/c, с
+    check_every : int
+        Периодичность проверки, шагов
+    hold_periods : float
+        Сколько периодов 2L/c допуск должен выполняться без перерыва
+    state_check : callable
+        Дополнительная проверка состояния f(p, v) -> bool,
+        например PipelineFlow.check_steady_state для закрытия клапана
+    """
+
+    def __init__(self, tolerance, period, check_every=50, hold_periods=1.0, state_check=None):
+        if check_every < 2:
+            raise ValueError("Периодичность проверки должна быть не меньше 2 шагов")
+
+        self.tolerance = tolerance
+        self.period = period
+        self.check_every = check_every
+        self.hold_periods = hold_periods
+        self.state_check = state_check
+
+        self.residuals = {}
+        self.converged_step = None
+        self.converged_time = None
+
+        self._p_prev = None
+        self._v_prev = None
+        self._prev_step = None
+        self._hold_since = None
+
+    def update(self, step, t, p, v):
+        """
+        Вызывается после каждого шага; True - режим установился
+
+        Состояние копируется только на шаге перед проверкой
+        """
+        if (step + 1) % self.check_every == 0:
+            if self._p_prev is None:
+                self._p_prev = np.empty_like(p)
+                self._v_prev = np.empty_like(v)
+            np.copyto(self._p_prev, p)
+            np.copyto(self._v_prev, v)
+            self._prev_step = step
+            return False
+
+        if step % self.check_every != 0 or self._prev_step != step - 1:
+            return False
+
+        if self.is_steady(p, v):
+            if self._hold_since is None:
+                self._hold_since = t
+            if t - self._hold_since >= self.hold_periods * self.period:
+                self.converged_step = step
+                self.converged_time = t
+                return True
+        else:
+            self._hold_since = None
+
+        return False
+
+    def is_steady(self, p, v):
+        """Расчёт невязок и проверка допуска на текущем шаге"""
+        p_mean = abs(np.mean(p))
+        self.residuals = {
+            'max_velocity': float(np.max(np.abs(v))),
+            'pressure_spread': float((np.max(p) - np.min(p)) / p_mean),
+            'pressure_change': float(np.max(np.abs(p - self._p_prev)) / p_mean),
+            'velocity_change': float(np.max(np.abs(v - self._v_prev))),
+        }
+
+        if self.residuals['pressure_change'] > self.tolerance:
+            return False
+        if self.residuals['velocity_change'] > self.tolerance:
+            return False
+        if self.state_check is not None and not self.state_check(p, v):
+            return False
+        return True
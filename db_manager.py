@@ -1,62 +1,349 @@
 import sqlite3
 import csv
+from contextlib import contextmanager
 from datetime import datetime
+from itertools import chain, repeat
+import json
+import lzma
+import os
+import queue
+import threading
+import time
+import zlib
+
+import numpy as np
+
+import export
+
+# Настройки соединения: журнал WAL (читатели не блокируют запись),
+# синхронизация с диском только при контрольных точках WAL, кэш страниц
+# 64 МБ, временные данные в памяти, проверка внешних ключей (удаление
+# расчёта каскадно удаляет его результаты)
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -65536',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA foreign_keys = ON',
+)
+
+# Таблицы результатов; {name} - имя таблицы (при перестройке - временное)
+RESULT_TABLES = {
+    'stationary_results': '''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            calc_id INTEGER,
+            x_km REAL,
+            x_m REAL,
+            pressure_Pa REAL,
+            pressure_MPa REAL,
+            velocity_ms REAL,
+            FOREIGN KEY (calc_id) REFERENCES calculations (id) ON DELETE CASCADE
+        )
+    ''',
+    'unsteady_results': '''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            calc_id INTEGER,
+            time_step INTEGER,
+            time_s REAL,
+            x_km REAL,
+            x_m REAL,
+            pressure_Pa REAL,
+            pressure_MPa REAL,
+            velocity_ms REAL,
+            FOREIGN KEY (calc_id) REFERENCES calculations (id) ON DELETE CASCADE
+        )
+    ''',
+    'unsteady_grid': '''
+        CREATE TABLE IF NOT EXISTS {name} (
+            calc_id INTEGER PRIMARY KEY,
+            num_nodes INTEGER,
+            num_layers INTEGER,
+            compression TEXT,
+            dtype TEXT,
+            x_km BLOB,
+            x_m BLOB,
+            FOREIGN KEY (calc_id) REFERENCES calculations (id) ON DELETE CASCADE
+        )
+    ''',
+    'unsteady_layers': '''
+        CREATE TABLE IF NOT EXISTS {name} (
+            calc_id INTEGER,
+            layer INTEGER,
+            time_s REAL,
+            pressure BLOB,
+            velocity BLOB,
+            PRIMARY KEY (calc_id, layer),
+            FOREIGN KEY (calc_id) REFERENCES calculations (id) ON DELETE CASCADE
+        )
+    ''',
+}
+
+# Обслуживание: страниц за один шаг incremental_vacuum, строк за один шаг
+# перестройки таблиц (migrate_foreign_keys)
+VACUUM_STEP_PAGES = 4096
+MIGRATE_CHUNK_ROWS = 100000
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+# Соединения: одно на поток и файл базы, открываются при первом обращении
+# и переиспользуются вместе с кэшем подготовленных запросов sqlite3.
+# Запись внутри процесса сериализуется блокировкой файла базы, между
+# процессами - ожиданием занятой базы (timeout). Схема создаётся один раз
+# на процесс
+CONNECT_TIMEOUT = 30.0
+CACHED_STATEMENTS = 256
+
+_local = threading.local()
+_registry_lock = threading.Lock()
+_write_locks = {}
+_initialized = set()
+
+# Статусы расчётов: 'running' - слои ещё записываются (или запись прервана),
+# 'complete' - расчёт записан полностью
+STATUS_RUNNING = 'running'
+STATUS_COMPLETE = 'complete'
+
+# Расчёты, которые сейчас записываются UnsteadyWriter этого процесса: (файл, calc_id)
+_active_writers = set()
+
+# Нестационарные результаты хранятся по столбцам: сетка - один раз на расчёт
+# (unsteady_grid), каждый временной слой - упакованные массивы давления
+# и скорости (unsteady_layers). Таблица unsteady_results - прежний формат
+# (строка на узел и слой), читается для старых баз; перевод в новый
+# формат - migrate_unsteady_storage(). Слои могут храниться в float32
+# (вдвое меньше, ~7 значащих цифр), сетка - всегда в float64
+LAYER_DTYPES = {'float64': '<f8', 'float32': '<f4'}
+COMPRESSIONS = (None, 'zlib', 'lzma')
+
+
+def pack_array(array, compression=None, dtype='float64'):
+    """Массив -> BLOB (little-endian, при необходимости сжатый)"""
+    data = np.ascontiguousarray(array, dtype=LAYER_DTYPES[dtype]).tobytes()
+    if compression == 'zlib':
+        return zlib.compress(data)
+    if compression == 'lzma':
+        return lzma.compress(data)
+    return data
+
+
+def unpack_array(blob, compression=None, dtype='float64'):
+    """BLOB -> массив (только для чтения, без копирования несжатых данных)"""
+    if compression == 'zlib':
+        blob = zlib.decompress(blob)
+    elif compression == 'lzma':
+        blob = lzma.decompress(blob)
+    return np.frombuffer(blob, dtype=LAYER_DTYPES[dtype])
+
+
+def _check_storage(compression, dtype):
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Неизвестный метод сжатия: {compression}")
+    if dtype not in LAYER_DTYPES:
+        raise ValueError(f"Неизвестный тип хранения слоёв: {dtype}")
+
+
+class _Cancelled(Exception):
+    """Отмена перестройки таблицы (откат транзакции)"""
 
 
 class DatabaseManager:
-    def __init__(self, db_name='pipeline_results.db'):
+    """
+    Хранение результатов расчётов в SQLite
+
+    compression : None, 'zlib' или 'lzma'
+        Сжатие слоёв нестационарных расчётов при записи
+    dtype : 'float64' или 'float32'
+        Тип хранения слоёв нестационарных расчётов
+    """
+
+    def __init__(self, db_name='pipeline_results.db', compression=None, dtype='float64'):
+        _check_storage(compression, dtype)
         self.db_name = db_name
-        self.init_database()
+        self.compression = compression
+        self.dtype = dtype
+        # Статистика последнего сохранения: rows, seconds, rows_per_s
+        self.last_save_stats = None
+
+        self._path = os.path.abspath(db_name)
+        with _registry_lock:
+            self._write_lock = _write_locks.setdefault(self._path, threading.Lock())
+            if self._path not in _initialized or not os.path.exists(self._path):
+                # Файл базы удалён - прежнее соединение потока указывает на старый файл
+                self.close()
+                self.init_database()
+                _initialized.add(self._path)
+
+    def _connection(self):
+        """Соединение текущего потока с базой (открывается при первом обращении)"""
+        connections = getattr(_local, 'connections', None)
+        if connections is None:
+            connections = _local.connections = {}
+
+        conn = connections.get(self._path)
+        if conn is None:
+            conn = sqlite3.connect(self.db_name, timeout=CONNECT_TIMEOUT,
+                                   cached_statements=CACHED_STATEMENTS)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            connections[self._path] = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        """Транзакция записи: commit при успехе, rollback при ошибке"""
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                yield conn
+
+    def close(self):
+        """Закрытие соединения текущего потока"""
+        conn = getattr(_local, 'connections', {}).pop(self._path, None)
+        if conn is not None:
+            conn.close()
+
+    def _save_stats(self, rows, start):
+        elapsed = time.perf_counter() - start
+        self.last_save_stats = {
+            'rows': rows,
+            'seconds': elapsed,
+            'rows_per_s': rows / elapsed if elapsed > 0 else float('inf'),
+        }
 
     def init_database(self):
-        with sqlite3.connect(self.db_name) as conn:
+        with self._write() as conn:
             cursor = conn.cursor()
 
+            # Новая база: освобождённые страницы возвращаются файловой
+            # системе через incremental_vacuum (в режиме WAL режим
+            # применяется только VACUUM, для пустой базы он мгновенный)
+            if cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table'").fetchone() is None:
+                cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                cursor.execute('VACUUM')
+
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS calculations (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     timestamp TEXT,
                     calculation_type TEXT,
                     num_points INTEGER,
-                    description TEXT
+                    description TEXT,
+                    status TEXT DEFAULT 'complete',
+                    params TEXT
                 )
             ''')
 
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS stationary_results (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    calc_id INTEGER,
-                    x_km REAL,
-                    x_m REAL,
-                    pressure_Pa REAL,
-                    pressure_MPa REAL,
-                    velocity_ms REAL,
-                    FOREIGN KEY (calc_id) REFERENCES calculations (id)
-                )
-            ''')
+            # Базы прежних версий: статус и параметры расчёта
+            columns = {row[1] for row in cursor.execute('PRAGMA table_info(calculations)')}
+            if 'status' not in columns:
+                cursor.execute("ALTER TABLE calculations ADD COLUMN status TEXT DEFAULT 'complete'")
+            if 'params' not in columns:
+                cursor.execute('ALTER TABLE calculations ADD COLUMN params TEXT')
 
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS unsteady_results (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    calc_id INTEGER,
-                    time_step INTEGER,
-                    time_s REAL,
-                    x_km REAL,
-                    x_m REAL,
-                    pressure_Pa REAL,
-                    pressure_MPa REAL,
-                    velocity_ms REAL,
-                    FOREIGN KEY (calc_id) REFERENCES calculations (id)
-                )
-            ''')
+            for name, ddl in RESULT_TABLES.items():
+                cursor.execute(ddl.format(name=name))
 
-            conn.commit()
+            # Таблицы баз прежних версий (без ON DELETE CASCADE) перестраиваются
+            # отдельно: migrate_foreign_keys
+            self._create_indexes(cursor)
+
+    @staticmethod
+    def _create_indexes(cursor):
+        # Стационарные результаты невелики: покрывающий индекс, чтение
+        # расчёта - один проход по индексу без обращения к строкам таблицы
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_stationary_results_calc
+            ON stationary_results (calc_id, x_km, x_m, pressure_Pa, pressure_MPa, velocity_ms)
+        ''')
+
+        # Прежний формат нестационарных результатов - самая большая таблица:
+        # только ключ (calc_id, time_step), без копии данных в индексе.
+        # Широкий индекс ранних версий заменяется
+        columns = [row[2] for row in cursor.execute("PRAGMA index_info('idx_unsteady_results_calc')")]
+        if columns and columns != ['calc_id', 'time_step']:
+            cursor.execute('DROP INDEX idx_unsteady_results_calc')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_unsteady_results_calc
+            ON unsteady_results (calc_id, time_step)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_unsteady_layers_time
+            ON unsteady_layers (calc_id, time_s, layer)
+        ''')
+
+    def _has_cascade(self, name):
+        return any(row[2] == 'calculations' and row[6] == 'CASCADE'
+                   for row in self._connection().execute(f'PRAGMA foreign_key_list({name})'))
+
+    def tables_without_cascade(self):
+        """Таблицы результатов без ON DELETE CASCADE (базы прежних версий)"""
+        return [name for name in RESULT_TABLES if not self._has_cascade(name)]
+
+    def migrate_foreign_keys(self, progress=None, cancel=None):
+        """
+        Перестройка таблиц результатов прежних версий с внешним ключом
+        ON DELETE CASCADE
+
+        Каждая таблица переносится в отдельной транзакции порциями по
+        MIGRATE_CHUNK_ROWS строк (по rowid); строки расчётов, которых нет
+        в calculations, не переносятся. progress(done, total) - ход по rowid;
+        при отмене (cancel) переносимая таблица остаётся прежней.
+        Возвращает список перестроенных таблиц
+        """
+        names = self.tables_without_cascade()
+        conn = self._connection()
+        spans = {}
+        for name in names:
+            first, last = conn.execute(f'SELECT MIN(rowid), MAX(rowid) FROM {name}').fetchone()
+            spans[name] = (first or 0, last or -1)
+        total = sum(last - first + 1 for first, last in spans.values())
+        done = 0
+        migrated = []
+
+        for name in names:
+            first, last = spans[name]
+            with self._write_lock:
+                # Внешние ключи отключаются вне транзакции
+                conn.execute('PRAGMA foreign_keys = OFF')
+                try:
+                    with conn:
+                        conn.execute('BEGIN IMMEDIATE')
+                        columns = ', '.join(row[1] for row in conn.execute(f'PRAGMA table_info({name})'))
+                        conn.execute(f'DROP TABLE IF EXISTS {name}_new')
+                        conn.execute(RESULT_TABLES[name].format(name=f'{name}_new'))
+
+                        for lo in range(first, last + 1, MIGRATE_CHUNK_ROWS):
+                            if cancel is not None and cancel.is_set():
+                                raise _Cancelled
+                            hi = min(lo + MIGRATE_CHUNK_ROWS, last + 1)
+                            conn.execute(f'''
+                                INSERT INTO {name}_new ({columns})
+                                SELECT {columns} FROM {name}
+                                WHERE rowid >= ? AND rowid < ?
+                                  AND calc_id IN (SELECT id FROM calculations)
+                            ''', (lo, hi))
+                            done += hi - lo
+                            if progress is not None:
+                                progress(done, total)
+
+                        conn.execute(f'DROP TABLE {name}')
+                        conn.execute(f'ALTER TABLE {name}_new RENAME TO {name}')
+                        self._create_indexes(conn.cursor())
+                except _Cancelled:
+                    break
+                finally:
+                    conn.execute('PRAGMA foreign_keys = ON')
+            migrated.append(name)
+
+        return migrated
 
     def save_stationary_calculation(self, pipeline):
         if not pipeline.stationary_calculated:
             raise ValueError("Нет данных стационарного расчёта для сохранения")
 
-        with sqlite3.connect(self.db_name) as conn:
+        start = time.perf_counter()
+        with self._write() as conn:
             cursor = conn.cursor()
 
             timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -67,22 +354,24 @@ class DatabaseManager:
 
             calc_id = cursor.lastrowid
 
-            for i in range(len(pipeline.x_km)):
-                cursor.execute('''
-                    INSERT INTO stationary_results
-                    (calc_id, x_km, x_m, pressure_Pa, pressure_MPa, velocity_ms)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (calc_id, pipeline.x_km[i], pipeline.x_m[i], pipeline.P[i], pipeline.P[i]/1e6, pipeline.v_arr[i]))
-
-            conn.commit()
+            # Строки собираются из столбцов-массивов, одна транзакция на весь расчёт
+            rows = zip(repeat(calc_id), pipeline.x_km.tolist(), pipeline.x_m.tolist(),
+                       pipeline.P.tolist(), (pipeline.P / 1e6).tolist(), pipeline.v_arr.tolist())
+            cursor.executemany('''
+                INSERT INTO stationary_results
+                (calc_id, x_km, x_m, pressure_Pa, pressure_MPa, velocity_ms)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
 
+        self._save_stats(len(pipeline.x_km), start)
         return calc_id
 
     def save_unsteady_calculation(self, pipeline):
-        if not pipeline.p_history:
+        if len(pipeline.p_history) == 0:
             raise ValueError("Нет данных нестационарного расчёта для сохранения")
 
-        with sqlite3.connect(self.db_name) as conn:
+        start = time.perf_counter()
+        with self._write() as conn:
             cursor = conn.cursor()
 
             timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -93,128 +382,771 @@ class DatabaseManager:
 
             calc_id = cursor.lastrowid
 
-            for t_idx, t in enumerate(pipeline.t_history):
-                p_array = pipeline.p_history[t_idx]
-                v_array = pipeline.v_history[t_idx]
-                for i in range(len(pipeline.x_km)):
-                    cursor.execute('''
-                        INSERT INTO unsteady_results
-                        (calc_id, time_step, time_s, x_km, x_m, pressure_Pa,
-                        pressure_MPa, velocity_ms)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (calc_id, t_idx, t, pipeline.x_km[i], pipeline.x_m[i], p_array[i], p_array[i]/1e6, v_array[i]))
-
-            conn.commit()
+            self._write_unsteady_arrays(cursor, calc_id, pipeline.x_km, pipeline.x_m,
+                                        pipeline.t_history, pipeline.p_history,
+                                        pipeline.v_history, self.compression, self.dtype)
 
+        self._save_stats(len(pipeline.t_history) * len(pipeline.x_km), start)
         return calc_id
 
-    def get_all_calculations(self):
-        """Получение списка всех расчётов"""
-        with sqlite3.connect(self.db_name) as conn:
+    @staticmethod
+    def _write_unsteady_arrays(cursor, calc_id, x_km, x_m, t_history, p_history, v_history,
+                               compression=None, dtype='float64'):
+        """Запись сетки и слоёв расчёта calc_id в столбцовом формате"""
+        cursor.execute('''
+            INSERT INTO unsteady_grid (calc_id, num_nodes, num_layers, compression, dtype, x_km, x_m)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (calc_id, len(x_km), len(t_history), compression, dtype,
+              pack_array(x_km, compression), pack_array(x_m, compression)))
+
+        # Слои упаковываются по одному: история может находиться в файле
+        DatabaseManager._write_unsteady_layers(
+            cursor, calc_id, 0,
+            ((t, p_history[t_idx], v_history[t_idx])
+             for t_idx, t in enumerate(np.asarray(t_history).tolist())),
+            compression, dtype)
+
+    @staticmethod
+    def _write_unsteady_layers(cursor, calc_id, first_layer, layers, compression=None, dtype='float64'):
+        """Запись слоёв (t, p, v) с номерами first_layer, first_layer + 1, ..."""
+        rows = ((calc_id, first_layer + k, t, pack_array(p, compression, dtype),
+                 pack_array(v, compression, dtype))
+                for k, (t, p, v) in enumerate(layers))
+        cursor.executemany('''
+            INSERT INTO unsteady_layers (calc_id, layer, time_s, pressure, velocity)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+
+    # ============================================================
+    # Запись нестационарного расчёта по мере его выполнения
+    # ============================================================
+
+    def _begin_unsteady(self, x_km, x_m, params=None):
+        """Новый расчёт со статусом 'running' и пустой историей; calc_id"""
+        with self._write() as conn:
             cursor = conn.cursor()
 
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             cursor.execute('''
-                SELECT id, timestamp, calculation_type, num_points, description
-                FROM calculations
-                ORDER BY id DESC
-            ''')
+                INSERT INTO calculations (timestamp, calculation_type, num_points, description, status, params)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (timestamp, 'unsteady', len(x_km), 'Unsteady calculation (incomplete)', STATUS_RUNNING,
+                  json.dumps(params, default=float) if params is not None else None))
+
+            calc_id = cursor.lastrowid
+            self._write_unsteady_arrays(cursor, calc_id, x_km, x_m, [], [], [],
+                                        self.compression, self.dtype)
+        return calc_id
+
+    def _reopen_unsteady(self, calc_id):
+        """Продолжение записи расчёта: (число записанных слоёв, сжатие, тип хранения)"""
+        with self._write() as conn:
+            row = conn.execute('''
+                SELECT num_layers, compression, dtype
+                FROM unsteady_grid
+                WHERE calc_id = ?
+            ''', (calc_id,)).fetchone()
+            if row is None:
+                raise ValueError(f"Нестационарный расчёт {calc_id} не найден")
+            conn.execute('UPDATE calculations SET status = ? WHERE id = ?', (STATUS_RUNNING, calc_id))
+        return row
+
+    def _append_unsteady_layers(self, calc_id, first_layer, layers, compression, dtype):
+        """Пакет слоёв и новое число слоёв расчёта - одна транзакция"""
+        with self._write() as conn:
+            cursor = conn.cursor()
+            self._write_unsteady_layers(cursor, calc_id, first_layer, layers, compression, dtype)
+            cursor.execute('UPDATE unsteady_grid SET num_layers = ? WHERE calc_id = ?',
+                           (first_layer + len(layers), calc_id))
+
+    def _complete_unsteady(self, calc_id):
+        """Пометка расчёта как полностью записанного"""
+        with self._write() as conn:
+            num_layers = conn.execute('SELECT num_layers FROM unsteady_grid WHERE calc_id = ?',
+                                      (calc_id,)).fetchone()[0]
+            conn.execute('UPDATE calculations SET status = ?, description = ? WHERE id = ?',
+                         (STATUS_COMPLETE, f'Unsteady calculation, {num_layers} time steps', calc_id))
 
-            rows = cursor.fetchall()
+    def get_incomplete_calculations(self):
+        """Незавершённые расчёты (кроме записываемых сейчас в этом процессе)"""
+        cursor = self._connection().cursor()
 
-        return rows
+        cursor.execute('''
+            SELECT c.id, c.timestamp, c.calculation_type, c.num_points, g.num_layers
+            FROM calculations c
+            LEFT JOIN unsteady_grid g ON g.calc_id = c.id
+            WHERE c.status = ?
+            ORDER BY c.id DESC
+        ''', (STATUS_RUNNING,))
+
+        with _registry_lock:
+            return [row for row in cursor.fetchall() if (self._path, row[0]) not in _active_writers]
+
+    def get_calculation_params(self, calc_id):
+        """Параметры расчёта, записанные при его начале (словарь), или None"""
+        row = self._connection().execute('SELECT params FROM calculations WHERE id = ?',
+                                         (calc_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def discard_incomplete(self):
+        """Удаление незавершённых расчётов; число удалённых"""
+        calc_ids = [row[0] for row in self.get_incomplete_calculations()]
+        self.delete_calculations(calc_ids)
+        return len(calc_ids)
+
+    def get_all_calculations(self):
+        """Получение списка всех расчётов"""
+        cursor = self._connection().cursor()
+
+        cursor.execute('''
+            SELECT id, timestamp, calculation_type, num_points, description
+            FROM calculations
+            ORDER BY id DESC
+        ''')
+
+        return cursor.fetchall()
 
     def get_stationary_data(self, calc_id):
         """Получение данных стационарного расчёта"""
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
+        cursor = self._connection().cursor()
 
-            cursor.execute('''
-                SELECT x_km, x_m, pressure_Pa, velocity_ms
-                FROM stationary_results
-                WHERE calc_id = ?
-                ORDER BY x_km
-            ''', (calc_id,))
+        cursor.execute('''
+            SELECT x_km, x_m, pressure_Pa, velocity_ms
+            FROM stationary_results
+            WHERE calc_id = ?
+            ORDER BY x_km
+        ''', (calc_id,))
 
-            rows = cursor.fetchall()
+        return cursor.fetchall()
 
-        return rows
+    def get_unsteady_arrays(self, calc_id):
+        """
+        Нестационарный расчёт в виде массивов
 
-    def get_unsteady_data(self, calc_id):
-        """Получение данных нестационарного расчёта"""
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
+        Возвращает (x_km, x_m, t_history, p_history, v_history), где p_history,
+        v_history - массивы (слои × узлы); None - расчёт не найден
+        """
+        conn = self._connection()
+        grid = conn.execute('''
+            SELECT num_nodes, num_layers, compression, dtype, x_km, x_m
+            FROM unsteady_grid
+            WHERE calc_id = ?
+        ''', (calc_id,)).fetchone()
 
-            # Получаем все временные слои
-            cursor.execute('''
-                SELECT DISTINCT time_s
+        if grid is None:
+            return self._get_legacy_unsteady_arrays(conn, calc_id)
+
+        num_nodes, num_layers, compression, dtype, x_km, x_m = grid
+        t_history = np.empty(num_layers)
+        p_history = np.empty((num_layers, num_nodes))
+        v_history = np.empty((num_layers, num_nodes))
+
+        cursor = conn.execute('''
+            SELECT layer, time_s, pressure, velocity
+            FROM unsteady_layers
+            WHERE calc_id = ?
+            ORDER BY layer
+        ''', (calc_id,))
+
+        count = 0
+        for layer, t, pressure, velocity in cursor:
+            t_history[layer] = t
+            p_history[layer] = unpack_array(pressure, compression, dtype)
+            v_history[layer] = unpack_array(velocity, compression, dtype)
+            count += 1
+
+        return (unpack_array(x_km, compression).copy(), unpack_array(x_m, compression).copy(),
+                t_history[:count], p_history[:count], v_history[:count])
+
+    @staticmethod
+    def _get_legacy_unsteady_arrays(conn, calc_id):
+        """Массивы расчёта из таблицы прежнего формата unsteady_results"""
+        # Строки расчёта находятся по индексу (calc_id, time_step)
+        num_rows, num_layers = conn.execute('''
+            SELECT COUNT(*), MAX(time_step) - MIN(time_step) + 1
+            FROM unsteady_results
+            WHERE calc_id = ?
+        ''', (calc_id,)).fetchone()
+        if num_rows == 0:
+            return None
+
+        cursor = conn.execute('''
+            SELECT time_s, x_km, x_m, pressure_Pa, velocity_ms
+            FROM unsteady_results
+            WHERE calc_id = ?
+            ORDER BY time_step, x_km
+        ''', (calc_id,))
+        data = np.fromiter(chain.from_iterable(cursor), dtype=float, count=num_rows * 5)
+        data = data.reshape(num_layers, num_rows // num_layers, 5)
+
+        return (data[0, :, 1].copy(), data[0, :, 2].copy(), data[:, 0, 0].copy(),
+                data[:, :, 3].copy(), data[:, :, 4].copy())
+
+    # ============================================================
+    # Постраничное чтение нестационарных расчётов
+    # ============================================================
+
+    def _unsteady_layout(self, calc_id):
+        """
+        Описание хранения расчёта: словарь legacy, num_nodes, num_layers,
+        compression, dtype, x_km, x_m; None - расчёт не найден
+        """
+        conn = self._connection()
+        grid = conn.execute('''
+            SELECT num_nodes, num_layers, compression, dtype, x_km, x_m
+            FROM unsteady_grid
+            WHERE calc_id = ?
+        ''', (calc_id,)).fetchone()
+
+        if grid is not None:
+            num_nodes, num_layers, compression, dtype, x_km, x_m = grid
+            return {'legacy': False, 'num_nodes': num_nodes, 'num_layers': num_layers,
+                    'compression': compression, 'dtype': dtype,
+                    'x_km': unpack_array(x_km, compression), 'x_m': unpack_array(x_m, compression)}
+
+        first, last = conn.execute('''
+            SELECT MIN(time_step), MAX(time_step)
+            FROM unsteady_results
+            WHERE calc_id = ?
+        ''', (calc_id,)).fetchone()
+        if first is None:
+            return None
+
+        rows = conn.execute('''
+            SELECT x_km, x_m
+            FROM unsteady_results
+            WHERE calc_id = ? AND time_step = ?
+            ORDER BY x_km
+        ''', (calc_id, first)).fetchall()
+        x = np.array(rows, dtype=float).reshape(-1, 2)
+        return {'legacy': True, 'first_step': first, 'num_nodes': len(x), 'num_layers': last - first + 1,
+                'compression': None, 'dtype': 'float64', 'x_km': x[:, 0], 'x_m': x[:, 1]}
+
+    def _read_layers(self, calc_id, layout, start, stop, lo, hi):
+        """Слои [start, stop) в узлах [lo, hi): (t, p, v), p и v - (слои × узлы)"""
+        conn = self._connection()
+        start, stop = max(start, 0), min(stop, layout['num_layers'])
+        lo, hi = max(lo, 0), min(hi, layout['num_nodes'])
+        if stop <= start or hi <= lo:
+            return np.empty(0), np.empty((0, max(hi - lo, 0))), np.empty((0, max(hi - lo, 0)))
+
+        if layout['legacy']:
+            first = layout['first_step']
+            x_km = layout['x_km']
+            cursor = conn.execute('''
+                SELECT time_s, pressure_Pa, velocity_ms
                 FROM unsteady_results
-                WHERE calc_id = ?
-                ORDER BY time_s
-            ''', (calc_id,))
+                WHERE calc_id = ? AND time_step >= ? AND time_step < ? AND x_km >= ? AND x_km <= ?
+                ORDER BY time_step, x_km
+            ''', (calc_id, first + start, first + stop, x_km[lo], x_km[hi - 1]))
+            data = np.fromiter(chain.from_iterable(cursor), dtype=float)
+            data = data.reshape(-1, hi - lo, 3)
+            return data[:, 0, 0].copy(), data[:, :, 1].copy(), data[:, :, 2].copy()
+
+        compression, dtype = layout['compression'], layout['dtype']
+        if compression is None:
+            # Несжатый слой: из BLOB читается только нужный диапазон узлов
+            itemsize = np.dtype(LAYER_DTYPES[dtype]).itemsize
+            offset, length = lo * itemsize + 1, (hi - lo) * itemsize
+            rows = conn.execute('''
+                SELECT time_s, substr(pressure, ?, ?), substr(velocity, ?, ?)
+                FROM unsteady_layers
+                WHERE calc_id = ? AND layer >= ? AND layer < ?
+                ORDER BY layer
+            ''', (offset, length, offset, length, calc_id, start, stop)).fetchall()
+            lo, hi = 0, hi - lo
+        else:
+            rows = conn.execute('''
+                SELECT time_s, pressure, velocity
+                FROM unsteady_layers
+                WHERE calc_id = ? AND layer >= ? AND layer < ?
+                ORDER BY layer
+            ''', (calc_id, start, stop)).fetchall()
+
+        t = np.empty(len(rows))
+        p = np.empty((len(rows), hi - lo))
+        v = np.empty((len(rows), hi - lo))
+        for k, (time_s, pressure, velocity) in enumerate(rows):
+            t[k] = time_s
+            p[k] = unpack_array(pressure, compression, dtype)[lo:hi]
+            v[k] = unpack_array(velocity, compression, dtype)[lo:hi]
+        return t, p, v
+
+    def get_unsteady_layer_count(self, calc_id):
+        """Число записанных временных слоёв расчёта (0 - расчёт не найден)"""
+        layout = self._unsteady_layout(calc_id)
+        return 0 if layout is None else layout['num_layers']
+
+    def get_unsteady_grid(self, calc_id):
+        """Сетка расчёта (x_km, x_m) или None"""
+        layout = self._unsteady_layout(calc_id)
+        return None if layout is None else (layout['x_km'].copy(), layout['x_m'].copy())
+
+    def get_unsteady_layers(self, calc_id, start, stop):
+        """Слои с номерами [start, stop): (t, p, v), p и v - массивы (слои × узлы)"""
+        layout = self._unsteady_layout(calc_id)
+        if layout is None:
+            raise ValueError(f"Нестационарный расчёт {calc_id} не найден")
+        return self._read_layers(calc_id, layout, start, stop, 0, layout['num_nodes'])
+
+    def get_unsteady_layer(self, calc_id, index):
+        """Один слой (t, p, v); отрицательный index - с конца"""
+        layout = self._unsteady_layout(calc_id)
+        if layout is None:
+            raise ValueError(f"Нестационарный расчёт {calc_id} не найден")
+        if index < 0:
+            index += layout['num_layers']
+        if not 0 <= index < layout['num_layers']:
+            raise IndexError(f"Нет слоя {index} (слоёв: {layout['num_layers']})")
+
+        t, p, v = self._read_layers(calc_id, layout, index, index + 1, 0, layout['num_nodes'])
+        return t[0], p[0], v[0]
+
+    def get_node_series(self, calc_id, x_km):
+        """
+        Изменение во времени в ближайшем к x_km узле: (x_node, t, p, v)
+        """
+        layout = self._unsteady_layout(calc_id)
+        if layout is None:
+            raise ValueError(f"Нестационарный расчёт {calc_id} не найден")
+
+        node = int(np.argmin(np.abs(layout['x_km'] - x_km)))
+        t, p, v = self._read_layers(calc_id, layout, 0, layout['num_layers'], node, node + 1)
+        return float(layout['x_km'][node]), t, p[:, 0], v[:, 0]
+
+    def get_unsteady_window(self, calc_id, t_min, t_max, x_min, x_max):
+        """
+        Прямоугольная область t_min <= t <= t_max, x_min <= x <= x_max:
+        (x_km, t, p, v), p и v - массивы (слои × узлы)
+        """
+        layout = self._unsteady_layout(calc_id)
+        if layout is None:
+            raise ValueError(f"Нестационарный расчёт {calc_id} не найден")
 
-            times = [row[0] for row in cursor.fetchall()]
+        x_km = layout['x_km']
+        lo = int(np.searchsorted(x_km, x_min, side='left'))
+        hi = int(np.searchsorted(x_km, x_max, side='right'))
 
-            # Получаем данные для каждого временного слоя
-            data_by_time = []
-            for t in times:
-                cursor.execute('''
-                    SELECT x_km, x_m, pressure_Pa, velocity_ms
-                    FROM unsteady_results
-                    WHERE calc_id = ? AND time_s = ?
-                    ORDER BY x_km
-                ''', (calc_id, t))
+        # Диапазон слоёв по времени - по индексу (calc_id, time_s)
+        if layout['legacy']:
+            first, last = self._connection().execute('''
+                SELECT MIN(time_step), MAX(time_step)
+                FROM unsteady_results
+                WHERE calc_id = ? AND time_s >= ? AND time_s <= ?
+            ''', (calc_id, t_min, t_max)).fetchone()
+            if first is not None:
+                first -= layout['first_step']
+                last -= layout['first_step']
+        else:
+            first, last = self._connection().execute('''
+                SELECT MIN(layer), MAX(layer)
+                FROM unsteady_layers
+                WHERE calc_id = ? AND time_s >= ? AND time_s <= ?
+            ''', (calc_id, t_min, t_max)).fetchone()
+
+        if first is None:
+            first, last = 0, -1
+        t, p, v = self._read_layers(calc_id, layout, first, last + 1, lo, hi)
+        return x_km[lo:hi].copy(), t, p, v
+
+    def get_unsteady_data(self, calc_id):
+        """Получение данных нестационарного расчёта"""
+        arrays = self.get_unsteady_arrays(calc_id)
+        if arrays is None:
+            return [], []
+
+        x_km, x_m, t_history, p_history, v_history = arrays
+        x_km, x_m = x_km.tolist(), x_m.tolist()
+        times = t_history.tolist()
 
-                rows = cursor.fetchall()
-                data_by_time.append((t, rows))
+        # Строки (x_km, x_m, pressure_Pa, velocity_ms) каждого временного слоя
+        data_by_time = [(t, list(zip(x_km, x_m, p.tolist(), v.tolist())))
+                        for t, p, v in zip(times, p_history, v_history)]
 
         return times, data_by_time
 
-    def delete_calculation(self, calc_id):
-        """Удаление расчёта по ID"""
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
+    def migrate_unsteady_storage(self, compression=None, dtype='float64', vacuum=True):
+        """
+        Перевод расчётов из unsteady_results в столбцовый формат
 
-            cursor.execute('DELETE FROM stationary_results WHERE calc_id = ?', (calc_id,))
-            cursor.execute('DELETE FROM unsteady_results WHERE calc_id = ?', (calc_id,))
-            cursor.execute('DELETE FROM calculations WHERE id = ?', (calc_id,))
+        Каждый расчёт переносится в отдельной транзакции, после переноса
+        файл базы сжимается (VACUUM). Возвращает число перенесённых расчётов
+        """
+        _check_storage(compression, dtype)
 
-            conn.commit()
+        calc_ids = [row[0] for row in self._connection().execute(
+            'SELECT DISTINCT calc_id FROM unsteady_results').fetchall()]
+
+        for calc_id in calc_ids:
+            with self._write() as conn:
+                arrays = self._get_legacy_unsteady_arrays(conn, calc_id)
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM unsteady_layers WHERE calc_id = ?', (calc_id,))
+                cursor.execute('DELETE FROM unsteady_grid WHERE calc_id = ?', (calc_id,))
+                self._write_unsteady_arrays(cursor, calc_id, *arrays, compression, dtype)
+                cursor.execute('DELETE FROM unsteady_results WHERE calc_id = ?', (calc_id,))
+
+        if vacuum and calc_ids:
+            # VACUUM выполняется вне транзакции
+            with self._write_lock:
+                self._connection().execute('VACUUM')
+
+        return len(calc_ids)
+
+    def delete_calculation(self, calc_id):
+        """Удаление расчёта по ID (результаты удаляются каскадно)"""
+        self.delete_calculations([calc_id])
+
+    def delete_calculations(self, calc_ids):
+        """Удаление нескольких расчётов одной транзакцией; число удалённых"""
+        params = [(calc_id,) for calc_id in calc_ids]
+        stale = self.tables_without_cascade()
+        with self._write() as conn:
+            # Таблицы, ещё не перестроенные migrate_foreign_keys, очищаются явно
+            for name in stale:
+                conn.executemany(f'DELETE FROM {name} WHERE calc_id = ?', params)
+            cursor = conn.executemany('DELETE FROM calculations WHERE id = ?', params)
+            return cursor.rowcount
 
     def clear_database(self):
         """Полная очистка базы данных"""
-        with sqlite3.connect(self.db_name) as conn:
+        with self._write() as conn:
             cursor = conn.cursor()
 
             cursor.execute('DELETE FROM stationary_results')
             cursor.execute('DELETE FROM unsteady_results')
+            cursor.execute('DELETE FROM unsteady_layers')
+            cursor.execute('DELETE FROM unsteady_grid')
             cursor.execute('DELETE FROM calculations')
 
+    # ============================================================
+    # Обслуживание базы данных
+    # ============================================================
+
+    def get_database_stats(self):
+        """
+        Размер и фрагментация базы: file_size, wal_size (байты), page_size,
+        page_count, freelist_count, free_bytes, fragmentation (доля свободных
+        страниц), auto_vacuum, calculations
+        """
+        conn = self._connection()
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        wal = self._path + '-wal'
+        return {
+            'file_size': os.path.getsize(self._path),
+            'wal_size': os.path.getsize(wal) if os.path.exists(wal) else 0,
+            'page_size': page_size,
+            'page_count': page_count,
+            'freelist_count': freelist,
+            'free_bytes': freelist * page_size,
+            'fragmentation': freelist / page_count if page_count else 0.0,
+            'auto_vacuum': AUTO_VACUUM_MODES.get(auto_vacuum, str(auto_vacuum)),
+            'calculations': conn.execute('SELECT COUNT(*) FROM calculations').fetchone()[0],
+        }
+
+    def supports_incremental_vacuum(self):
+        """
+        True - база в режиме auto_vacuum = INCREMENTAL; иначе освободить
+        место можно только полной перестройкой (vacuum())
+        """
+        return self._connection().execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+
+    def incremental_vacuum(self, progress=None, cancel=None):
+        """
+        Возврат свободных страниц файловой системе шагами по VACUUM_STEP_PAGES
+        (между шагами база доступна для записи); число освобождённых страниц.
+        Для баз без auto_vacuum = INCREMENTAL ничего не делает - см. vacuum()
+        """
+        if not self.supports_incremental_vacuum():
+            return 0
+        conn = self._connection()
+
+        total = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        freed = 0
+        while freed < total:
+            if cancel is not None and cancel.is_set():
+                break
+            with self._write_lock:
+                conn.execute(f'PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})').fetchall()
+            left = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if total - left <= freed:
+                break
+            freed = total - left
+            if progress is not None:
+                progress(freed, total)
+
+        self.checkpoint()
+        return freed
+
+    def vacuum(self):
+        """
+        Полная перестройка файла (VACUUM) с переводом в режим
+        auto_vacuum = INCREMENTAL; база на это время заблокирована
+        """
+        with self._write_lock:
+            conn = self._connection()
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+        self.checkpoint()
+
+    def checkpoint(self):
+        """Перенос журнала WAL в основной файл и усечение журнала"""
+        with self._write_lock:
+            self._connection().execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+
+    def analyze(self):
+        """Обновление статистики индексов для планировщика запросов"""
+        with self._write_lock:
+            conn = self._connection()
+            conn.execute('ANALYZE')
             conn.commit()
 
-    def export_to_csv(self, calc_id, calc_type, filename):
-        """Экспорт данных в CSV"""
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
+    def check_integrity(self, full=False):
+        """
+        Проверка целостности (quick_check или integrity_check при full)
+        и внешних ключей; список найденных ошибок (пустой - ошибок нет)
+        """
+        conn = self._connection()
+        pragma = 'integrity_check' if full else 'quick_check'
+        problems = [row[0] for row in conn.execute(f'PRAGMA {pragma}') if row[0] != 'ok']
+        problems += [f"{table}: строка {rowid} ссылается на отсутствующий расчёт"
+                     for table, rowid, _, _ in conn.execute('PRAGMA foreign_key_check')]
+        return problems
+
+    def run_maintenance(self, progress=None, cancel=None, full_vacuum=False, full_check=False):
+        """
+        Обслуживание: освобождение страниц (incremental_vacuum или VACUUM
+        при full_vacuum), ANALYZE, проверка целостности.
+        Возвращает отчёт: before, after (get_database_stats), freed_bytes,
+        problems, cancelled
+        """
+        before = self.get_database_stats()
+        report = {'before': before, 'problems': [], 'cancelled': False}
+
+        if full_vacuum:
+            self.vacuum()
+        else:
+            self.incremental_vacuum(progress, cancel)
+
+        report['cancelled'] = cancel is not None and cancel.is_set()
+        if not report['cancelled']:
+            self.analyze()
+            report['problems'] = self.check_integrity(full_check)
+
+        report['after'] = after = self.get_database_stats()
+        report['freed_bytes'] = (before['file_size'] + before['wal_size']
+                                 - after['file_size'] - after['wal_size'])
+        return report
+
+    def iter_unsteady_pages(self, calc_id, chunk_layers=export.CHUNK_LAYERS):
+        """Слои расчёта страницами по chunk_layers: (t, p, v)"""
+        layout = self._unsteady_layout(calc_id)
+        if layout is None:
+            raise ValueError(f"Нестационарный расчёт {calc_id} не найден")
+        return self._iter_pages(calc_id, layout, chunk_layers)
+
+    def _iter_pages(self, calc_id, layout, chunk_layers):
+        for start in range(0, layout['num_layers'], chunk_layers):
+            yield self._read_layers(calc_id, layout, start, start + chunk_layers,
+                                    0, layout['num_nodes'])
+
+    def export_unsteady(self, calc_id, filename, progress=None, cancel=None,
+                        chunk_layers=export.CHUNK_LAYERS, fmt=None):
+        """
+        Потоковый экспорт нестационарного расчёта (.csv, .npz или .json + .npy)
+
+        Возвращает True, если экспорт завершён, False - если отменён (cancel)
+        """
+        layout = self._unsteady_layout(calc_id)
+        if layout is None:
+            raise ValueError(f"Нестационарный расчёт {calc_id} не найден")
+
+        meta = {'calc_id': calc_id, 'params': self.get_calculation_params(calc_id)}
+        return export.export_unsteady(filename, layout['x_km'], layout['x_m'], layout['num_layers'],
+                                      self._iter_pages(calc_id, layout, chunk_layers),
+                                      progress, cancel, meta, fmt)
 
-            with open(filename, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-
-                if calc_type == "Стационарный":
-                    writer.writerow(['x_km', 'P_MPa', 'v_ms'])
-                    cursor.execute('''
-                        SELECT x_km, pressure_MPa, velocity_ms
-                        FROM stationary_results
-                        WHERE calc_id = ?
-                        ORDER BY x_km
-                    ''', (calc_id,))
-                else:
-                    writer.writerow(['time_s', 'x_km', 'P_MPa', 'v_ms'])
-                    cursor.execute('''
-                        SELECT time_s, x_km, pressure_MPa, velocity_ms
-                        FROM unsteady_results
-                        WHERE calc_id = ?
-                        ORDER BY time_s, x_km
-                    ''', (calc_id,))
-
-                rows = cursor.fetchall()
+    def export_to_csv(self, calc_id, calc_type, filename, progress=None, cancel=None):
+        """
+        Экспорт данных в CSV порциями; progress(done, total), cancel - threading.Event
+
+        Возвращает True, если экспорт завершён, False - если отменён
+        """
+        if calc_type != "Стационарный":
+            return self.export_unsteady(calc_id, filename, progress, cancel, fmt='.csv')
+
+        conn = self._connection()
+        total = conn.execute('SELECT COUNT(*) FROM stationary_results WHERE calc_id = ?',
+                             (calc_id,)).fetchone()[0]
+        done = 0
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['x_km', 'P_MPa', 'v_ms'])
+            cursor = conn.execute('''
+                SELECT x_km, pressure_MPa, velocity_ms
+                FROM stationary_results
+                WHERE calc_id = ?
+                ORDER BY x_km
+            ''', (calc_id,))
+
+            while True:
+                if cancel is not None and cancel.is_set():
+                    break
+                rows = cursor.fetchmany(export.CHUNK_ROWS)
+                if not rows:
+                    break
                 writer.writerows(rows)
+                done += len(rows)
+                if progress is not None:
+                    progress(done, total)
+
+        if cancel is not None and cancel.is_set():
+            os.remove(filename)
+            return False
+        return True
+
+
+_STOP = object()
+
+
+class UnsteadyWriter:
+    """
+    Фоновая запись слоёв нестационарного расчёта в базу данных
+
+    Слои передаются через ограниченную очередь (append ждёт, пока в ней
+    есть место) и записываются отдельным потоком пакетами по batch_layers
+    слоёв, но не реже раза в flush_interval секунд; каждый пакет - одна
+    транзакция, поэтому при аварийном завершении теряется не больше пакета.
+    Расчёт имеет статус 'running' до close(complete=True); незавершённый
+    расчёт можно продолжить (PipelineFlow.resume_unsteady) или удалить
+    (DatabaseManager.discard_incomplete)
+
+    params : dict
+        Параметры расчёта для продолжения (сохраняются в calculations.params)
+    calc_id : int
+        Продолжить запись существующего расчёта; x_km, x_m и params не нужны
+    """
+
+    def __init__(self, db_manager, x_km=None, x_m=None, params=None, calc_id=None,
+                 batch_layers=64, maxsize=256, flush_interval=1.0):
+        self.db_manager = db_manager
+        self.batch_layers = batch_layers
+        self.flush_interval = flush_interval
+
+        if calc_id is None:
+            calc_id = db_manager._begin_unsteady(x_km, x_m, params)
+            self.first_layer, self.compression, self.dtype = 0, db_manager.compression, db_manager.dtype
+        else:
+            self.first_layer, self.compression, self.dtype = db_manager._reopen_unsteady(calc_id)
+
+        self.calc_id = calc_id
+        self.layers_written = 0
+        self._next_layer = self.first_layer
+        self._error = None
+        self._queue = queue.Queue(maxsize)
+
+        self._key = (db_manager._path, calc_id)
+        with _registry_lock:
+            _active_writers.add(self._key)
+
+        self._thread = threading.Thread(target=self._run, name=f'UnsteadyWriter-{calc_id}', daemon=True)
+        self._thread.start()
+
+    def append(self, t, p, v):
+        """Слой в очередь записи (копия массивов)"""
+        if self._error is not None:
+            raise self._error
+        self._queue.put((float(t), np.array(p, dtype=float), np.array(v, dtype=float)))
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(batch)
+                self.db_manager.close()
+                return
+
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (len(batch) >= self.batch_layers or item is None):
+                self._flush(batch)
+                batch = []
+                deadline = None
+
+    def _flush(self, batch):
+        # После ошибки слои только извлекаются из очереди, чтобы расчёт не ждал
+        if not batch or self._error is not None:
+            return
+        try:
+            self.db_manager._append_unsteady_layers(self.calc_id, self._next_layer, batch,
+                                                    self.compression, self.dtype)
+            self._next_layer += len(batch)
+            self.layers_written += len(batch)
+        except Exception as e:
+            self._error = e
+
+    def close(self, complete=True):
+        """
+        Запись оставшихся слоёв и остановка потока; calc_id
+
+        complete=False - расчёт остаётся незавершённым (например, остановлен)
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+        with _registry_lock:
+            _active_writers.discard(self._key)
+
+        if self._error is not None:
+            raise self._error
+        if complete:
+            self.db_manager._complete_unsteady(self.calc_id)
+        return self.calc_id
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Перевод базы результатов прежних версий "
+                                                 "(каскадное удаление, столбцовый формат) "
+                                                 "и обслуживание базы")
+    parser.add_argument('db', nargs='?', default='pipeline_results.db')
+    parser.add_argument('--compression', choices=['zlib', 'lzma'], default=None)
+    parser.add_argument('--dtype', choices=list(LAYER_DTYPES), default='float64')
+    parser.add_argument('--maintenance', action='store_true',
+                        help="только обслуживание: освобождение места, ANALYZE, проверка")
+    parser.add_argument('--full-vacuum', action='store_true',
+                        help="полная перестройка файла (VACUUM) при обслуживании")
+    args = parser.parse_args()
+
+    manager = DatabaseManager(args.db)
+    if args.maintenance:
+        report = manager.run_maintenance(full_vacuum=args.full_vacuum, full_check=True)
+        before, after = report['before'], report['after']
+        print(f"Размер: {before['file_size'] / 2**20:.1f} -> {after['file_size'] / 2**20:.1f} МБ, "
+              f"фрагментация: {before['fragmentation']:.1%} -> {after['fragmentation']:.1%}")
+        print("Ошибок не найдено" if not report['problems'] else '\n'.join(report['problems']))
+    else:
+        if manager.tables_without_cascade():
+            rebuilt = manager.migrate_foreign_keys(
+                progress=lambda done, total: print(f"\rПерестройка таблиц: {done / total:.0%}",
+                                                   end='', flush=True))
+            print(f"\nПерестроены таблицы: {', '.join(rebuilt)}")
+        migrated = manager.migrate_unsteady_storage(args.compression, args.dtype)
+        print(f"Перенесено расчётов: {migrated}")
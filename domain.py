@@ -0,0 +1,245 @@
+"""
+Многопроцессный нестационарный расчёт с декомпозицией сетки
+
+Сетка x_m делится на непрерывные подобласти, каждую ведёт свой процесс.
+Массивы p и v (два буфера - текущий и следующий слой) и история лежат
+в multiprocessing.shared_memory. Шаблон метода характеристик использует
+только узлы i±1, поэтому процесс читает у соседей лишь по одному узлу
+на каждом краю своей подобласти; слои разделяются барьером.
+"""
+
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import time
+
+import numpy as np
+
+import moc
+from history import num_history_layers
+
+# Ячейки управляющего массива
+CTRL_STEP = 0        # последний завершённый всеми процессами шаг
+CTRL_LAYERS = 1      # число записанных слоёв истории
+CTRL_STOP = 2        # запрос остановки от родительского процесса
+CTRL_ERROR = 3       # ошибка в одном из процессов
+CTRL_SNAPSHOT = 4    # две ячейки: согласованный флаг остановки по чётности шага
+CTRL_SIZE = 6
+
+
+def split_domain(n_nodes, num_processes):
+    """Границы подобластей [lo, hi); каждая не короче двух узлов"""
+    num_processes = max(1, min(num_processes, n_nodes // 2))
+    bounds = np.linspace(0, n_nodes, num_processes + 1).astype(int)
+    return [(int(bounds[k]), int(bounds[k + 1])) for k in range(num_processes)]
+
+
+def _attach(name, shape, dtype=np.float64):
+    """Подключение к сегменту разделяемой памяти родительского процесса"""
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _worker(rank, lo, hi, n_nodes, num_layers, names, params, barrier):
+    """Расчёт подобласти [lo, hi) на всех шагах по времени"""
+    shm_state, state = _attach(names['state'], (2, 2, n_nodes))
+    shm_hist, history = _attach(names['history'], (num_layers, 2, n_nodes))
+    shm_ctrl, ctrl = _attach(names['ctrl'], (CTRL_SIZE,), dtype=np.int64)
+
+    try:
+        from calc import PipelineFlow
+        flow = PipelineFlow(params['config'])
+        config = flow.config
+        flow.rho = params['rho']
+        flow.nu = params['nu']
+        flow.epsilon = params['epsilon']
+        flow.lambda_ = params['lambda_']
+
+        B = params['B']
+        dt = params['dt']
+        dx_m = params['dx_m']
+        boundary_condition = params['boundary_condition']
+        bc_change_time = params['bc_change_time']
+        bc_change_value = params['bc_change_value']
+        store_every = params['store_every']
+        num_steps = params['num_steps']
+        p_inlet = config.p_initial
+        p_outlet = config.p_end
+
+        # Подобласть вместе с граничными узлами соседей
+        g_lo = max(lo - 1, 0)
+        g_hi = min(hi + 1, n_nodes)
+        local_lo = lo - g_lo
+        local_hi = hi - g_lo
+        n_local = g_hi - g_lo
+
+        R = np.zeros(n_local)
+        I_a = np.zeros(n_local)
+        I_b = np.zeros(n_local)
+        is_first = lo == 0
+        is_last = hi == n_nodes
+
+        layer = 1
+        for step in range(1, num_steps + 1):
+            current_t = step * dt
+            if bc_change_time is not None and current_t >= bc_change_time:
+                if boundary_condition == 'pressure_inlet':
+                    p_inlet = bc_change_value
+                elif boundary_condition == 'pressure_outlet':
+                    p_outlet = bc_change_value
+
+            cur = (step - 1) % 2
+            nxt = step % 2
+            p = state[cur, 0, g_lo:g_hi]
+            v = state[cur, 1, g_lo:g_hi]
+            p_new = state[nxt, 0, g_lo:g_hi]
+            v_new = state[nxt, 1, g_lo:g_hi]
+
+            lambda_arr = flow.friction_factor_array(v, params['lambda_method'],
+                                                    params['lambda_table_tol'])
+            moc.friction_loss(v, lambda_arr, flow.rho, dx_m, config.internal_diameter, out=R)
+            moc.characteristic_invariants(p, v, R, B, I_a, I_b, local_lo, local_hi)
+            moc.interior_update(I_a, I_b, B, p_new, v_new, local_lo, local_hi)
+
+            if is_first:
+                moc.inlet_boundary(p_new, v_new, I_b, B, p_inlet)
+            if is_last:
+                moc.outlet_boundary(p_new, v_new, I_a, B, boundary_condition,
+                                    p_outlet, config.p_end)
+
+            stored = step % store_every == 0 or step == num_steps
+            if stored:
+                history[layer, 0, lo:hi] = state[nxt, 0, lo:hi]
+                history[layer, 1, lo:hi] = state[nxt, 1, lo:hi]
+                layer += 1
+
+            # Флаг остановки фиксируется до барьера, читается всеми после него
+            if rank == 0:
+                ctrl[CTRL_SNAPSHOT + step % 2] = ctrl[CTRL_STOP]
+
+            barrier.wait()
+
+            if rank == 0:
+                ctrl[CTRL_LAYERS] = layer
+                ctrl[CTRL_STEP] = step
+
+            if ctrl[CTRL_SNAPSHOT + step % 2]:
+                break
+
+    except Exception:
+        ctrl[CTRL_ERROR] = 1
+        barrier.abort()
+        raise
+
+    finally:
+        del state, history, ctrl
+        shm_state.close()
+        shm_hist.close()
+        shm_ctrl.close()
+
+
+def run_domain_decomposed(flow, num_steps, store_every, boundary_condition,
+                          bc_change_time, bc_change_value, lambda_method,
+                          lambda_table_tol, num_processes,
+                          progress_callback=None, poll_interval=0.05):
+    """
+    Нестационарный расчёт в num_processes процессах
+
+    flow : PipelineFlow
+        Объект после стационарного расчёта с заданными dt и B
+    progress_callback :
+        callback(step, total_steps, time, p_array, v_array) -> bool,
+        вызывается родительским процессом по последнему записанному слою.
+        Возврат False останавливает все процессы на одном и том же шаге
+
+    Возвращает (t_history, p_history, v_history, p_final, v_final, last_step)
+    """
+    n_nodes = len(flow.x_m)
+    domains = split_domain(n_nodes, num_processes)
+    num_layers = num_history_layers(num_steps, store_every)
+
+    shm_state = shared_memory.SharedMemory(create=True, size=2 * 2 * n_nodes * 8)
+    shm_hist = shared_memory.SharedMemory(create=True, size=num_layers * 2 * n_nodes * 8)
+    shm_ctrl = shared_memory.SharedMemory(create=True, size=CTRL_SIZE * 8)
+    names = {'state': shm_state.name, 'history': shm_hist.name, 'ctrl': shm_ctrl.name}
+
+    state = np.ndarray((2, 2, n_nodes), dtype=np.float64, buffer=shm_state.buf)
+    history = np.ndarray((num_layers, 2, n_nodes), dtype=np.float64, buffer=shm_hist.buf)
+    ctrl = np.ndarray((CTRL_SIZE,), dtype=np.int64, buffer=shm_ctrl.buf)
+
+    try:
+        state[0, 0] = flow.P
+        state[0, 1] = flow.v_arr
+        history[0, 0] = flow.P
+        history[0, 1] = flow.v_arr
+        ctrl[:] = 0
+        ctrl[CTRL_LAYERS] = 1
+
+        params = {
+            'config': flow.config,
+            'rho': flow.rho,
+            'nu': flow.nu,
+            'epsilon': flow.epsilon,
+            'lambda_': flow.lambda_,
+            'B': flow.B,
+            'dt': flow.dt,
+            'dx_m': flow.x_m[1] - flow.x_m[0],
+            'boundary_condition': boundary_condition,
+            'bc_change_time': bc_change_time,
+            'bc_change_value': bc_change_value,
+            'lambda_method': lambda_method,
+            'lambda_table_tol': lambda_table_tol,
+            'store_every': store_every,
+            'num_steps': num_steps,
+        }
+
+        ctx = mp.get_context('spawn')
+        barrier = ctx.Barrier(len(domains))
+        workers = [
+            ctx.Process(target=_worker,
+                        args=(rank, lo, hi, n_nodes, num_layers, names, params, barrier),
+                        daemon=True)
+            for rank, (lo, hi) in enumerate(domains)
+        ]
+        for worker in workers:
+            worker.start()
+
+        last_reported = 0
+        while any(worker.is_alive() for worker in workers):
+            time.sleep(poll_interval)
+            if ctrl[CTRL_ERROR]:
+                break
+
+            layers = int(ctrl[CTRL_LAYERS])
+            step = int(ctrl[CTRL_STEP])
+            if progress_callback and step > last_reported and layers > 1:
+                last_reported = step
+                should_continue = progress_callback(step, num_steps, step * flow.dt,
+                                                    history[layers - 1, 0].copy(),
+                                                    history[layers - 1, 1].copy())
+                if should_continue is False:
+                    ctrl[CTRL_STOP] = 1
+
+        for worker in workers:
+            worker.join()
+
+        if ctrl[CTRL_ERROR] or any(worker.exitcode != 0 for worker in workers):
+            raise RuntimeError("Ошибка в процессе расчёта подобласти")
+
+        last_step = int(ctrl[CTRL_STEP])
+        layers = int(ctrl[CTRL_LAYERS])
+        stored_steps = [k for k in range(1, last_step + 1)
+                        if k % store_every == 0 or k == num_steps]
+        t_history = np.array([0.0] + [k * flow.dt for k in stored_steps])
+        p_history = history[:layers, 0].copy()
+        v_history = history[:layers, 1].copy()
+
+        p_final = state[last_step % 2, 0].copy()
+        v_final = state[last_step % 2, 1].copy()
+
+        return t_history, p_history, v_history, p_final, v_final, last_step
+
+    finally:
+        del state, history, ctrl
+        for shm in (shm_state, shm_hist, shm_ctrl):
+            shm.close()
+            shm.unlink()
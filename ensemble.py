@@ -0,0 +1,144 @@
+"""
+Ансамблевый нестационарный расчёт
+
+Несколько сценариев граничных условий для одного трубопровода считаются
+одновременно: состояние хранится массивами (сценарии × узлы), и каждый
+шаг метода характеристик выполняется сразу для всех сценариев.
+"""
+
+import numpy as np
+
+import moc
+from history import num_history_layers
+
+SCENARIO_KEYS = ('boundary_condition', 'bc_change_time', 'bc_change_value')
+
+
+class EnsembleResult:
+    """
+    Истории всех сценариев ансамбля
+
+    t_history : (слои,)
+    p_history, v_history : (сценарии, слои, узлы)
+    """
+
+    def __init__(self, scenarios, x_km, t_history, p_history, v_history):
+        self.scenarios = scenarios
+        self.x_km = x_km
+        self.t_history = t_history
+        self.p_history = p_history
+        self.v_history = v_history
+
+    def __len__(self):
+        return len(self.scenarios)
+
+    def max_pressure(self):
+        """Максимальное давление по времени и длине для каждого сценария, Па"""
+        return self.p_history.max(axis=(1, 2))
+
+    def min_pressure(self):
+        """Минимальное давление по времени и длине для каждого сценария, Па"""
+        return self.p_history.min(axis=(1, 2))
+
+
+def _scenario_arrays(scenarios):
+    """Параметры сценариев в виде массивов по оси сценариев"""
+    for scenario in scenarios:
+        unknown = set(scenario) - set(SCENARIO_KEYS)
+        if unknown:
+            raise ValueError(f"Неизвестные параметры сценария: {', '.join(sorted(unknown))}")
+
+    bc_types = [s.get('boundary_condition', 'valve_closure') for s in scenarios]
+    bc_time = np.array([np.inf if s.get('bc_change_time') is None else s['bc_change_time']
+                        for s in scenarios], dtype=float)
+    bc_value = np.array([np.nan if s.get('bc_change_value') is None else s['bc_change_value']
+                         for s in scenarios], dtype=float)
+
+    is_valve = np.array([bc == 'valve_closure' for bc in bc_types])
+    is_inlet = np.array([bc == 'pressure_inlet' for bc in bc_types])
+    is_outlet = np.array([bc == 'pressure_outlet' for bc in bc_types])
+    return bc_time, bc_value, is_valve, is_inlet, is_outlet
+
+
+def run_ensemble(flow, scenarios, num_steps=2000, store_every=10, lambda_method='auto',
+                 lambda_table_tol=None, progress_callback=None):
+    """
+    Расчёт ансамбля сценариев
+
+    flow : PipelineFlow
+        Объект после стационарного расчёта
+    scenarios : list of dict
+        Ключи: 'boundary_condition', 'bc_change_time', 'bc_change_value' -
+        как одноимённые параметры calculate_unsteady_with_callback
+    progress_callback :
+        Функция callback(step, total_steps, time) -> bool,
+        возврат False останавливает расчёт
+    """
+    if not flow.stationary_calculated:
+        raise ValueError("Сначала выполните calculate_stationary()")
+    if not scenarios:
+        raise ValueError("Не задано ни одного сценария")
+
+    bc_time, bc_value, is_valve, is_inlet, is_outlet = _scenario_arrays(scenarios)
+
+    num_scenarios = len(scenarios)
+    N = len(flow.x_m)
+    dx_m = flow.x_m[1] - flow.x_m[0]
+    dt = dx_m / flow.C
+    B = flow.rho * flow.C
+
+    # Начальные условия (из стационарного расчёта) одинаковы для всех сценариев
+    p = np.tile(flow.P, (num_scenarios, 1))
+    v = np.tile(flow.v_arr, (num_scenarios, 1))
+    p_new = np.zeros_like(p)
+    v_new = np.zeros_like(v)
+    R = np.zeros_like(p)
+    I_a = np.zeros_like(p)
+    I_b = np.zeros_like(p)
+
+    num_layers = num_history_layers(num_steps, store_every)
+    t_history = np.zeros(num_layers)
+    p_history = np.empty((num_scenarios, num_layers, N))
+    v_history = np.empty((num_scenarios, num_layers, N))
+    p_history[:, 0] = p
+    v_history[:, 0] = v
+    layer = 1
+
+    config = flow.config
+    p_inlet = np.full(num_scenarios, config.p_initial)
+    p_outlet = np.full(num_scenarios, config.p_end)
+
+    for step in range(1, num_steps + 1):
+        current_t = step * dt
+
+        # Изменение граничных условий по расписанию каждого сценария
+        changed = current_t >= bc_time
+        p_inlet = np.where(changed & is_inlet, bc_value, p_inlet)
+        p_outlet = np.where(changed & is_outlet, bc_value, p_outlet)
+
+        lambda_arr = flow.friction_factor_array(v, lambda_method, lambda_table_tol)
+        moc.friction_loss(v, lambda_arr, flow.rho, dx_m, config.internal_diameter, out=R)
+        moc.characteristic_invariants(p, v, R, B, I_a, I_b)
+        moc.interior_update(I_a, I_b, B, p_new, v_new)
+
+        moc.inlet_boundary(p_new, v_new, I_b, B, p_inlet)
+
+        # Правая граница: клапан (v = 0) или заданное давление
+        p_end = np.where(is_outlet, p_outlet, config.p_end)
+        p_new[:, -1] = np.where(is_valve, I_a[:, -1], p_end)
+        v_new[:, -1] = np.where(is_valve, 0.0, (I_a[:, -1] - p_new[:, -1]) / B)
+
+        p, p_new = p_new, p
+        v, v_new = v_new, v
+
+        if step % store_every == 0 or step == num_steps:
+            t_history[layer] = current_t
+            p_history[:, layer] = p
+            v_history[:, layer] = v
+            layer += 1
+
+        if progress_callback and progress_callback(step, num_steps, current_t) is False:
+            break
+
+    return EnsembleResult(scenarios, flow.x_km.copy(), t_history[:layer],
+                          p_history[:, :layer], v_history[:, :layer])
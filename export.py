@@ -0,0 +1,185 @@
+"""
+Потоковый экспорт результатов нестационарного расчёта
+
+Слои передаются страницами (t, p, v) по нескольку сотен слоёв, поэтому
+расчёт любого размера экспортируется с ограниченным расходом памяти.
+Формат определяется расширением файла:
+    .csv  - строки time_s, x_km, P_MPa, v_ms;
+    .npz  - архив массивов t_s, x_km, x_m, pressure_Pa, velocity_ms
+            (numpy.load);
+    .json - манифест, рядом с ним по файлу .npy на массив
+            (<имя>_pressure_Pa.npy, ...; numpy.load(..., mmap_mode='r')).
+
+Ход экспорта передаётся в progress(done, total) (слои), отмена -
+через cancel (threading.Event); при отмене частично записанные файлы
+удаляются.
+"""
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+
+CHUNK_LAYERS = 256
+CHUNK_ROWS = 65536
+FORMATS = ('.csv', '.npz', '.json')
+
+CSV_HEADER = ('time_s', 'x_km', 'P_MPa', 'v_ms')
+ARRAY_DTYPE = np.dtype('<f8')
+UNITS = {'t_s': 'с', 'x_km': 'км', 'x_m': 'м', 'pressure_Pa': 'Па', 'velocity_ms': 'м/с'}
+
+
+def iter_array_pages(t_history, p_history, v_history, chunk_layers=CHUNK_LAYERS):
+    """Страницы слоёв из массивов в памяти"""
+    for start in range(0, len(t_history), chunk_layers):
+        stop = start + chunk_layers
+        yield (np.asarray(t_history[start:stop], dtype=float),
+               np.asarray(p_history[start:stop], dtype=float),
+               np.asarray(v_history[start:stop], dtype=float))
+
+
+def _write_npy_header(f, shape):
+    np.lib.format.write_array_header_1_0(f, {
+        'descr': np.lib.format.dtype_to_descr(ARRAY_DTYPE),
+        'fortran_order': False,
+        'shape': shape,
+    })
+
+
+def _write_csv(filename, x_km, x_m, num_layers, pages, created, meta):
+    created.append(filename)
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        x_list = x_km.tolist()
+        for t, p, v in pages:
+            for t_i, p_i, v_i in zip(t.tolist(), (p / 1e6).tolist(), v.tolist()):
+                writer.writerows(zip([t_i] * len(x_list), x_list, p_i, v_i))
+
+
+def _write_npz(filename, x_km, x_m, num_layers, pages, created, meta):
+    # В архив одновременно пишется только один файл: давление - сразу,
+    # скорость - через временный файл, время - из памяти
+    created.append(filename)
+    shape = (num_layers, len(x_km))
+    times = []
+    with zipfile.ZipFile(filename, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as z, \
+            tempfile.TemporaryFile() as velocity:
+        with z.open('pressure_Pa.npy', 'w', force_zip64=True) as f:
+            _write_npy_header(f, shape)
+            for t, p, v in pages:
+                f.write(np.ascontiguousarray(p, dtype=ARRAY_DTYPE).tobytes())
+                velocity.write(np.ascontiguousarray(v, dtype=ARRAY_DTYPE).tobytes())
+                times.append(t)
+
+        velocity.seek(0)
+        with z.open('velocity_ms.npy', 'w', force_zip64=True) as f:
+            _write_npy_header(f, shape)
+            shutil.copyfileobj(velocity, f)
+
+        t = np.concatenate(times) if times else np.empty(0)
+        for name, array in (('t_s', t), ('x_km', x_km), ('x_m', x_m)):
+            with z.open(f'{name}.npy', 'w') as f:
+                np.lib.format.write_array(f, np.ascontiguousarray(array, dtype=ARRAY_DTYPE))
+
+
+def _write_npy(filename, x_km, x_m, num_layers, pages, created, meta):
+    stem = os.path.splitext(filename)[0]
+    shape = (num_layers, len(x_km))
+    paths = {name: f'{stem}_{name}.npy' for name in UNITS}
+    created.extend(paths.values())
+
+    for name, array in (('x_km', x_km), ('x_m', x_m)):
+        np.save(paths[name], np.ascontiguousarray(array, dtype=ARRAY_DTYPE))
+
+    t_out = np.lib.format.open_memmap(paths['t_s'], mode='w+', dtype=ARRAY_DTYPE, shape=(num_layers,))
+    p_out = np.lib.format.open_memmap(paths['pressure_Pa'], mode='w+', dtype=ARRAY_DTYPE, shape=shape)
+    v_out = np.lib.format.open_memmap(paths['velocity_ms'], mode='w+', dtype=ARRAY_DTYPE, shape=shape)
+    start = 0
+    for t, p, v in pages:
+        stop = start + len(t)
+        t_out[start:stop], p_out[start:stop], v_out[start:stop] = t, p, v
+        start = stop
+    for out in (t_out, p_out, v_out):
+        out.flush()
+    del t_out, p_out, v_out
+
+    manifest = {
+        'format': 'npy',
+        'num_layers': num_layers,
+        'num_nodes': len(x_km),
+        'arrays': {
+            name: {
+                'file': os.path.basename(path),
+                'dtype': ARRAY_DTYPE.str,
+                'shape': list(shape if name in ('pressure_Pa', 'velocity_ms')
+                              else (num_layers,) if name == 't_s' else (len(x_km),)),
+                'units': UNITS[name],
+            }
+            for name, path in paths.items()
+        },
+        **(meta or {}),
+    }
+    created.append(filename)
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+WRITERS = {'.csv': _write_csv, '.npz': _write_npz, '.json': _write_npy}
+
+
+def export_unsteady(filename, x_km, x_m, num_layers, pages, progress=None, cancel=None,
+                    meta=None, fmt=None):
+    """
+    Экспорт слоёв в файл; True - записано полностью, False - отменено
+
+    num_layers : int
+        Число слоёв в pages (для заголовков .npy и хода экспорта)
+    meta : dict
+        Дополнительные поля манифеста .json (номер расчёта, параметры)
+    fmt : str
+        Формат ('.csv', '.npz', '.json'); по умолчанию - по расширению файла
+    """
+    fmt = (fmt or os.path.splitext(filename)[1]).lower()
+    if fmt not in WRITERS:
+        raise ValueError(f"Неизвестный формат экспорта: {fmt} (допустимы {', '.join(FORMATS)})")
+
+    state = {'cancelled': False, 'done': 0}
+
+    def checked_pages():
+        for t, p, v in pages:
+            if cancel is not None and cancel.is_set():
+                state['cancelled'] = True
+                return
+            yield t, p, v
+            state['done'] += len(t)
+            if progress is not None:
+                progress(state['done'], num_layers)
+
+    x_km = np.asarray(x_km, dtype=float)
+    x_m = np.asarray(x_m, dtype=float)
+    created = []
+    try:
+        WRITERS[fmt](filename, x_km, x_m, num_layers, checked_pages(), created, meta)
+        if not state['cancelled'] and state['done'] != num_layers:
+            raise ValueError(f"Экспортировано слоёв: {state['done']} из {num_layers}")
+    except BaseException:
+        _remove(created)
+        raise
+
+    if state['cancelled']:
+        _remove(created)
+        return False
+    return True
+
+
+def _remove(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -274,13 +274,13 @@ class AnimationWindow:
                 self.btn_stop.config(state='disabled', text="Ошибка")
 
         # Показываем финальный кадр
-        if success and self.pipeline.p_history:
+        if success and len(self.pipeline.p_history) > 0:
             # Показываем последний кадр
             self._show_final_frame()
 
     def _show_final_frame(self):
         """Показать финальный кадр"""
-        if not self.pipeline.p_history or not self.axes:
+        if len(self.pipeline.p_history) == 0 or not self.axes:
             return
 
         last_idx = len(self.pipeline.p_history) - 1
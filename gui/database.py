@@ -1,18 +1,20 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import os
+import threading
 import numpy as np
 
-import constants as c
-
 
 class DatabaseWindow:
     """Окно для работы с базой данных"""
 
-    def __init__(self, root, pipeline, db_manager, log_callback=None):
+    def __init__(self, root, pipeline, db_manager, parent_gui, log_callback=None):
         self.root = root
         self.pipeline = pipeline
         self.db_manager = db_manager
+        # Главное окно: загрузка и продолжение расчёта проверяются и
+        # запускаются через его флаг calculation_running
+        self.parent_gui = parent_gui
         self.log_callback = log_callback
         self.window = None
         self.tree = None
@@ -82,10 +84,13 @@ class DatabaseWindow:
         """Загрузка списка расчётов из БД"""
         try:
             calculations = self.db_manager.get_all_calculations()
+            incomplete = {row[0] for row in self.db_manager.get_incomplete_calculations()}
 
             for calc in calculations:
                 calc_id, timestamp, calc_type, num_points, description = calc
                 type_display = "Стационарный" if calc_type == "stationary" else "Нестационарный"
+                if calc_id in incomplete:
+                    description = f"[не завершён] {description}"
                 self.tree.insert('', tk.END, values=(
                     calc_id, timestamp, type_display, num_points, description
                 ))
@@ -106,12 +111,18 @@ class DatabaseWindow:
         buttons_config = [
             ("Загрузить", self._load_and_visualize, 30),
             ("Показать таблицу данных", self._show_table, 30),
-            ("Удалить выбранный", self._delete_calculation, 30),
+            ("Удалить выбранные", self._delete_calculation, 30),
+            ("Продолжить расчёт", self._resume_calculation, 20),
+            ("Удалить незавершённые", self._discard_incomplete, 22),
         ]
 
         for text, command, width in buttons_config:
             ttk.Button(control_frame, text=text, command=command, width=width).pack(side=tk.LEFT, padx=5)
 
+        ttk.Button(control_frame, text="Обслуживание БД",
+                   command=self._run_maintenance,
+                   width=18).pack(side=tk.RIGHT, padx=5)
+
         ttk.Button(control_frame, text="Очистить всю БД",
                    command=self._clear_database,
                    width=20).pack(side=tk.RIGHT, padx=5)
@@ -126,6 +137,9 @@ class DatabaseWindow:
         if not selected:
             messagebox.showwarning("Предупреждение", "Выберите расчёт для загрузки")
             return
+        # Загрузка заменяет данные объекта расчёта, занятого текущим расчётом
+        if not self.parent_gui.check_idle():
+            return
 
         item = self.tree.item(selected[0])
         calc_id = item['values'][0]
@@ -156,7 +170,7 @@ class DatabaseWindow:
         # Создаём новый объект PipelineFlow
         from calc import PipelineFlow
         self.pipeline.__class__ = PipelineFlow
-        self.pipeline.__init__()
+        self.pipeline.__init__(self.pipeline.config)
 
         # Восстанавливаем данные
         self.pipeline.x_km = np.array([row[0] for row in rows])
@@ -176,15 +190,16 @@ class DatabaseWindow:
         self.pipeline.v_arr_original = self.pipeline.v_arr.copy()
 
         # Восстанавливаем параметры
-        self.pipeline.rho = c.RO20 * (1 - 0.0008 * (c.TC - 20))
+        config = self.pipeline.config
+        self.pipeline.rho = config.ro20 * (1 - 0.0008 * (config.tc - 20))
         self.pipeline.nu = self.pipeline.get_kinematic_viscosity(
-            c.T, c.VISCOSITY_20, c.VISCOSITY_50
+            config.temperature, config.viscosity_20, config.viscosity_50
         )
-        self.pipeline.epsilon = c.ABS_ROUGHTNESS / c.INTERNAL_DIAMETER
+        self.pipeline.epsilon = config.abs_roughness / config.internal_diameter
 
         if len(self.pipeline.v_arr) > 0:
             self.pipeline.Re = self.pipeline.get_reynolds(
-                self.pipeline.v, c.INTERNAL_DIAMETER, self.pipeline.nu
+                self.pipeline.v, config.internal_diameter, self.pipeline.nu
             )
             self.pipeline.lambda_ = self.pipeline.get_lambda(
                 self.pipeline.Re, self.pipeline.epsilon
@@ -202,34 +217,23 @@ class DatabaseWindow:
 
     def _load_unsteady(self, calc_id):
         """Загрузка нестационарного расчёта"""
-        times, data_by_time = self.db_manager.get_unsteady_data(calc_id)
+        arrays = self.db_manager.get_unsteady_arrays(calc_id)
 
-        if not times:
+        if arrays is None or len(arrays[2]) == 0:
             raise ValueError("Данные не найдены")
 
         # Создаём новый объект PipelineFlow
         from calc import PipelineFlow
         self.pipeline.__class__ = PipelineFlow
-        self.pipeline.__init__()
-
-        # Восстанавливаем данные
-        self.pipeline.t_history = times
-        self.pipeline.p_history = []
-        self.pipeline.v_history = []
-
-        for t, rows in data_by_time:
-            if len(self.pipeline.p_history) == 0:
-                self.pipeline.x_km = np.array([row[0] for row in rows])
-                self.pipeline.x_m = np.array([row[1] for row in rows])
+        self.pipeline.__init__(self.pipeline.config)
 
-            p_array = np.array([row[2] for row in rows])
-            v_array = np.array([row[3] for row in rows])
-
-            self.pipeline.p_history.append(p_array)
-            self.pipeline.v_history.append(v_array)
+        # Массивы (слои × узлы) заполняются базой данных напрямую
+        (self.pipeline.x_km, self.pipeline.x_m, self.pipeline.t_history,
+         self.pipeline.p_history, self.pipeline.v_history) = arrays
+        times = self.pipeline.t_history
 
         # Устанавливаем текущее и оригинальное состояние
-        if self.pipeline.p_history:
+        if len(self.pipeline.p_history) > 0:
             self.pipeline.P_original = self.pipeline.p_history[0].copy()
             self.pipeline.v_arr_original = self.pipeline.v_history[0].copy()
 
@@ -243,17 +247,18 @@ class DatabaseWindow:
                 self.pipeline.dx = self.pipeline.x_km[1] - self.pipeline.x_km[0]
 
             # Восстанавливаем параметры
-            self.pipeline.rho = c.RO20 * (1 - 0.0008 * (c.TC - 20))
+            config = self.pipeline.config
+            self.pipeline.rho = config.ro20 * (1 - 0.0008 * (config.tc - 20))
             self.pipeline.nu = self.pipeline.get_kinematic_viscosity(
-                c.T, c.VISCOSITY_20, c.VISCOSITY_50
+                config.temperature, config.viscosity_20, config.viscosity_50
             )
-            self.pipeline.epsilon = c.ABS_ROUGHTNESS / c.INTERNAL_DIAMETER
+            self.pipeline.epsilon = config.abs_roughness / config.internal_diameter
 
         if self.log_callback:
             self.log_callback(f"\nЗагружен нестационарный расчёт (ID: {calc_id})")
             self.log_callback(f"  Точек: {len(self.pipeline.x_km)}")
             self.log_callback(f"  Временных слоёв: {len(times)}")
-            if times:
+            if len(times) > 0:
                 self.log_callback(f"  Время: {times[0]:.2f} - {times[-1]:.2f} с")
 
     def _show_table(self):
@@ -363,18 +368,30 @@ class DatabaseWindow:
         data_tree.column('P_MPa', width=150, anchor='center')
         data_tree.column('v_ms', width=150, anchor='center')
 
-        # Получение данных
-        times, data_by_time = self.db_manager.get_unsteady_data(calc_id)
-        total_rows = 0
-        for t, rows in data_by_time:
-            for row in rows:
+        # Данные читаются по одному временному слою
+        num_layers = self.db_manager.get_unsteady_layer_count(calc_id)
+        grid = self.db_manager.get_unsteady_grid(calc_id)
+        x_km = grid[0] if grid is not None else []
+        layer_var = tk.IntVar(value=0)
+        info_label = ttk.Label(parent, font=('Arial', 10))
+
+        def show_layer(index):
+            if num_layers == 0:
+                info_label.config(text="Всего записей: 0 (временных слоёв: 0)")
+                return
+            index = min(max(index, 0), num_layers - 1)
+            layer_var.set(index)
+            t, p, v = self.db_manager.get_unsteady_layer(calc_id, index)
+            data_tree.delete(*data_tree.get_children())
+            for x, p_i, v_i in zip(x_km, p / 1e6, v):
                 data_tree.insert('', tk.END, values=(
                     f'{t:.2f}',
-                    f'{row[0]:.3f}',
-                    f'{row[2]/1e6:.3f}',
-                    f'{row[3]:.4f}'
+                    f'{x:.3f}',
+                    f'{p_i:.3f}',
+                    f'{v_i:.4f}'
                 ))
-                total_rows += 1
+            info_label.config(text=f"Слой {index + 1} из {num_layers}, t = {t:.2f} с "
+                                   f"(всего записей: {num_layers * len(x_km)})")
 
         # Размещение
         data_tree.grid(row=0, column=0, sticky='nsew')
@@ -384,38 +401,180 @@ class DatabaseWindow:
         frame.grid_rowconfigure(0, weight=1)
         frame.grid_columnconfigure(0, weight=1)
 
+        # Навигация по слоям
+        nav = ttk.Frame(parent)
+        nav.pack(pady=5)
+        ttk.Button(nav, text="<<", width=4,
+                   command=lambda: show_layer(0)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(nav, text="<", width=4,
+                   command=lambda: show_layer(layer_var.get() - 1)).pack(side=tk.LEFT, padx=2)
+        spinbox = ttk.Spinbox(nav, from_=0, to=max(num_layers - 1, 0), width=8,
+                              textvariable=layer_var, command=lambda: show_layer(layer_var.get()))
+        spinbox.pack(side=tk.LEFT, padx=2)
+        spinbox.bind('<Return>', lambda event: show_layer(layer_var.get()))
+        ttk.Button(nav, text=">", width=4,
+                   command=lambda: show_layer(layer_var.get() + 1)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(nav, text=">>", width=4,
+                   command=lambda: show_layer(num_layers - 1)).pack(side=tk.LEFT, padx=2)
+
         # Информация
-        info_label = ttk.Label(parent,
-                               text=f"Всего записей: {total_rows} (временных слоёв: {len(times)})",
-                               font=('Arial', 10))
         info_label.pack(pady=5)
+        show_layer(0)
 
         # Кнопка экспорта
-        ttk.Button(parent, text="Экспорт в CSV",
+        ttk.Button(parent, text="Экспорт (CSV, NPZ, NPY)",
                    command=lambda: self._export_to_csv(calc_id, "Нестационарный")).pack(pady=5)
 
     def _delete_calculation(self):
-        """Удаление выбранного расчёта из БД"""
+        """Удаление выбранных расчётов из БД (одной транзакцией)"""
         selected = self.tree.selection()
         if not selected:
             messagebox.showwarning("Предупреждение", "Выберите расчёт для удаления")
             return
 
-        item = self.tree.item(selected[0])
-        calc_id = item['values'][0]
+        calc_ids = [self.tree.item(item)['values'][0] for item in selected]
 
-        confirm = messagebox.askyesno("Подтверждение", f"Удалить расчёт ID: {calc_id}?")
-        if not confirm:
+        if len(calc_ids) == 1:
+            question = f"Удалить расчёт ID: {calc_ids[0]}?"
+        else:
+            question = f"Удалить выбранные расчёты ({len(calc_ids)} шт.)?"
+        if not messagebox.askyesno("Подтверждение", question):
             return
 
         try:
-            self.db_manager.delete_calculation(calc_id)
-            self.tree.delete(selected[0])
+            self.db_manager.delete_calculations(calc_ids)
+            self.tree.delete(*selected)
 
             if self.log_callback:
-                self.log_callback(f"Расчёт ID: {calc_id} удалён из базы данных")
+                self.log_callback(f"Удалены расчёты ID: {', '.join(map(str, calc_ids))}")
 
-            messagebox.showinfo("Успех", "Расчёт удалён")
+            messagebox.showinfo("Успех", "Расчёты удалены" if len(calc_ids) > 1 else "Расчёт удалён")
+
+        except Exception as e:
+            messagebox.showerror("Ошибка БД", f"Не удалось удалить данные: {e}")
+            return
+
+        # Освобождённое место возвращается в фоне; база прежней версии
+        # уменьшается только полной перестройкой файла
+        if self.db_manager.supports_incremental_vacuum():
+            def vacuum():
+                try:
+                    self.db_manager.incremental_vacuum()
+                finally:
+                    self.db_manager.close()
+
+            threading.Thread(target=vacuum, daemon=True).start()
+
+        elif messagebox.askyesno(
+                "Освобождение места",
+                "Файл базы прежней версии не уменьшается после удаления.\n"
+                "Выполнить полную перестройку файла (VACUUM)? База на это время "
+                "будет заблокирована; после перестройки место будет "
+                "освобождаться автоматически."):
+            self._run_in_background("Освобождение места", "Перестройка файла базы (VACUUM)",
+                                    lambda progress, cancel: self.db_manager.vacuum(),
+                                    lambda result: "Файл базы перестроен")
+
+    def _run_in_background(self, title, text, task, describe):
+        """Операция с базой в фоновом потоке с окном хода; describe(результат) - в лог"""
+        def run(progress, cancel):
+            try:
+                return task(progress, cancel)
+            finally:
+                self.db_manager.close()
+
+        def done(result, error):
+            if error is not None:
+                messagebox.showerror("Ошибка БД", f"{title}: {error}")
+            elif self.log_callback:
+                self.log_callback(describe(result))
+
+        from gui.progress import ProgressWindow
+        ProgressWindow(self.root, title, text).run(run, done)
+
+    def _run_maintenance(self):
+        """Обслуживание базы в фоновом потоке: освобождение места, ANALYZE, проверка"""
+        stale = self.db_manager.tables_without_cascade()
+        if stale and messagebox.askyesno(
+                "Обслуживание БД",
+                "Таблицы прежней версии без каскадного удаления: " + ", ".join(stale) + ".\n"
+                "Перестроить их сейчас? Для больших баз это может занять несколько минут; "
+                "операцию можно отменить."):
+            self._run_in_background(
+                "Перестройка таблиц", "Перестройка таблиц результатов",
+                lambda progress, cancel: self.db_manager.migrate_foreign_keys(progress, cancel),
+                lambda rebuilt: "Перестроены таблицы: " + (", ".join(rebuilt) or "нет")
+                + ("" if len(rebuilt) == len(stale) else " (перестройка отменена)"))
+            return
+
+        full_vacuum = messagebox.askyesno(
+            "Обслуживание БД",
+            "Выполнить полную перестройку файла (VACUUM)?\n"
+            "Это освобождает всё место, но база на это время заблокирована.\n"
+            "«Нет» - быстрое освобождение свободных страниц."
+        )
+
+        def task(progress, cancel):
+            try:
+                return self.db_manager.run_maintenance(progress, cancel, full_vacuum=full_vacuum)
+            finally:
+                self.db_manager.close()
+
+        def done(report, error):
+            if error is not None:
+                messagebox.showerror("Ошибка БД", f"Обслуживание не выполнено: {error}")
+                return
+
+            before, after = report['before'], report['after']
+            lines = [
+                f"Размер: {before['file_size'] / 2**20:.1f} -> {after['file_size'] / 2**20:.1f} МБ "
+                f"(журнал WAL: {after['wal_size'] / 2**20:.1f} МБ)",
+                f"Фрагментация: {before['fragmentation']:.1%} -> {after['fragmentation']:.1%}",
+                f"Режим auto_vacuum: {after['auto_vacuum']}",
+            ]
+            if report['cancelled']:
+                lines.append("Обслуживание прервано")
+            elif report['problems']:
+                lines.append(f"Найдены ошибки ({len(report['problems'])}):")
+                lines.extend(report['problems'][:10])
+            else:
+                lines.append("Ошибок целостности не найдено")
+
+            if self.log_callback:
+                self.log_callback("Обслуживание БД:\n  " + "\n  ".join(lines))
+            messagebox.showinfo("Обслуживание БД", "\n".join(lines))
+
+        from gui.progress import ProgressWindow
+        ProgressWindow(self.root, "Обслуживание БД", "Освобождение места и проверка базы").run(task, done)
+
+    def _resume_calculation(self):
+        """Продолжение выбранного незавершённого расчёта в фоновом потоке"""
+        selected = self.tree.selection()
+        if not selected:
+            messagebox.showwarning("Предупреждение", "Выберите незавершённый расчёт")
+            return
+
+        calc_id = self.tree.item(selected[0])['values'][0]
+        if calc_id not in {row[0] for row in self.db_manager.get_incomplete_calculations()}:
+            messagebox.showwarning("Предупреждение", "Выбранный расчёт завершён")
+            return
+
+        if self.parent_gui.resume_calculation(calc_id):
+            self.window.destroy()
+
+    def _discard_incomplete(self):
+        """Удаление всех незавершённых расчётов"""
+        if not messagebox.askyesno("Подтверждение", "Удалить все незавершённые расчёты?"):
+            return
+
+        try:
+            count = self.db_manager.discard_incomplete()
+            for item in self.tree.get_children():
+                self.tree.delete(item)
+            self._load_calculations()
+
+            if self.log_callback:
+                self.log_callback(f"Удалено незавершённых расчётов: {count}")
 
         except Exception as e:
             messagebox.showerror("Ошибка БД", f"Не удалось удалить данные: {e}")
@@ -444,19 +603,35 @@ class DatabaseWindow:
             messagebox.showerror("Ошибка", f"Не удалось очистить БД: {e}")
 
     def _export_to_csv(self, calc_id, calc_type):
-        """Экспорт данных из БД в CSV"""
+        """Экспорт данных из БД в CSV (нестационарных - также в .npz или .npy) в фоновом потоке"""
+        filetypes = [("CSV files", "*.csv")]
+        if calc_type != "Стационарный":
+            filetypes += [("NumPy archive", "*.npz"), ("NumPy .npy + JSON manifest", "*.json")]
         filename = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            filetypes=filetypes + [("All files", "*.*")],
             initialfile=f"calculation_{calc_id}.csv"
         )
 
         if not filename:
             return
 
-        try:
-            self.db_manager.export_to_csv(calc_id, calc_type, filename)
-            messagebox.showinfo("Успех", f"Данные экспортированы в {filename}")
-
-        except Exception as e:
-            messagebox.showerror("Ошибка экспорта", str(e))
+        def task(progress, cancel):
+            try:
+                if calc_type == "Стационарный" or filename.lower().endswith('.csv'):
+                    return self.db_manager.export_to_csv(calc_id, calc_type, filename,
+                                                         progress, cancel)
+                return self.db_manager.export_unsteady(calc_id, filename, progress, cancel)
+            finally:
+                self.db_manager.close()
+
+        def done(completed, error):
+            if error is not None:
+                messagebox.showerror("Ошибка экспорта", str(error))
+            elif completed:
+                messagebox.showinfo("Успех", f"Данные экспортированы в {filename}")
+            elif self.log_callback:
+                self.log_callback(f"Экспорт расчёта ID: {calc_id} отменён")
+
+        from gui.progress import ProgressWindow
+        ProgressWindow(self.root, "Экспорт", f"Экспорт расчёта ID: {calc_id}").run(task, done)
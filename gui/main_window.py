@@ -1,14 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import threading
+import os
+import shutil
+import tempfile
 
-from .plots import PlotWindow
-from .animation import AnimationWindow
-from .database import DatabaseWindow
+# Окна графиков, анимации, таблиц и базы данных, а также расчётные модули
+# и база данных (numpy, matplotlib) импортируются при первом обращении:
+# главное окно появляется без их загрузки
+from config import PipelineConfig
 
-import constants as c
-import db_manager as db
-from calc import PipelineFlow
+# Допуск невязок для остановки по установившемуся режиму
+STEADY_TOL = 1e-3
+# Допустимая погрешность табличного λ(Re) (calc.LAMBDA_TABLES)
+LAMBDA_TABLE_TOL = 1e-6
 
 
 class PipelineGUI:
@@ -18,8 +23,10 @@ class PipelineGUI:
         self.root.geometry("800x800")
 
         # Основные объекты
-        self.pipeline = PipelineFlow()
-        self.db_manager = db.DatabaseManager()
+        self.config = PipelineConfig.from_constants()
+        self._pipeline = None
+        self._result_cache = None
+        self._db_manager = None
 
         # Флаги состояния
         self.calculation_running = False
@@ -30,8 +37,42 @@ class PipelineGUI:
         self.animation_window = None
         self.database_window = None
 
+        # Файлы истории на диске: один временный каталог на сеанс,
+        # файлы прежних расчётов удаляются при следующем расчёте и при закрытии
+        self._history_dir = None
+        self._history_files = []
+
         # Создание интерфейса
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    @property
+    def pipeline(self):
+        """Расчётный объект; создаётся при первом обращении"""
+        if self._pipeline is None:
+            from calc import PipelineFlow
+            self._pipeline = PipelineFlow(self.config)
+        return self._pipeline
+
+    @pipeline.setter
+    def pipeline(self, value):
+        self._pipeline = value
+
+    @property
+    def result_cache(self):
+        """Кэш результатов; создаётся при первом обращении"""
+        if self._result_cache is None:
+            from result_cache import ResultCache
+            self._result_cache = ResultCache()
+        return self._result_cache
+
+    @property
+    def db_manager(self):
+        """Работа с базой данных; создаётся при первом обращении"""
+        if self._db_manager is None:
+            import db_manager as db
+            self._db_manager = db.DatabaseManager()
+        return self._db_manager
 
     def create_widgets(self):
         """Создание всех элементов интерфейса"""
@@ -53,19 +94,19 @@ class PipelineGUI:
         )
 
         ttk.Label(pipe_frame, text="Длина, км:").grid(row=1, column=0, sticky='w', pady=2)
-        self.length_var = tk.StringVar(value=str(c.XN_KM - c.X0_KM))
+        self.length_var = tk.StringVar(value=str(self.config.xn_km - self.config.x0_km))
         ttk.Entry(pipe_frame, textvariable=self.length_var, width=15).grid(row=1, column=1, padx=5, pady=2)
 
         ttk.Label(pipe_frame, text="Диаметр (внеш.), мм:").grid(row=2, column=0, sticky='w', pady=2)
-        self.diameter_var = tk.StringVar(value=str(c.EXTERNAL_DIAMETER_MM))
+        self.diameter_var = tk.StringVar(value=str(self.config.external_diameter_mm))
         ttk.Entry(pipe_frame, textvariable=self.diameter_var, width=15).grid(row=2, column=1, padx=5, pady=2)
 
         ttk.Label(pipe_frame, text="Толщина стенки, мм:").grid(row=3, column=0, sticky='w', pady=2)
-        self.thickness_var = tk.StringVar(value=str(c.WALL_THICKNESS_MM))
+        self.thickness_var = tk.StringVar(value=str(self.config.wall_thickness_mm))
         ttk.Entry(pipe_frame, textvariable=self.thickness_var, width=15).grid(row=3, column=1, padx=5, pady=2)
 
         ttk.Label(pipe_frame, text="Шероховатость, мм:").grid(row=4, column=0, sticky='w', pady=2)
-        self.roughness_var = tk.StringVar(value=str(c.ABS_ROUGHTNESS_MM))
+        self.roughness_var = tk.StringVar(value=str(self.config.abs_roughness_mm))
         ttk.Entry(pipe_frame, textvariable=self.roughness_var, width=15).grid(row=4, column=1, padx=5, pady=2)
 
         # Средняя колонка - Параметры нефти и давления
@@ -75,19 +116,19 @@ class PipelineGUI:
         ttk.Label(oil_frame, text="НЕФТЬ И ДАВЛЕНИЕ", font=('Arial', 10, 'bold')).grid(row=0, column=0, columnspan=2, pady=5)
 
         ttk.Label(oil_frame, text="Температура, °C:").grid(row=1, column=0, sticky='w', pady=2)
-        self.temp_var = tk.StringVar(value=str(c.TC))
+        self.temp_var = tk.StringVar(value=str(self.config.tc))
         ttk.Entry(oil_frame, textvariable=self.temp_var, width=15).grid(row=1, column=1, padx=5, pady=2)
 
         ttk.Label(oil_frame, text="Давление вход, МПа:").grid(row=2, column=0, sticky='w', pady=2)
-        self.p_inlet_var = tk.StringVar(value=str(c.P_INITIAL_MPA))
+        self.p_inlet_var = tk.StringVar(value=str(self.config.p_initial_mpa))
         ttk.Entry(oil_frame, textvariable=self.p_inlet_var, width=15).grid(row=2, column=1, padx=5, pady=2)
 
         ttk.Label(oil_frame, text="Давление выход, МПа:").grid(row=3, column=0, sticky='w', pady=2)
-        self.p_outlet_var = tk.StringVar(value=str(c.P_END_MPA))
+        self.p_outlet_var = tk.StringVar(value=str(self.config.p_end_mpa))
         ttk.Entry(oil_frame, textvariable=self.p_outlet_var, width=15).grid(row=3, column=1, padx=5, pady=2)
 
         ttk.Label(oil_frame, text="Скорость звука, м/с:").grid(row=4, column=0, sticky='w', pady=2)
-        self.sound_speed_var = tk.StringVar(value=str(c.SPEED_OF_SOUND))
+        self.sound_speed_var = tk.StringVar(value=str(self.config.speed_of_sound))
         ttk.Entry(oil_frame, textvariable=self.sound_speed_var, width=15).grid(row=4, column=1, padx=5, pady=2)
 
         # Правая колонка - Параметры расчёта
@@ -97,7 +138,7 @@ class PipelineGUI:
         ttk.Label(calc_frame, text="РАСЧЁТ", font=('Arial', 10, 'bold')).grid(row=0, column=0, columnspan=2, pady=5)
 
         ttk.Label(calc_frame, text="Шаг сетки, км:").grid(row=1, column=0, sticky='w', pady=2)
-        self.dx_var = tk.StringVar(value=str(c.dx_km))
+        self.dx_var = tk.StringVar(value=str(self.config.dx_km))
         ttk.Entry(calc_frame, textvariable=self.dx_var, width=15).grid(row=1, column=1, padx=5, pady=2)
 
         ttk.Label(calc_frame, text="Метод расчёта λ:").grid(row=2, column=0, sticky='w', pady=2)
@@ -119,6 +160,26 @@ class PipelineGUI:
         ttk.Checkbutton(calc_frame, text="Параллельные вычисления",
                         variable=self.parallel_var).grid(row=5, column=0, columnspan=2, pady=2, sticky='w')
 
+        # Длинные расчёты: история пишется в файл и читается с диска по слоям
+        self.history_disk_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(calc_frame, text="История на диске",
+                        variable=self.history_disk_var).grid(row=6, column=0, columnspan=2, pady=2, sticky='w')
+
+        # Досрочная остановка по установившемуся режиму
+        self.steady_stop_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(calc_frame, text="Остановка при установившемся режиме",
+                        variable=self.steady_stop_var).grid(row=7, column=0, columnspan=2, pady=2, sticky='w')
+
+        # Слои истории записываются в БД фоновым потоком во время расчёта
+        self.stream_db_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(calc_frame, text="Запись в БД во время расчёта",
+                        variable=self.stream_db_var).grid(row=8, column=0, columnspan=2, pady=2, sticky='w')
+
+        # λ(Re) из таблиц общего кэша: таблицы переиспользуются при смене метода
+        self.lambda_table_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(calc_frame, text="Табличный λ(Re)",
+                        variable=self.lambda_table_var).grid(row=9, column=0, columnspan=2, pady=2, sticky='w')
+
     def _create_control_panel(self):
         """Создание панели управления"""
         control_frame = ttk.Frame(self.root)
@@ -206,52 +267,57 @@ class PipelineGUI:
         return wrapper
 
     def update_constants(self):
-        """Обновление констант из полей ввода"""
+        """Параметры расчёта из полей ввода (self.config)"""
         try:
-            total_length = float(self.length_var.get())
-            c.XN_KM = total_length
-
-            c.EXTERNAL_DIAMETER_MM = float(self.diameter_var.get())
-            c.WALL_THICKNESS_MM = float(self.thickness_var.get())
-            c.Delta_mm = float(self.roughness_var.get())
-            c.EXTERNAL_DIAMETER = c.EXTERNAL_DIAMETER_MM / 1000
-            c.delta = c.WALL_THICKNESS_MM / 1000
-            c.INTERNAL_DIAMETER = c.EXTERNAL_DIAMETER - 2 * c.delta
-            c.Delta = c.Delta_mm / 1000
-            c.L = c.XN_KM * 1000
-
-            c.TC = float(self.temp_var.get())
-            c.T = c.TC + 273.15
-            c.P_INITIAL_MPA = float(self.p_inlet_var.get())
-            c.P_END_MPA = float(self.p_outlet_var.get())
-            c.P_INITIAL = c.P_INITIAL_MPA * 1e6
-            c.P_END = c.P_END_MPA * 1e6
-            c.SPEED_OF_SOUND = float(self.sound_speed_var.get())
-
-            c.dx_km = float(self.dx_var.get())
+            self.config = self.config.replace(
+                xn_km=self.config.x0_km + float(self.length_var.get()),
+                external_diameter_mm=float(self.diameter_var.get()),
+                wall_thickness_mm=float(self.thickness_var.get()),
+                abs_roughness_mm=float(self.roughness_var.get()),
+                tc=float(self.temp_var.get()),
+                p_initial_mpa=float(self.p_inlet_var.get()),
+                p_end_mpa=float(self.p_outlet_var.get()),
+                speed_of_sound=float(self.sound_speed_var.get()),
+                dx_km=float(self.dx_var.get()),
+            )
 
             return True
         except ValueError as e:
             messagebox.showerror("Ошибка", f"Неверный формат данных: {e}")
             return False
 
+    def check_idle(self):
+        """False (с предупреждением), если уже выполняется расчёт"""
+        if self.calculation_running:
+            messagebox.showwarning("Предупреждение", "Дождитесь завершения текущего расчёта")
+            return False
+        return True
+
     def run_stationary(self):
         """Запуск стационарного расчёта"""
-        if not self.update_constants():
+        if not self.check_idle() or not self.update_constants():
             return
 
         try:
+            from calc import PipelineFlow
+
             lambda_method = self.lambda_method_var.get()
-            self.pipeline = PipelineFlow()
-            self.pipeline.calculate_stationary(lambda_method=lambda_method, verbose=False)
+            self.pipeline = PipelineFlow(self.config)
+            cached = self.result_cache.stationary(self.pipeline, lambda_method=lambda_method)
+            if cached:
+                self.log_message("Результат взят из кэша")
 
-            self.log_message(f"Плотность при {c.TC}°C: ρ = {self.pipeline.rho:.2f} кг/м³")
+            self.log_message(f"Плотность при {self.config.tc}°C: ρ = {self.pipeline.rho:.2f} кг/м³")
             self.log_message(f"Кинематическая вязкость: ν = {self.pipeline.nu*1e6:.2f} сСт")
             self.log_message(f"Скорость нефти: v = {self.pipeline.v:.4f} м/с")
             self.log_message(f"Число Рейнольдса: Re = {self.pipeline.Re:.0f}")
             self.log_message(f"Коэффициент сопротивления: λ = {self.pipeline.lambda_:.5f}")
             self.log_message(f"Число точек сетки: {len(self.pipeline.x_km)}")
             self.log_message("Расчёт завершён успешно!")
+
+            stats = self.result_cache.stats()
+            self.log_message(f"Кэш результатов: попаданий {stats['memory_hits'] + stats['disk_hits']}, "
+                             f"промахов {stats['misses']}, доля {stats['hit_rate']:.0%}")
             self.log_message("=" * 60)
 
             # Автоматическое открытие графика
@@ -265,6 +331,8 @@ class PipelineGUI:
     @requires_stationary_calculation
     def run_unsteady_animated(self):
         """Запуск нестационарного расчёта с анимацией"""
+        if not self.check_idle():
+            return
 
         # Сохраняем оригинальные данные
         if not hasattr(self.pipeline, 'P_original') or self.pipeline.P_original is None:
@@ -290,8 +358,14 @@ class PipelineGUI:
                 bc_value = bc_value_mpa * 1e6
 
             lambda_method = self.lambda_method_var.get()
+            lambda_table_tol = LAMBDA_TABLE_TOL if self.lambda_table_var.get() else None
             use_parallel = self.parallel_var.get()
 
+            history_file = None
+            if self.history_disk_var.get():
+                history_file = self._new_history_file()
+                self.log_message(f"История: {history_file}")
+
             self.log_message(f"Шагов по времени: {num_steps}")
             self.log_message(f"Граничное условие: {bc_type}")
             if bc_time is not None:
@@ -299,6 +373,7 @@ class PipelineGUI:
 
             # Открываем окно анимации
             if not self.animation_window:
+                from .animation import AnimationWindow
                 self.animation_window = AnimationWindow(self.root, self.pipeline)
 
             self.animation_window.open()
@@ -309,15 +384,95 @@ class PipelineGUI:
             # Запуск в отдельном потоке
             thread = threading.Thread(
                 target=self._run_unsteady_with_animation,
-                args=(num_steps, store_every, bc_type, bc_time, bc_value, lambda_method, use_parallel),
+                args=(num_steps, store_every, bc_type, bc_time, bc_value, lambda_method, use_parallel,
+                      history_file, STEADY_TOL if self.steady_stop_var.get() else None,
+                      self.db_manager if self.stream_db_var.get() else None, lambda_table_tol),
                 daemon=True
             )
+            self.calculation_running = True
             thread.start()
 
         except ValueError as e:
             messagebox.showerror("Ошибка", f"Неверный формат данных: {e}")
 
-    def _run_unsteady_with_animation(self, num_steps, store_every, bc_type, bc_time, bc_value, lambda_method, use_parallel):
+    def resume_calculation(self, calc_id):
+        """
+        Продолжение незавершённого расчёта calc_id из БД в фоновом потоке
+
+        Расчёт ведётся на отдельном объекте PipelineFlow и, как и прочие
+        расчёты, занимает флаг calculation_running; текущие результаты
+        окна не изменяются, продолженный расчёт загружается из БД
+        """
+        if not self.check_idle():
+            return False
+
+        self.calculation_running = True
+        self.stop_requested = False
+        self.log_message(f"Продолжение расчёта ID: {calc_id}...")
+
+        def run():
+            from calc import PipelineFlow
+
+            def check_stop(*args):
+                return not self.stop_requested
+
+            try:
+                flow = PipelineFlow()
+                flow.resume_unsteady(self.db_manager, calc_id, verbose=False,
+                                     progress_callback=check_stop)
+                if flow.streamed_calc_id is not None:
+                    message = f"Расчёт ID: {calc_id} продолжен и записан в БД"
+                else:
+                    message = f"Продолжение расчёта ID: {calc_id} остановлено, записанные слои сохранены"
+            except Exception as e:
+                message = f"ОШИБКА продолжения расчёта ID: {calc_id}: {e}"
+            finally:
+                self.db_manager.close()
+                self.calculation_running = False
+            self.root.after(0, lambda: self.log_message(message))
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+    def _new_history_file(self):
+        """
+        Файл истории для нового расчёта; файлы прежних расчётов удаляются
+        (предыдущая история может быть ещё открыта, поэтому файл каждый раз новый)
+        """
+        self._remove_history_files()
+        if self._history_dir is None:
+            self._history_dir = tempfile.mkdtemp(prefix='srt_history_')
+
+        fd, history_file = tempfile.mkstemp(suffix='.bin', dir=self._history_dir)
+        os.close(fd)
+        self._history_files.append(history_file)
+        return history_file
+
+    def _remove_history_files(self):
+        """Удаление файлов истории; ещё отображённые в память (Windows) - при следующей попытке"""
+        remaining = []
+        for path in self._history_files:
+            try:
+                for name in (path, path + '.json'):
+                    if os.path.exists(name):
+                        os.remove(name)
+            except OSError:
+                remaining.append(path)
+        self._history_files = remaining
+
+    def on_close(self):
+        """Закрытие главного окна: остановка расчёта и удаление файлов истории"""
+        self.stop_requested = True
+        if self._pipeline is not None:
+            # История в файле освобождается до удаления каталога
+            self._pipeline.t_history = self._pipeline.p_history = self._pipeline.v_history = []
+        if self._history_dir is not None:
+            shutil.rmtree(self._history_dir, ignore_errors=True)
+        self.root.destroy()
+
+    def _run_unsteady_with_animation(self, num_steps, store_every, bc_type, bc_time, bc_value, lambda_method, use_parallel,
+                                     history_file=None, steady_tol=None, stream_to_db=None,
+                                     lambda_table_tol=None):
         """Выполнение нестационарного расчёта с динамической анимацией"""
         try:
             self.calculation_running = True
@@ -347,17 +502,30 @@ class PipelineGUI:
             # Уменьшаем частоту сохранения для расчёта, но окно анимации само решит когда обновлять
             effective_store_every = max(1, store_every // 2)  # Увеличиваем частоту обновления callback
 
-            self.pipeline.calculate_unsteady_with_callback(
+            # Повтор расчёта с теми же данными берётся из кэша результатов
+            # (история в файле и запись в БД во время расчёта - без кэша)
+            cached = self.result_cache.unsteady(
+                self.pipeline,
                 num_steps=num_steps,
                 store_every=effective_store_every,
                 boundary_condition=bc_type,
                 bc_change_time=bc_time,
                 bc_change_value=bc_value,
                 lambda_method=lambda_method,
+                lambda_table_tol=lambda_table_tol,
+                steady_tol=steady_tol,
                 use_parallel=use_parallel,
                 verbose=False,
-                progress_callback=update_progress_and_plot
+                progress_callback=update_progress_and_plot,
+                history_file=history_file,
+                stream_to_db=stream_to_db
             )
+            if cached:
+                self.log_message("Результат взят из кэша")
+                if self.animation_window:
+                    self.animation_window.update_plot(self.pipeline.t_history[-1],
+                                                      self.pipeline.p_history[-1],
+                                                      self.pipeline.v_history[-1], 100.0)
 
             def finalize_ui():
                 if self.animation_window:
@@ -365,6 +533,18 @@ class PipelineGUI:
 
                 self.log_message("Расчёт завершён успешно!")
                 self.log_message(f"Сохранено {len(self.pipeline.t_history)} временных слоёв")
+                if self.pipeline.converged_step is not None:
+                    self.log_message(f"Установившийся режим на шаге {self.pipeline.converged_step}")
+                if self.pipeline.streamed_calc_id is not None:
+                    self.log_message(f"История записана в БД (ID: {self.pipeline.streamed_calc_id})")
+                elif stream_to_db is not None:
+                    self.log_message("Расчёт не завершён: записанные слои сохранены в БД как незавершённый расчёт")
+
+                from calc import LAMBDA_TABLES
+                stats = LAMBDA_TABLES.stats()
+                if stats['size']:
+                    self.log_message(f"Кэш таблиц λ: попаданий {stats['hits']}, "
+                                     f"промахов {stats['misses']}, таблиц {stats['size']}")
                 self.log_message("=" * 60)
 
             self.root.after(0, finalize_ui)
@@ -419,6 +599,7 @@ class PipelineGUI:
                 return
 
         if not self.plot_window:
+            from .plots import PlotWindow
             self.plot_window = PlotWindow(self.root, self.pipeline)
 
         self.plot_window.open()
@@ -426,8 +607,9 @@ class PipelineGUI:
     def open_database_window(self):
         """Открытие окна базы данных"""
         if not self.database_window:
+            from .database import DatabaseWindow
             self.database_window = DatabaseWindow(
-                self.root, self.pipeline, self.db_manager,
+                self.root, self.pipeline, self.db_manager, self,
                 log_callback=self.log_message
             )
 
@@ -440,8 +622,10 @@ class PipelineGUI:
             return
 
         try:
-            self.pipeline.save_to_database()
+            stats = self.pipeline.save_to_database()
             self.log_message("Результаты сохранены в базу данных!")
+            self.log_message(f"Записано строк: {stats['rows']} за {stats['seconds']:.2f} с "
+                             f"({stats['rows_per_s']:.0f} строк/с)")
             messagebox.showinfo("Успех", "Результаты сохранены в БД!")
         except Exception as e:
             messagebox.showerror("Ошибка сохранения", str(e))
@@ -2,7 +2,6 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
-import constants as c
 
 
 class PlotWindow:
@@ -115,13 +114,14 @@ class PlotWindow:
         ax.set_title('Стационарное распределение давления P(x)', fontsize=14)
         ax.grid(True, alpha=0.3)
 
-        ax.annotate(f'P0 = {c.P_INITIAL_MPA:.1f} МПа',
-                    xy=(0, c.P_INITIAL_MPA), xytext=(5, c.P_INITIAL_MPA - 0.3),
+        config = self.pipeline.config
+        ax.annotate(f'P0 = {config.p_initial_mpa:.1f} МПа',
+                    xy=(config.x0_km, config.p_initial_mpa), xytext=(config.x0_km + 5, config.p_initial_mpa - 0.3),
                     arrowprops=dict(arrowstyle='->', color='blue'),
                     fontsize=10, color='blue')
 
-        ax.annotate(f'Pn = {c.P_END_MPA:.1f} МПа',
-                    xy=(c.XN_KM, c.P_END_MPA), xytext=(c.XN_KM - 15, c.P_END_MPA + 0.3),
+        ax.annotate(f'Pn = {config.p_end_mpa:.1f} МПа',
+                    xy=(config.xn_km, config.p_end_mpa), xytext=(config.xn_km - 15, config.p_end_mpa + 0.3),
                     arrowprops=dict(arrowstyle='->', color='blue'),
                     fontsize=10, color='blue')
 
@@ -0,0 +1,53 @@
+import tkinter as tk
+from tkinter import ttk
+import threading
+
+
+class ProgressWindow:
+    """Окно хода длительной операции с кнопкой отмены"""
+
+    def __init__(self, root, title, text=""):
+        self.root = root
+        self.cancel_event = threading.Event()
+
+        self.window = tk.Toplevel(root)
+        self.window.title(title)
+        self.window.resizable(False, False)
+        self.window.transient(root)
+        self.window.protocol("WM_DELETE_WINDOW", self.cancel_event.set)
+
+        ttk.Label(self.window, text=text).pack(padx=15, pady=(15, 5))
+        self.bar = ttk.Progressbar(self.window, length=320, maximum=1.0)
+        self.bar.pack(padx=15, pady=5)
+        self.status = ttk.Label(self.window, text="")
+        self.status.pack(padx=15, pady=5)
+        ttk.Button(self.window, text="Отмена",
+                   command=self.cancel_event.set).pack(pady=(5, 15))
+
+    def progress(self, done, total):
+        """Ход операции (вызывается из фонового потока)"""
+        self.root.after(0, self._update, done, total)
+
+    def _update(self, done, total):
+        if not self.window.winfo_exists():
+            return
+        self.bar['value'] = done / total if total else 1.0
+        self.status.config(text=f"{done} из {total}")
+
+    def run(self, task, on_done):
+        """
+        Выполнение task(progress, cancel) в фоновом потоке;
+        по окончании on_done(result, error) вызывается в потоке интерфейса
+        """
+        def worker():
+            try:
+                result, error = task(self.progress, self.cancel_event), None
+            except Exception as e:
+                result, error = None, e
+            self.root.after(0, finish, result, error)
+
+        def finish(result, error):
+            self.window.destroy()
+            on_done(result, error)
+
+        threading.Thread(target=worker, daemon=True).start()
@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import csv
+import os
 
 
 class TableWindow:
@@ -30,7 +31,7 @@ class TableWindow:
         self._create_stationary_tab(notebook)
 
         # вкладка 2
-        if self.pipeline.p_history and len(self.pipeline.p_history) > 0:
+        if len(self.pipeline.p_history) > 0:
             self._create_unsteady_tab(notebook)
 
     def _create_stationary_tab(self, notebook):
@@ -194,7 +195,7 @@ class TableWindow:
                    command=lambda: self.export_current_unsteady_to_csv(
                     time_combo.current())).pack(side=tk.LEFT, padx=5)
 
-        ttk.Button(export_frame, text="Экспорт всех слоёв в CSV",
+        ttk.Button(export_frame, text="Экспорт всех слоёв (CSV, NPZ, NPY)",
                    command=self.export_all_unsteady_to_csv).pack(side=tk.LEFT, padx=5)
 
     def export_stationary_to_csv(self):
@@ -269,33 +270,35 @@ class TableWindow:
             messagebox.showerror("Ошибка экспорта", str(e))
 
     def export_all_unsteady_to_csv(self):
-        """Экспорт всех временных слоёв нестационарного расчёта в CSV"""
+        """Экспорт всех временных слоёв в CSV, .npz или .npy (в фоновом потоке, порциями)"""
         filename = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            filetypes=[("CSV files", "*.csv"), ("NumPy archive", "*.npz"),
+                       ("NumPy .npy + JSON manifest", "*.json"), ("All files", "*.*")],
             initialfile="unsteady_all_results.csv"
         )
 
         if not filename:
             return
 
-        try:
-            with open(filename, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['time_s', 'x_km', 'P_MPa', 'v_ms'])
+        import export
+        from gui.progress import ProgressWindow
 
-                for t_idx, t in enumerate(self.pipeline.t_history):
-                    p_array = self.pipeline.p_history[t_idx]
-                    v_array = self.pipeline.v_history[t_idx]
+        pipeline = self.pipeline
+        x_km, x_m = pipeline.x_km, pipeline.x_m
+        t_history, p_history, v_history = pipeline.t_history, pipeline.p_history, pipeline.v_history
+        fmt = None if os.path.splitext(filename)[1].lower() in export.FORMATS else '.csv'
 
-                    for i in range(len(self.pipeline.x_km)):
-                        writer.writerow([
-                            t,
-                            self.pipeline.x_km[i],
-                            p_array[i]/1e6,
-                            v_array[i]
-                        ])
+        def task(progress, cancel):
+            return export.export_unsteady(
+                filename, x_km, x_m, len(t_history),
+                export.iter_array_pages(t_history, p_history, v_history),
+                progress, cancel, fmt=fmt)
 
-            messagebox.showinfo("Успех", f"Данные экспортированы в {filename}")
-        except Exception as e:
-            messagebox.showerror("Ошибка экспорта", str(e))
+        def done(completed, error):
+            if error is not None:
+                messagebox.showerror("Ошибка экспорта", str(error))
+            elif completed:
+                messagebox.showinfo("Успех", f"Данные экспортированы в {filename}")
+
+        ProgressWindow(self.window or self.root, "Экспорт", "Экспорт всех слоёв").run(task, done)
@@ -0,0 +1,154 @@
+"""
+Хранение истории нестационарного расчёта
+
+История - непрерывные двумерные массивы (слои × узлы), выделенные
+один раз по числу шагов и периоду сохранения, либо файл на диске,
+отображаемый в память.
+"""
+
+import json
+
+import numpy as np
+
+
+def num_history_layers(num_steps, store_every, start_step=0):
+    """
+    Число слоёв истории: начальный слой (шаг start_step), каждый шаг
+    из (start_step, num_steps], кратный store_every, и последний шаг
+    """
+    stored = num_steps // store_every - start_step // store_every
+    last = 1 if num_steps % store_every and num_steps > start_step else 0
+    return 1 + max(stored, 0) + last
+
+
+class HistoryBuffer:
+    """Предвыделенная история слоёв t, p(x), v(x)"""
+
+    def __init__(self, num_layers, n_nodes):
+        self.t = np.zeros(num_layers)
+        self.p = np.empty((num_layers, n_nodes))
+        self.v = np.empty((num_layers, n_nodes))
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, t, p, v):
+        """Копирование слоя в очередную строку буфера"""
+        if self.count >= len(self.t):
+            raise IndexError("Буфер истории заполнен")
+        self.t[self.count] = t
+        self.p[self.count] = p
+        self.v[self.count] = v
+        self.count += 1
+
+    def views(self):
+        """Заполненная часть истории: (t, p, v) - представления без копирования"""
+        return self.t[:self.count], self.p[:self.count], self.v[:self.count]
+
+
+class MemmapHistory:
+    """
+    История в файле на диске (numpy.memmap) для расчётов, не помещающихся в память
+
+    Слой хранится одной записью [t, p(x), v(x)] в формате float64.
+    Файл растёт блоками по chunk_layers слоёв; в памяти отображается только
+    текущий блок записи, поэтому объём резидентной памяти не зависит
+    от длительности расчёта. После завершения записи история читается
+    лениво, по страницам, через отображение всего файла только для чтения.
+    Рядом с файлом сохраняется описание <path>.json.
+    """
+
+    DTYPE = '<f8'
+
+    def __init__(self, path, n_nodes, chunk_layers=256):
+        self.path = path
+        self.n_nodes = n_nodes
+        self.chunk_layers = chunk_layers
+        self.record_size = 1 + 2 * n_nodes
+        self.count = 0
+
+        self._chunk = None
+        self._chunk_start = 0
+        self._finished = None
+
+        with open(path, 'wb'):
+            pass
+
+    def __len__(self):
+        return self.count
+
+    def _layer_bytes(self, num_layers):
+        return num_layers * self.record_size * np.dtype(self.DTYPE).itemsize
+
+    def _next_chunk(self):
+        """Сброс заполненного блока на диск и отображение следующего"""
+        if self._chunk is not None:
+            self._chunk.flush()
+            self._chunk_start += self.chunk_layers
+            self._chunk = None
+
+        with open(self.path, 'r+b') as f:
+            f.truncate(self._layer_bytes(self._chunk_start + self.chunk_layers))
+
+        self._chunk = np.memmap(self.path, dtype=self.DTYPE, mode='r+',
+                                offset=self._layer_bytes(self._chunk_start),
+                                shape=(self.chunk_layers, self.record_size))
+
+    def append(self, t, p, v):
+        """Запись слоя в текущий блок файла"""
+        if self._finished is not None:
+            raise ValueError("Запись в завершённую историю невозможна")
+
+        k = self.count - self._chunk_start
+        if self._chunk is None or k >= self.chunk_layers:
+            self._next_chunk()
+            k = 0
+
+        row = self._chunk[k]
+        row[0] = t
+        row[1:self.n_nodes + 1] = p
+        row[self.n_nodes + 1:] = v
+        self.count += 1
+
+    def finish(self):
+        """Завершение записи: обрезка файла до числа слоёв и запись описания"""
+        if self._finished is not None:
+            return
+
+        if self._chunk is not None:
+            self._chunk.flush()
+            self._chunk = None
+
+        with open(self.path, 'r+b') as f:
+            f.truncate(self._layer_bytes(self.count))
+
+        with open(self.path + '.json', 'w', encoding='utf-8') as f:
+            json.dump({'n_nodes': self.n_nodes, 'num_layers': self.count,
+                       'dtype': self.DTYPE, 'layout': 't,p,v'}, f)
+
+        self._finished = self.count
+
+    def views(self):
+        """
+        (t, p, v): t - массив в памяти, p и v - ленивые представления
+        файла (слои × узлы) только для чтения
+        """
+        self.finish()
+        return self._open_views(self.path, self.n_nodes, self.count)
+
+    @staticmethod
+    def _open_views(path, n_nodes, num_layers):
+        if num_layers == 0:
+            return np.empty(0), np.empty((0, n_nodes)), np.empty((0, n_nodes))
+
+        data = np.memmap(path, dtype=MemmapHistory.DTYPE, mode='r',
+                         shape=(num_layers, 1 + 2 * n_nodes))
+        return np.array(data[:, 0]), data[:, 1:n_nodes + 1], data[:, n_nodes + 1:]
+
+    @classmethod
+    def open(cls, path):
+        """Открытие ранее записанной истории: (t, p, v)"""
+        with open(path + '.json', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return cls._open_views(path, manifest['n_nodes'], manifest['num_layers'])
@@ -0,0 +1,153 @@
+"""
+Табличное представление коэффициента гидравлического сопротивления λ(Re)
+
+Для фиксированной пары (метод, ε) зависимость λ(Re) - гладкая функция одной
+переменной. Таблица строится один раз по узлам lg Re (с адаптивным
+сгущением до заданной погрешности) и далее опрашивается линейной
+интерполяцией ln λ по lg Re. Таблицы хранятся в небольшом LRU-кэше.
+"""
+
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+
+class LambdaTable:
+    """
+    Таблица ln λ(lg Re) на отрезке [Re_min, Re_max]
+
+    law : callable
+        Точный закон λ(Re) для массива Re
+    fallback : callable
+        Закон для Re вне диапазона таблицы (по умолчанию law)
+    breakpoints : list
+        Границы режимов, на которых λ(Re) может иметь разрыв.
+        Каждый участок между границами интерполируется отдельно
+    tol : float
+        Допустимая относительная погрешность интерполяции
+    """
+
+    # Сдвиг по оси lg Re между участками: позволяет опрашивать все
+    # участки одним вызовом np.interp без интерполяции через разрыв
+    SEGMENT_SHIFT = 100.0
+
+    def __init__(self, law, breakpoints=(), Re_min=1e3, Re_max=1e10, tol=1e-6,
+                 initial_points=65, max_points=200000, fallback=None):
+        self.law = law
+        self.fallback = law if fallback is None else fallback
+        self.Re_min = Re_min
+        self.Re_max = Re_max
+        self.tol = tol
+
+        inner = sorted(b for b in breakpoints if Re_min < b < Re_max)
+        edges = [Re_min] + inner + [Re_max]
+        self._inner_log = np.log10(inner)
+
+        x_parts = []
+        y_parts = []
+        self.max_error = 0.0
+        for k in range(len(edges) - 1):
+            x, y, err = self._build_segment(edges[k], edges[k + 1],
+                                            initial_points, max_points)
+            x_parts.append(x + k * self.SEGMENT_SHIFT)
+            y_parts.append(y)
+            self.max_error = max(self.max_error, err)
+
+        self._x = np.concatenate(x_parts)
+        self._y = np.concatenate(y_parts)
+
+    @property
+    def num_points(self):
+        return len(self._x)
+
+    def _eval_log(self, x, right_edge):
+        """ln λ в узлах x; правый узел участка берётся слева от границы режима"""
+        Re = 10.0 ** x
+        Re[-1] = np.nextafter(right_edge, 0.0)
+        return np.log(self.law(Re))
+
+    def _build_segment(self, Re_lo, Re_hi, initial_points, max_points):
+        """Адаптивное построение узлов на одном участке"""
+        x = np.linspace(np.log10(Re_lo), np.log10(Re_hi), initial_points)
+        y = self._eval_log(x, Re_hi)
+
+        while True:
+            x_mid = (x[:-1] + x[1:]) / 2
+            exact = self.law(10.0 ** x_mid)
+            approx = np.exp((y[:-1] + y[1:]) / 2)
+            error = np.abs(approx / exact - 1)
+
+            refine = error > self.tol
+            if not np.any(refine) or len(x) + np.count_nonzero(refine) > max_points:
+                return x, y, float(np.max(error))
+
+            x = np.insert(x, np.flatnonzero(refine) + 1, x_mid[refine])
+            y = self._eval_log(x, Re_hi)
+
+    def __call__(self, Re):
+        """λ для массива Re; вне диапазона таблицы используется точный закон"""
+        Re = np.asarray(Re, dtype=float)
+        lambda_ = np.empty(Re.shape)
+
+        inside = (Re >= self.Re_min) & (Re < self.Re_max)
+        if not np.all(inside):
+            outside = ~inside
+            lambda_[outside] = self.fallback(Re[outside])
+
+        x = np.log10(Re[inside])
+        if len(self._inner_log):
+            x += np.searchsorted(self._inner_log, x, side='right') * self.SEGMENT_SHIFT
+        lambda_[inside] = np.exp(np.interp(x, self._x, self._y))
+        return lambda_
+
+
+class LambdaTableCache:
+    """LRU-кэш таблиц λ(Re) с учётом попаданий и промахов"""
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, factory):
+        """Таблица по ключу; при промахе строится вызовом factory()"""
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                self.hits += 1
+                return table
+            self.misses += 1
+
+        table = factory()
+
+        with self._lock:
+            self._tables[key] = table
+            self._tables.move_to_end(key)
+            while len(self._tables) > self.maxsize:
+                self._tables.popitem(last=False)
+                self.evictions += 1
+        return table
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+    def stats(self):
+        """Статистика кэша и максимальная погрешность хранимых таблиц"""
+        with self._lock:
+            tables = list(self._tables.items())
+            total = self.hits + self.misses
+            return {
+                'size': len(tables),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+                'max_error': {key: table.max_error for key, table in tables},
+            }
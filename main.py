@@ -1,5 +1,5 @@
+import multiprocessing
 import tkinter as tk
-from PIL import Image, ImageTk
 
 from gui import PipelineGUI
 
@@ -7,9 +7,9 @@ from gui import PipelineGUI
 def main():
     root = tk.Tk()
 
+    # PNG читается самим Tk (8.6+), без загрузки PIL при запуске
     try:
-        image = Image.open('C:/Users/agers/D/RGU/srt/icon.png')
-        photo = ImageTk.PhotoImage(image)
+        photo = tk.PhotoImage(file='C:/Users/agers/D/RGU/srt/icon.png')
         root.iconphoto(False, photo)
     except Exception:
         pass
@@ -19,4 +19,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Для дочерних процессов расчёта в сборке PyInstaller
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,94 @@
+"""
+Векторизованное ядро метода характеристик (МХ)
+
+Функции работают с целыми массивами узлов сетки за один вызов.
+Последняя ось массивов - узлы сетки, поэтому те же функции
+применимы и к пакетам массивов вида (сценарии × узлы).
+Необязательные границы lo, hi задают диапазон узлов [lo, hi).
+"""
+
+import numpy as np
+
+
+def friction_loss(v, lambda_arr, rho, dx, d, out=None):
+    """
+    Потери на трение R = λ·dx·ρ·v·|v| / (2D) в каждом узле
+    """
+    out = np.multiply(lambda_arr, dx, out=out)
+    out *= rho
+    out *= v
+    out *= np.abs(v)
+    out /= 2 * d
+    return out
+
+
+def characteristic_invariants(p, v, R, B, I_a, I_b, lo=0, hi=None):
+    """
+    Инварианты вдоль характеристик для узлов lo..hi-1
+
+    I_a[i] - характеристика C+ из точки (i-1, t): p + B·v - R
+    I_b[i] - характеристика C- из точки (i+1, t): p - B·v + R
+    I_a[0] и I_b[N-1] не определены и не изменяются
+    """
+    n = p.shape[-1]
+    if hi is None:
+        hi = n
+
+    # Операции выполняются на месте, без временных массивов
+    a = max(lo, 1)
+    if a < hi:
+        out = I_a[..., a:hi]
+        np.multiply(v[..., a-1:hi-1], B, out=out)
+        out += p[..., a-1:hi-1]
+        out -= R[..., a-1:hi-1]
+
+    b = min(hi, n - 1)
+    if lo < b:
+        out = I_b[..., lo:b]
+        np.multiply(v[..., lo+1:b+1], B, out=out)
+        np.subtract(p[..., lo+1:b+1], out, out=out)
+        out += R[..., lo+1:b+1]
+
+
+def interior_update(I_a, I_b, B, p_new, v_new, lo=1, hi=None):
+    """
+    Решение во внутренних узлах по пересечению характеристик C+ и C-
+    """
+    n = p_new.shape[-1]
+    lo = max(lo, 1)
+    hi = n - 1 if hi is None else min(hi, n - 1)
+    if lo >= hi:
+        return
+
+    p_out = p_new[..., lo:hi]
+    np.add(I_a[..., lo:hi], I_b[..., lo:hi], out=p_out)
+    p_out /= 2.0
+
+    v_out = v_new[..., lo:hi]
+    np.subtract(I_a[..., lo:hi], I_b[..., lo:hi], out=v_out)
+    v_out /= 2.0 * B
+
+
+def inlet_boundary(p_new, v_new, I_b, B, p_inlet):
+    """Левая граница (i = 0): задано давление p_inlet, скорость из C-"""
+    p_new[..., 0] = p_inlet
+    v_new[..., 0] = (p_new[..., 0] - I_b[..., 0]) / B
+
+
+def outlet_boundary(p_new, v_new, I_a, B, boundary_condition, p_outlet, p_end):
+    """Правая граница (i = N-1): зависит от типа ГУ, второе уравнение из C+"""
+    if boundary_condition == 'valve_closure':
+        # Закрытие клапана: скорость = 0
+        v_new[..., -1] = 0.0
+        # Давление определяется из характеристики C+
+        p_new[..., -1] = I_a[..., -1] - B * v_new[..., -1]
+
+    elif boundary_condition == 'pressure_outlet':
+        # Задано давление на выходе
+        p_new[..., -1] = p_outlet
+        v_new[..., -1] = (I_a[..., -1] - p_new[..., -1]) / B
+
+    else:
+        # 'pressure_inlet' и по умолчанию: задано постоянное давление на выходе
+        p_new[..., -1] = p_end
+        v_new[..., -1] = (I_a[..., -1] - p_new[..., -1]) / B
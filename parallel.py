@@ -0,0 +1,81 @@
+"""
+Постоянный пул потоков для шага метода характеристик
+
+Сетка делится на непрерывные блоки узлов, каждый блок обрабатывается
+векторными операциями NumPy, которые освобождают GIL. Пул создаётся
+один раз на весь расчёт, а не на каждом шаге по времени.
+"""
+
+import concurrent.futures
+import os
+
+
+class ChunkedExecutor:
+    """
+    Выполнение функции fn(lo, hi) по блокам сетки [lo, hi)
+
+    n_nodes : int
+        Число узлов сетки
+    max_workers : int
+        Число потоков; None - подбирается по размеру сетки и числу ядер
+    chunk_size : int
+        Размер блока; None - сетка делится поровну между потоками
+    """
+
+    # Меньше этого числа узлов на поток накладные расходы
+    # на синхронизацию превышают выигрыш от параллельности
+    MIN_CHUNK_NODES = 20000
+
+    def __init__(self, n_nodes, max_workers=None, chunk_size=None):
+        self.n_nodes = n_nodes
+
+        if max_workers is None:
+            max_workers = self.auto_workers(n_nodes)
+        max_workers = max(1, min(max_workers, n_nodes))
+
+        if chunk_size is None:
+            chunk_size = -(-n_nodes // max_workers)
+        chunk_size = max(1, chunk_size)
+
+        self.chunks = [(lo, min(lo + chunk_size, n_nodes))
+                       for lo in range(0, n_nodes, chunk_size)]
+        self.max_workers = min(max_workers, len(self.chunks))
+
+        self._executor = None
+        if self.max_workers > 1:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers - 1,
+                thread_name_prefix='moc'
+            )
+
+    @classmethod
+    def auto_workers(cls, n_nodes):
+        """Число потоков по размеру сетки"""
+        return max(1, min(os.cpu_count() or 1, n_nodes // cls.MIN_CHUNK_NODES))
+
+    def run(self, fn):
+        """
+        Вызов fn(lo, hi) для всех блоков; первый блок обрабатывается
+        в вызывающем потоке. Возврат - после завершения всех блоков
+        """
+        if self._executor is None:
+            for lo, hi in self.chunks:
+                fn(lo, hi)
+            return
+
+        futures = [self._executor.submit(fn, lo, hi) for lo, hi in self.chunks[1:]]
+        lo, hi = self.chunks[0]
+        fn(lo, hi)
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
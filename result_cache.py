@@ -0,0 +1,281 @@
+"""
+Кэш результатов расчётов по хешу исходных данных
+
+Ключ - sha256 от параметров трубопровода (PipelineConfig), метода λ
+и параметров нестационарного расчёта. Два уровня:
+    память - LRU, ограниченный числом записей и объёмом массивов;
+    диск   - отдельная база SQLite (рядом с базой результатов),
+             ограниченная объёмом, вытеснение по времени последнего доступа.
+Записи хранятся как наборы массивов NumPy (формат .npz, без pickle).
+"""
+
+from collections import OrderedDict
+import hashlib
+import io
+import json
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# Атрибуты PipelineFlow, составляющие результат расчёта
+STATIONARY_FIELDS = ('rho', 'nu', 'epsilon', 'v', 'Re', 'lambda_', 'iterations', 'converged',
+                     'dx', 'x_km', 'x_m', 'P', 'v_arr')
+UNSTEADY_FIELDS = STATIONARY_FIELDS + ('P_original', 'v_arr_original', 'dt', 'B', 'converged_step',
+                                       't_history', 'p_history', 'v_history')
+
+
+def make_key(kind, config, **params):
+    """Ключ записи: вид расчёта, digest параметров трубопровода и прочие параметры"""
+    text = json.dumps({'kind': kind, 'config': config.digest(), 'params': params},
+                      sort_keys=True, default=repr)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _pack(flow, fields):
+    """Снимок атрибутов flow: словарь массивов"""
+    state = {}
+    for name in fields:
+        value = getattr(flow, name, None)
+        if value is not None:
+            state[name] = np.array(value)
+    return state
+
+
+def _unpack(flow, state, fields):
+    """Восстановление атрибутов flow из снимка"""
+    for name in fields:
+        value = state.get(name)
+        if value is not None:
+            value = value.item() if value.ndim == 0 else value.copy()
+        setattr(flow, name, value)
+    flow.stationary_calculated = True
+
+
+def _nbytes(state):
+    return sum(value.nbytes for value in state.values())
+
+
+class ResultCache:
+    """
+    Двухуровневый кэш результатов PipelineFlow
+
+    maxsize : int
+        Число записей в памяти
+    max_memory_bytes : int
+        Объём массивов в памяти
+    db_name : str
+        Файл дискового кэша SQLite; None - только память
+    max_disk_bytes : int
+        Объём дискового кэша
+    """
+
+    def __init__(self, maxsize=16, max_memory_bytes=256 * 2**20,
+                 db_name='pipeline_cache.db', max_disk_bytes=1024 * 2**20):
+        self.maxsize = maxsize
+        self.max_memory_bytes = max_memory_bytes
+        self.db_name = db_name
+        self.max_disk_bytes = max_disk_bytes
+
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if db_name is not None:
+            self._init_disk()
+
+    def _init_disk(self):
+        with sqlite3.connect(self.db_name) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS result_cache (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT,
+                    size INTEGER,
+                    last_used REAL,
+                    payload BLOB
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_result_cache_last_used '
+                         'ON result_cache (last_used)')
+
+    # Работа с записями
+
+    def get(self, key):
+        """Снимок результата по ключу или None"""
+        with self._lock:
+            state = self._entries.get(key)
+            if state is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return state
+
+        state = self._disk_get(key)
+
+        with self._lock:
+            if state is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._memory_put(key, state)
+        return state
+
+    def put(self, key, kind, state):
+        """Сохранение снимка в памяти и на диске"""
+        with self._lock:
+            self._memory_put(key, state)
+        self._disk_put(key, kind, state)
+
+    def _memory_put(self, key, state):
+        size = _nbytes(state)
+        if size > self.max_memory_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= _nbytes(old)
+        self._entries[key] = state
+        self._memory_bytes += size
+
+        while len(self._entries) > self.maxsize or self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._memory_bytes -= _nbytes(evicted)
+            self.evictions += 1
+
+    def _disk_get(self, key):
+        if self.db_name is None:
+            return None
+
+        with sqlite3.connect(self.db_name) as conn:
+            row = conn.execute('SELECT payload FROM result_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE result_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+
+        with np.load(io.BytesIO(row[0]), allow_pickle=False) as data:
+            return {name: data[name] for name in data.files}
+
+    def _disk_put(self, key, kind, state):
+        if self.db_name is None:
+            return
+
+        buffer = io.BytesIO()
+        np.savez(buffer, **state)
+        payload = buffer.getvalue()
+        if len(payload) > self.max_disk_bytes:
+            return
+
+        with sqlite3.connect(self.db_name) as conn:
+            conn.execute('INSERT OR REPLACE INTO result_cache (key, kind, size, last_used, payload) '
+                         'VALUES (?, ?, ?, ?, ?)', (key, kind, len(payload), time.time(), payload))
+
+            # Вытеснение давно не использованных записей сверх допустимого объёма
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM result_cache').fetchone()[0]
+            if total > self.max_disk_bytes:
+                rows = conn.execute('SELECT key, size FROM result_cache ORDER BY last_used').fetchall()
+                for old_key, size in rows:
+                    if total <= self.max_disk_bytes or old_key == key:
+                        break
+                    conn.execute('DELETE FROM result_cache WHERE key = ?', (old_key,))
+                    total -= size
+                    self.evictions += 1
+
+    def clear(self):
+        """Очистка обоих уровней"""
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+        if self.db_name is not None:
+            with sqlite3.connect(self.db_name) as conn:
+                conn.execute('DELETE FROM result_cache')
+
+    def stats(self):
+        """Статистика попаданий по уровням и занимаемый объём"""
+        disk_size, disk_bytes = 0, 0
+        if self.db_name is not None:
+            with sqlite3.connect(self.db_name) as conn:
+                disk_size, disk_bytes = conn.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM result_cache').fetchone()
+
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'memory_bytes': self._memory_bytes,
+                'disk_size': disk_size,
+                'disk_bytes': disk_bytes,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': hits / total if total else 0.0,
+            }
+
+    # Расчёты через кэш
+
+    def stationary(self, flow, lambda_method='auto', verbose=False):
+        """
+        Стационарный расчёт flow через кэш; True - результат взят из кэша
+        """
+        key = make_key('stationary', flow.config, lambda_method=lambda_method)
+        state = self.get(key)
+        if state is not None:
+            _unpack(flow, state, STATIONARY_FIELDS)
+            return True
+
+        flow.calculate_stationary(lambda_method=lambda_method, verbose=verbose)
+        self.put(key, 'stationary', _pack(flow, STATIONARY_FIELDS))
+        return False
+
+    def unsteady(self, flow, num_steps=2000, store_every=10, boundary_condition='valve_closure',
+                 bc_change_time=None, bc_change_value=None, lambda_method='auto',
+                 lambda_table_tol=None, steady_tol=None, **kwargs):
+        """
+        Нестационарный расчёт flow через кэш; True - результат взят из кэша
+
+        Ключ включает начальное состояние flow.P, flow.v_arr. Прочие параметры передаются
+        в calculate_unsteady_with_callback; при попадании коллбэк не вызывается.
+        Остановленные пользователем расчёты не кэшируются; расчёты с историей
+        в файле, записью в БД во время расчёта или продолжением (history_file,
+        stream_to_db, start_step) выполняются без кэша
+        """
+        if not flow.stationary_calculated:
+            raise ValueError("Сначала выполните calculate_stationary()")
+
+        params = dict(num_steps=num_steps, store_every=store_every,
+                      boundary_condition=boundary_condition, bc_change_time=bc_change_time,
+                      bc_change_value=bc_change_value, lambda_method=lambda_method,
+                      lambda_table_tol=lambda_table_tol, steady_tol=steady_tol)
+
+        if (kwargs.get('history_file') is not None or kwargs.get('stream_to_db') is not None
+                or kwargs.get('start_step')):
+            flow.calculate_unsteady_with_callback(**params, **kwargs)
+            return False
+
+        initial = hashlib.sha256(flow.P.tobytes() + flow.v_arr.tobytes()).hexdigest()
+        key = make_key('unsteady', flow.config, initial=initial,
+                       num_steps=num_steps, store_every=store_every,
+                       boundary_condition=boundary_condition, bc_change_time=bc_change_time,
+                       bc_change_value=bc_change_value, lambda_method=lambda_method,
+                       lambda_table_tol=lambda_table_tol, steady_tol=steady_tol,
+                       steady_check_every=kwargs.get('steady_check_every'),
+                       steady_hold_periods=kwargs.get('steady_hold_periods'))
+        state = self.get(key)
+        if state is not None:
+            _unpack(flow, state, UNSTEADY_FIELDS)
+            flow.streamed_calc_id = None
+            return True
+
+        flow.calculate_unsteady_with_callback(**params, **kwargs)
+
+        finished = flow.t_history[-1] >= num_steps * flow.dt * (1 - 1e-12) or flow.converged_step is not None
+        if finished:
+            self.put(key, 'unsteady', _pack(flow, UNSTEADY_FIELDS))
+        return False
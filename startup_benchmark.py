@@ -0,0 +1,76 @@
+"""
+Время запуска графического интерфейса
+
+Каждый замер выполняется в новом процессе интерпретатора:
+    import  - импорт пакета gui;
+    window  - импорт, создание главного окна и его первая отрисовка
+              (пропускается, если нет дисплея).
+Дополнительно выводится, какие тяжёлые модули (numpy, matplotlib, PIL)
+загружены к моменту появления окна:
+
+    python startup_benchmark.py --repeat 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ('numpy', 'matplotlib', 'PIL')
+
+IMPORT_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import gui
+elapsed = time.perf_counter() - start
+print(json.dumps({'elapsed': elapsed, 'modules': [m for m in %r if m in sys.modules]}))
+"""
+
+WINDOW_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import tkinter as tk
+from gui import PipelineGUI
+root = tk.Tk()
+PipelineGUI(root)
+root.update()
+elapsed = time.perf_counter() - start
+root.destroy()
+print(json.dumps({'elapsed': elapsed, 'modules': [m for m in %r if m in sys.modules]}))
+"""
+
+
+def measure(code, repeat):
+    """Времена запуска в новых процессах и загруженные тяжёлые модули; None - ошибка"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    times, modules = [], []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', code % (HEAVY_MODULES,)], cwd=here,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        times.append(data['elapsed'])
+        modules = data['modules']
+    return times, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Время запуска графического интерфейса")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    for name, code in (('import', IMPORT_CODE), ('window', WINDOW_CODE)):
+        times, modules = measure(code, args.repeat)
+        if times is None:
+            print(f"{name:>8}: пропущено ({modules})")
+            continue
+        print(f"{name:>8}: медиана {statistics.median(times) * 1e3:7.1f} мс, "
+              f"мин. {min(times) * 1e3:7.1f} мс; загружены: {', '.join(modules) or 'нет'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
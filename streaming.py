@@ -0,0 +1,178 @@
+"""
+Потоковая передача кадров нестационарного расчёта
+
+Frame - кадр решателя (шаг, время, p(x), v(x)) с массивами только
+для чтения. FrameStream передаёт кадры генератора потребителю в другом
+потоке через ограниченную очередь; поведение при переполнении очереди
+задаётся явно политикой:
+    'block'       - решатель ждёт потребителя
+    'drop_oldest' - из очереди вытесняется самый старый кадр
+    'drop_newest' - новый кадр отбрасывается
+Стадии обработки (расчёт → свёртка → запись) связываются обычными
+генераторами, без накопления полной истории.
+"""
+
+from collections import deque
+import threading
+
+import numpy as np
+
+
+def _readonly(a):
+    """Представление массива без права записи"""
+    view = a.view()
+    view.flags.writeable = False
+    return view
+
+
+class Frame:
+    """Кадр нестационарного расчёта"""
+
+    __slots__ = ('step', 't', 'p', 'v')
+
+    def __init__(self, step, t, p, v):
+        self.step = step
+        self.t = t
+        self.p = _readonly(p)
+        self.v = _readonly(v)
+
+    def copy(self):
+        """Кадр с собственными копиями массивов"""
+        return Frame(self.step, self.t, self.p.copy(), self.v.copy())
+
+    def __repr__(self):
+        return f"Frame(step={self.step}, t={self.t:.3f})"
+
+
+class FrameStream:
+    """
+    Кадры генератора frames, рассчитываемые в фоновом потоке
+
+    frames : iterable of Frame
+        Например, PipelineFlow.iter_unsteady(...)
+    maxsize : int
+        Число кадров в очереди
+    policy : str
+        'block', 'drop_oldest' или 'drop_newest'
+
+    Кадры копируются в заранее выделенные буферы, которые повторно
+    используются: кадр действителен до запроса следующего.
+    Счётчики: produced - поставлено в очередь, delivered - выдано
+    потребителю, dropped - отброшено по политике очереди.
+    """
+
+    POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+    def __init__(self, frames, maxsize=4, policy='block'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Неизвестная политика очереди: {policy}")
+        if maxsize < 1:
+            raise ValueError("Размер очереди должен быть не меньше 1")
+
+        self.frames = frames
+        self.maxsize = maxsize
+        self.policy = policy
+
+        self.produced = 0
+        self.delivered = 0
+        self.dropped = 0
+
+        self._queue = deque()
+        self._free = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._done = False
+        self._error = None
+
+    def __iter__(self):
+        if self._thread is not None:
+            raise RuntimeError("Поток кадров уже запущен")
+
+        self._thread = threading.Thread(target=self._produce, name='frame-stream', daemon=True)
+        self._thread.start()
+
+        current = None
+        try:
+            while True:
+                with self._cond:
+                    # Буфер предыдущего кадра возвращается в пул
+                    if current is not None:
+                        self._free.append(current[2:])
+                        current = None
+
+                    while not self._queue and not self._done:
+                        self._cond.wait()
+
+                    if not self._queue:
+                        if self._error is not None:
+                            raise self._error
+                        return
+
+                    current = self._queue.popleft()
+                    self._cond.notify_all()
+
+                self.delivered += 1
+                step, t, p, v = current
+                yield Frame(step, t, p, v)
+        finally:
+            self.close()
+
+    def _produce(self):
+        """Фоновый поток: чтение генератора и постановка кадров в очередь"""
+        try:
+            for frame in self.frames:
+                with self._cond:
+                    if self.policy == 'block':
+                        while len(self._queue) >= self.maxsize and not self._closed:
+                            self._cond.wait()
+                    if self._closed:
+                        break
+
+                    if len(self._queue) >= self.maxsize:
+                        self.dropped += 1
+                        if self.policy == 'drop_newest':
+                            continue
+                        self._free.append(self._queue.popleft()[2:])
+
+                    buffers = self._free.pop() if self._free else None
+
+                # Копирование вне блокировки: буфер принадлежит только этому потоку
+                if buffers is None:
+                    p = frame.p.copy()
+                    v = frame.v.copy()
+                else:
+                    p, v = buffers
+                    np.copyto(p, frame.p)
+                    np.copyto(v, frame.v)
+
+                with self._cond:
+                    self._queue.append((frame.step, frame.t, p, v))
+                    self.produced += 1
+                    self._cond.notify_all()
+
+        except Exception as e:
+            self._error = e
+
+        finally:
+            close = getattr(self.frames, 'close', None)
+            if close is not None:
+                close()
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+    def close(self):
+        """Остановка потока кадров и ожидание фонового потока"""
+        with self._cond:
+            self._closed = True
+            self._queue.clear()
+            self._cond.notify_all()
+
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def stats(self):
+        """Статистика потока кадров"""
+        return {'produced': self.produced, 'delivered': self.delivered,
+                'dropped': self.dropped, 'policy': self.policy}
@@ -0,0 +1,172 @@
+"""
+Векторизованный стационарный расчёт для набора режимов
+
+Каждый входной параметр PipelineConfig (давления, температура, диаметр,
+шероховатость и т.д.) может быть задан массивом; массивы приводятся
+к общей форме (broadcasting), и все режимы решаются одновременно
+векторным методом секущих (velocity.solve_velocity). Большие наборы
+можно разделить между процессами.
+"""
+
+import concurrent.futures
+import multiprocessing as mp
+
+import numpy as np
+
+from calc import PipelineFlow
+from config import PipelineConfig
+from velocity import solve_velocity
+
+# Режимы течения (границы те же, что в PipelineFlow.get_lambda)
+REGIMES = ('stokes', 'ginzburg', 'blasius', 'altshul', 'shifrinson')
+
+
+def regime_codes(Re, epsilon):
+    """Номер режима течения (индекс в REGIMES) для каждого Re"""
+    Re = np.asarray(Re, dtype=float)
+    return np.select(
+        [Re < 2320, Re < 1e4, Re < 1e5 / epsilon, Re < 500 / epsilon],
+        [0, 1, 2, 3], default=4
+    ).astype(np.int8)
+
+
+def cartesian(**axes):
+    """Декартово произведение осей: словарь одномерных массивов одной длины"""
+    grids = np.meshgrid(*[np.asarray(values, dtype=float) for values in axes.values()],
+                        indexing='ij')
+    return {name: grid.ravel() for name, grid in zip(axes, grids)}
+
+
+class SweepResult:
+    """
+    Результаты расчёта набора режимов; все массивы общей формы
+
+    config : PipelineConfig
+        Значения параметров, не заданных массивами
+    inputs : dict
+        Входные массивы, приведённые к общей форме
+    regime : массив индексов REGIMES
+    """
+
+    def __init__(self, config, inputs, v, Re, lambda_, regime, iterations, converged, rho, nu):
+        self.config = config
+        self.inputs = inputs
+        self.v = v
+        self.Re = Re
+        self.lambda_ = lambda_
+        self.regime = regime
+        self.iterations = iterations
+        self.converged = converged
+        self.rho = rho
+        self.nu = nu
+
+    def __len__(self):
+        return self.v.size
+
+    def regime_names(self):
+        """Названия режимов течения"""
+        return np.asarray(REGIMES)[self.regime]
+
+    def flow_rate(self):
+        """Объёмный расход, м³/с"""
+        d = _field(self.config, self.inputs, 'internal_diameter')
+        return self.v * np.pi * d**2 / 4
+
+
+def _field(config, inputs, name):
+    """Параметр режима в единицах СИ: из входных массивов или из config"""
+    values = {key: inputs.get(key, getattr(config, key)) for key in config.as_dict()}
+    mm = 1e-3
+    if name == 'internal_diameter':
+        return (values['external_diameter_mm'] - 2 * values['wall_thickness_mm']) * mm
+    if name == 'abs_roughness':
+        return values['abs_roughness_mm'] * mm
+    if name == 'length':
+        return (values['xn_km'] - values['x0_km']) * 1000
+    if name == 'delta_p':
+        return (values['p_initial_mpa'] - values['p_end_mpa']) * 1e6
+    if name == 'temperature':
+        return values['tc'] + 273.15
+    return values[name]
+
+
+def _solve(config, inputs, lambda_method, tol, max_iter, v0=None):
+    """Расчёт всех режимов в текущем процессе"""
+    flow = PipelineFlow(config)
+
+    d = _field(config, inputs, 'internal_diameter')
+    length = _field(config, inputs, 'length')
+    delta_p = _field(config, inputs, 'delta_p')
+    tc = _field(config, inputs, 'tc')
+
+    # Плотность и вязкость при температуре режима (как в calculate_stationary)
+    alpha = 0.0008
+    rho = _field(config, inputs, 'ro20') * (1 - alpha * (tc - 20))
+    nu = flow.get_kinematic_viscosity(_field(config, inputs, 'temperature'),
+                                      _field(config, inputs, 'viscosity_20_sst') * 1e-6,
+                                      _field(config, inputs, 'viscosity_50_sst') * 1e-6)
+    epsilon = _field(config, inputs, 'abs_roughness') / d
+
+    v, iterations, converged = solve_velocity(flow, delta_p, d, length, rho, nu, epsilon,
+                                              lambda_method, v0=v0, tol=tol, max_iter=max_iter)
+    shape = v.shape
+
+    Re = np.abs(v) * d / nu
+    lambda_ = flow.get_lambda_array(Re, epsilon, method=lambda_method)
+
+    return (v, Re, lambda_, regime_codes(Re, epsilon), iterations, converged,
+            np.broadcast_to(rho, shape), np.broadcast_to(nu, shape))
+
+
+def _solve_chunk(args):
+    """Расчёт части режимов в процессе пула"""
+    return _solve(*args)
+
+
+def sweep_stationary(config=None, lambda_method='auto', tol=1e-6, max_iter=50,
+                     num_processes=None, chunk_size=100000, v0=None, **inputs):
+    """
+    Стационарный расчёт для набора режимов
+
+    config : PipelineConfig
+        Значения параметров, не заданных массивами
+    inputs :
+        Массивы параметров PipelineConfig, например p_initial_mpa=...,
+        tc=..., external_diameter_mm=...; для сетки значений - cartesian(...)
+    v0 :
+        Начальное приближение скорости (число или массив формы набора),
+        например v предыдущего расчёта; None - 1 м/с
+    num_processes : int
+        Число процессов; None или 1 - расчёт в текущем процессе
+    chunk_size : int
+        Число режимов на одну задачу пула процессов
+    """
+    config = config or PipelineConfig.from_constants()
+
+    unknown = set(inputs) - set(config.as_dict())
+    if unknown:
+        raise ValueError(f"Неизвестные параметры: {', '.join(sorted(unknown))}")
+
+    arrays = np.broadcast_arrays(*[np.asarray(value, dtype=float) for value in inputs.values()])
+    inputs = dict(zip(inputs, arrays))
+    shape = arrays[0].shape if arrays else ()
+    size = int(np.prod(shape))
+
+    if not num_processes or num_processes <= 1 or size <= chunk_size:
+        parts = [_solve(config, inputs, lambda_method, tol, max_iter, v0)]
+    else:
+        flat = {name: value.ravel() for name, value in inputs.items()}
+        v0_flat = None if v0 is None else np.broadcast_to(v0, shape).ravel()
+        tasks = [(config, {name: value[lo:lo + chunk_size] for name, value in flat.items()},
+                  lambda_method, tol, max_iter,
+                  None if v0_flat is None else v0_flat[lo:lo + chunk_size])
+                 for lo in range(0, size, chunk_size)]
+
+        max_workers = min(num_processes, len(tasks))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers,
+                                                    mp_context=mp.get_context('spawn')) as pool:
+            parts = list(pool.map(_solve_chunk, tasks))
+
+    results = [np.concatenate([part[k].ravel() for part in parts]).reshape(shape)
+               for k in range(8)]
+    return SweepResult(config, inputs, *results)
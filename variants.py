@@ -0,0 +1,195 @@
+"""
+Расчёт всех вариантов из книги Excel (files/Варианты.xlsx)
+
+Книга читается средствами стандартной библиотеки (zipfile + xml):
+строка заголовка с ячейкой «№» задаёт столбцы, каждая следующая
+непустая строка - вариант. Столбцы сопоставляются полям PipelineConfig
+по обозначениям в заголовке (D, мм; δ, мм; ...). Для каждого варианта
+выполняются стационарный и нестационарный расчёты (batch.run_batch,
+пул процессов); результаты записываются в базу данных, а сводная
+таблица (v, Re, λ, максимальное и минимальное давление) - в CSV:
+
+    python variants.py files/Варианты.xlsx --processes 4 --db pipeline_results.db
+"""
+
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+
+import batch
+
+NS = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+# Обозначение в заголовке -> поле PipelineConfig
+COLUMNS = {
+    'D, мм': 'external_diameter_mm',
+    'δ, мм': 'wall_thickness_mm',
+    'Δ, мм': 'abs_roughness_mm',
+    'X0, км': 'x0_km',
+    'XN, км': 'xn_km',
+    'ρ20, кг/м3': 'ro20',
+    'ν20, сСт': 'viscosity_20_sst',
+    'ν50, сСт': 'viscosity_50_sst',
+    'Pн, МПа': 'p_initial_mpa',
+    'Pк, МПа': 'p_end_mpa',
+    'T, ℃': 'tc',
+}
+NUMBER_COLUMN = '№'
+
+SUMMARY_FIELDS = ('name',) + tuple(COLUMNS.values()) + batch.SUMMARY_FIELDS[1:] + ('calc_ids',)
+
+
+def _column_index(ref):
+    """Номер столбца (с нуля) по адресу ячейки, например 'C3' -> 2"""
+    letters = re.match(r'[A-Z]+', ref).group()
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def read_xlsx(path, sheet=0):
+    """Строки листа книги .xlsx: списки значений (str, float или None)"""
+    with zipfile.ZipFile(path) as z:
+        shared = []
+        if 'xl/sharedStrings.xml' in z.namelist():
+            root = ET.fromstring(z.read('xl/sharedStrings.xml'))
+            shared = [''.join(t.text or '' for t in si.iter(f"{{{NS['m']}}}t"))
+                      for si in root.findall('m:si', NS)]
+
+        # Файл листа - через связи книги
+        workbook = ET.fromstring(z.read('xl/workbook.xml'))
+        rel_id = workbook.findall('m:sheets/m:sheet', NS)[sheet].get(REL_NS)
+        rels = ET.fromstring(z.read('xl/_rels/workbook.xml.rels'))
+        target = next(rel.get('Target') for rel in rels if rel.get('Id') == rel_id)
+        sheet_path = target.lstrip('/') if target.startswith('/') else 'xl/' + target
+
+        root = ET.fromstring(z.read(sheet_path))
+
+    rows = []
+    for row in root.findall('m:sheetData/m:row', NS):
+        values = []
+        for cell in row.findall('m:c', NS):
+            index = _column_index(cell.get('r'))
+            values.extend([None] * (index + 1 - len(values)))
+
+            kind = cell.get('t')
+            v = cell.find('m:v', NS)
+            if kind == 'inlineStr':
+                values[index] = ''.join(t.text or '' for t in cell.iter(f"{{{NS['m']}}}t"))
+            elif v is None:
+                values[index] = None
+            elif kind == 's':
+                values[index] = shared[int(v.text)]
+            elif kind in ('str', 'e'):
+                values[index] = v.text
+            else:
+                values[index] = float(v.text)
+        rows.append(values)
+    return rows
+
+
+def load_variants(path):
+    """Варианты книги: список сценариев для batch.run_batch"""
+    rows = read_xlsx(path)
+
+    header_row = next((k for k, row in enumerate(rows)
+                       if any(isinstance(value, str) and value.strip() == NUMBER_COLUMN
+                              for value in row)), None)
+    if header_row is None:
+        raise ValueError(f"В книге нет строки заголовка со столбцом «{NUMBER_COLUMN}»")
+
+    header = [value.strip() if isinstance(value, str) else None for value in rows[header_row]]
+    columns = {}
+    for index, title in enumerate(header):
+        if title == NUMBER_COLUMN:
+            columns[index] = 'name'
+        elif title in COLUMNS:
+            columns[index] = COLUMNS[title]
+
+    missing = set(COLUMNS.values()) - set(columns.values())
+    if missing:
+        raise ValueError(f"В книге нет столбцов: {', '.join(sorted(missing))}")
+
+    variants = []
+    for row in rows[header_row + 1:]:
+        values = {field: row[index] for index, field in columns.items()
+                  if index < len(row) and row[index] is not None}
+        if not any(field != 'name' for field in values):
+            continue
+
+        name = values.pop('name', len(variants) + 1)
+        if isinstance(name, float) and name.is_integer():
+            name = int(name)
+        variants.append({'name': str(name), **values})
+
+    return variants
+
+
+def write_summary(path, variants, summaries):
+    """Сводная таблица: исходные данные и основные результаты вариантов"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for variant, summary in zip(variants, summaries):
+            writer.writerow({**variant, **summary})
+
+
+def run_variants(path, num_processes=None, db_name='pipeline_results.db',
+                 summary_path='variants_summary.csv', out_dir=None, log=print, **unsteady):
+    """
+    Стационарный и нестационарный расчёт всех вариантов книги
+
+    unsteady :
+        Параметры нестационарного расчёта, общие для всех вариантов
+        (num_steps, store_every, boundary_condition, ...)
+    """
+    variants = load_variants(path)
+    scenarios = [{**variant, 'calc': 'both', **unsteady} for variant in variants]
+
+    summaries = batch.run_batch(scenarios, num_processes, db_name, out_dir, log=log)
+
+    if summary_path is not None:
+        write_summary(summary_path, variants, summaries)
+    return variants, summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Расчёт вариантов из книги Excel")
+    parser.add_argument('workbook', nargs='?', default=os.path.join('files', 'Варианты.xlsx'))
+    parser.add_argument('--processes', type=int, default=None,
+                        help="число процессов (по умолчанию - число ядер)")
+    parser.add_argument('--db', default='pipeline_results.db', help="база данных SQLite")
+    parser.add_argument('--summary', default='variants_summary.csv', help="файл сводной таблицы")
+    parser.add_argument('--num-steps', type=int, default=2000)
+    parser.add_argument('--store-every', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    variants, summaries = run_variants(
+        args.workbook, args.processes, args.db, args.summary,
+        log=lambda message: print(message, flush=True),
+        num_steps=args.num_steps, store_every=args.store_every
+    )
+
+    print(f"\n{'Вариант':>8} {'v, м/с':>8} {'Re':>10} {'λ':>8} {'Pmax, МПа':>10} {'Pmin, МПа':>10}")
+    for summary in summaries:
+        if summary['status'] == 'ok':
+            print(f"{summary['name']:>8} {summary['v']:8.4f} {summary['Re']:10.0f} "
+                  f"{summary['lambda']:8.5f} {summary['p_max_mpa']:10.3f} {summary['p_min_mpa']:10.3f}")
+        else:
+            print(f"{summary['name']:>8} ОШИБКА {summary['error']}")
+
+    failed = sum(summary['status'] != 'ok' for summary in summaries)
+    print(f"\nВариантов: {len(variants)}, ошибок: {failed}, время {time.perf_counter() - start:.1f} с")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Скорость стационарного течения
+
+Уравнение Дарси-Вейсбаха ΔP = λ(Re)·(L/D)·ρv²/2 записывается как
+F(v) = v - φ(v) = 0, где φ(v) = sqrt(2ΔP·D / (ρ·λ(Re(v))·L)) -
+шаг прежнего метода простой итерации. Корень ищется секущими внутри
+интервала [lo, hi], на концах которого F меняет знак; шаг, выходящий
+за интервал, заменяется шагом простой итерации, а если и он вне
+интервала - делением пополам. Поэтому сходимость
+гарантирована и на разрывах λ(Re) между режимами, где простая итерация
+колеблется. Критерий сходимости тот же, что был у простой итерации:
+|F(v)| = |φ(v) - v| < tol; если интервал стянулся, а невязка осталась
+большой (корня на разрыве нет), поиск прекращается без сходимости.
+Все режимы набора решаются одновременно.
+"""
+
+import numpy as np
+
+
+def solve_velocity(flow, delta_p, d, length, rho, nu, epsilon, lambda_method='auto',
+                   v0=None, tol=1e-6, max_iter=50):
+    """
+    Скорость v для каждого режима; аргументы - числа или массивы общей формы
+
+    flow : PipelineFlow
+        Источник законов λ(Re) (get_lambda_array)
+    v0 :
+        Начальное приближение (например, решение для соседнего режима);
+        None - 1 м/с
+    Возвращает (v, iterations, converged): iterations - число вычислений λ
+    """
+    shape = np.broadcast(delta_p, d, length, rho, nu, epsilon,
+                         1.0 if v0 is None else v0).shape
+    delta_p, d, length, rho, nu, epsilon = (np.broadcast_to(np.asarray(a, dtype=float), shape).ravel()
+                                            for a in (delta_p, d, length, rho, nu, epsilon))
+
+    # При ΔP < 0 течение обратное: решается для |ΔP|, знак скорости меняется
+    K = 2 * np.abs(delta_p) * d / (rho * length)
+    sign = np.where(delta_p < 0, -1.0, 1.0)
+
+    x = np.abs(np.broadcast_to(1.0 if v0 is None else np.asarray(v0, dtype=float), shape).ravel())
+    x = np.where(x > 0, x, 1.0)
+    v = np.zeros(x.size)
+    iterations = np.zeros(x.size, dtype=np.int32)
+    converged = K == 0
+
+    lo = np.zeros(x.size)
+    hi = np.full(x.size, np.inf)
+    x_prev = np.full(x.size, np.nan)
+    F_prev = np.full(x.size, np.nan)
+
+    active = np.flatnonzero(~converged)
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+
+        xa = x[active]
+        Re = xa * d[active] / nu[active]
+        lambda_ = flow.get_lambda_array(Re, epsilon[active], method=lambda_method)
+        phi = np.sqrt(K[active] / lambda_)
+        F = xa - phi
+        iterations[active] += 1
+
+        # Интервал, содержащий корень: F(lo) < 0 < F(hi)
+        below = F < 0
+        lo[active] = np.where(below, xa, lo[active])
+        hi[active] = np.where(below, hi[active], xa)
+
+        # Интервал стянулся без малой невязки - разрыв λ(Re) без корня:
+        # поиск прекращается, но сходимость не засчитывается
+        root = np.abs(F) < tol
+        done = root | (hi[active] - lo[active] < tol)
+        v[active[done]] = xa[done]
+        converged[active[root]] = True
+
+        # Секущая по двум последним точкам
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_new = xa - F * (xa - x_prev[active]) / (F - F_prev[active])
+
+        # Защита: шаг вне интервала заменяется шагом простой итерации,
+        # а если и он вне интервала - делением пополам
+        lo_a = lo[active]
+        hi_a = hi[active]
+        fallback = np.where((phi > lo_a) & (phi < hi_a), phi, 0.5 * (lo_a + hi_a))
+        outside = ~np.isfinite(x_new) | (x_new <= lo_a) | (x_new >= hi_a)
+        x_new = np.where(outside, fallback, x_new)
+
+        x_prev[active] = xa
+        F_prev[active] = F
+        x[active] = x_new
+
+        active = active[~done]
+
+    # Несошедшиеся режимы - последнее приближение
+    v[active] = x[active]
+    return (sign * v).reshape(shape), iterations.reshape(shape), converged.reshape(shape)